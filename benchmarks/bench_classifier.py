@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+输入分类基准测试：比较单次扫描的classify_input与原先逐条正则、逐个关键词扫描的实现。
+
+用法：
+    python benchmarks/bench_classifier.py [--max-size 10MB] [--repeat 3]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from typing import Callable, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.classifier import classify_input, CHART_KEYWORDS, TEMPLATE_ALIASES
+
+
+def _legacy_detect_chart_type(input_text: str) -> Optional[str]:
+    """原实现：七个多行正则 + 逐个关键词对全文小写化后查找"""
+    headers = [
+        (r'^\s*graph\s+(TD|TB|BT|RL|LR)', "flowchart"),
+        (r'^\s*sequenceDiagram', "sequence"),
+        (r'^\s*classDiagram', "class"),
+        (r'^\s*stateDiagram', "state"),
+        (r'^\s*erDiagram', "er"),
+        (r'^\s*gantt', "gantt"),
+        (r'^\s*pie', "pie"),
+    ]
+    for pattern, chart_type in headers:
+        if re.search(pattern, input_text, re.MULTILINE):
+            return chart_type
+    scores = {chart_type: 0 for chart_type in CHART_KEYWORDS}
+    for chart_type, words in CHART_KEYWORDS.items():
+        for word in words:
+            if word.lower() in input_text.lower():
+                scores[chart_type] += 1
+    max_score = max(scores.values())
+    if max_score == 0:
+        return None
+    for chart_type, score in scores.items():
+        if score == max_score:
+            return chart_type
+    return None
+
+
+def _legacy_extract_css_template_name(input_text: str) -> Optional[str]:
+    patterns = [
+        r'使用["\']?(\w+)["\']?模板',
+        r'["\']?(\w+)["\']?[模板样式风格]',
+        r'template[:\s]+["\']?(\w+)["\']?',
+        r'css[:\s]+["\']?(\w+)["\']?',
+        r'style[:\s]+["\']?(\w+)["\']?',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, input_text, re.IGNORECASE)
+        if match:
+            template_name = match.group(1).lower()
+            for name, aliases in TEMPLATE_ALIASES.items():
+                if template_name in aliases:
+                    return name
+            return template_name
+    return None
+
+
+def _legacy_extract_custom_css(input_text: str) -> Optional[str]:
+    for pattern in (r'```css\s*([\s\S]*?)\s*```', r'<style>\s*([\s\S]*?)\s*</style>'):
+        match = re.search(pattern, input_text, re.MULTILINE)
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+def legacy_classify(input_text: str) -> Tuple:
+    return (
+        _legacy_detect_chart_type(input_text),
+        _legacy_extract_css_template_name(input_text),
+        _legacy_extract_custom_css(input_text),
+    )
+
+
+def single_pass_classify(input_text: str) -> Tuple:
+    result = classify_input(input_text)
+    return result.chart_type, result.css_template, result.custom_css
+
+
+def make_input(size: int, seed: int = 0) -> str:
+    """生成接近真实粘贴内容的输入：说明文字中夹杂Mermaid代码和少量关键词"""
+    rng = random.Random(seed)
+    filler = [
+        "The system receives a request and validates the payload before dispatching it.",
+        "服务端收到请求后先校验参数，再分发给对应的处理模块。",
+        "    A[Start] --> B{Valid?}",
+        "    B -->|yes| C[Process]",
+        "    B -->|no| D[Reject]",
+        "Each module reports its status to the coordinator.",
+        "数据在各个节点之间传递，最终汇总到统一的输出。",
+    ]
+    lines = ["下面是系统说明文档，请画一个流程图。"]
+    length = len(lines[0])
+    while length < size:
+        line = rng.choice(filler)
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def _time(func: Callable[[str], Tuple], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _parse_size(value: str) -> int:
+    value = value.strip().upper()
+    for suffix, factor in (("MB", 1024 * 1024), ("KB", 1024)):
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="输入分类基准测试")
+    parser.add_argument("--max-size", default="10MB", help="最大输入大小（默认10MB）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个大小重复次数，取最好成绩")
+    args = parser.parse_args()
+
+    max_size = _parse_size(args.max_size)
+    sizes = [size for size in (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024) if size <= max_size]
+
+    print(f"{'输入大小':>10}  {'原实现(ms)':>12}  {'单次扫描(ms)':>12}  {'加速比':>6}  结果一致")
+    for size in sizes:
+        text = make_input(size)
+        legacy = _time(legacy_classify, text, args.repeat)
+        single = _time(single_pass_classify, text, args.repeat)
+        same = legacy_classify(text) == single_pass_classify(text)
+        label = f"{size // 1024}KB" if size < 1024 * 1024 else f"{size // 1024 // 1024}MB"
+        print(f"{label:>10}  {legacy * 1000:12.2f}  {single * 1000:12.2f}  {legacy / single:6.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
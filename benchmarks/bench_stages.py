@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+生成流水线分阶段基准测试，使用离线的假LLM（LLM_PROVIDER=fake），无需API密钥。
+
+覆盖阶段：输入分类、提示词构建、假LLM流式回放、HTML提取、CSS样式注入、浏览器渲染。
+每个阶段在不同规模的图表上运行，报告p50/p95/p99耗时和Python内存峰值（tracemalloc），
+可保存为基线并与基线比较，发现性能退化时以非零状态退出。
+
+用法：
+    python benchmarks/bench_stages.py                    # 运行并与基线比较（存在时）
+    python benchmarks/bench_stages.py --save-baseline    # 运行并保存为新基线
+    python benchmarks/bench_stages.py --skip-render      # 跳过需要浏览器的渲染阶段
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# 必须在导入项目模块之前设置：使用假LLM，关闭缓存以测到真实开销
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LOCAL_MERMAID_RENDER", "false")
+os.environ.setdefault("ARTIFACT_SAMPLE_RATE", "0")
+
+from src.utils import detect_chart_type, normalize_input
+from src.llm_handler import _create_prompt, _extract_html, _apply_styling, _call_fake
+from src.mermaid import parse_mermaid
+from src.mermaid.svg import flowchart_to_html
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 图表规模：节点数
+SIZES = {"small": 10, "medium": 100, "large": 1000}
+
+# 各规模的假LLM回放的录制响应（benchmarks/fixtures/responses/<名称>.html）
+FIXTURES = {"small": "flowchart_small", "medium": "sequence_medium", "large": "flowchart_large"}
+
+
+def make_diagram_input(nodes: int) -> str:
+    """生成带说明文字的Mermaid流程图输入"""
+    lines = [f"请根据下面的流程画一个流程图，共{nodes}个步骤，使用默认模板。", "```mermaid", "graph TD"]
+    for i in range(nodes):
+        label = f"步骤{i}：处理模块{i % 37}"
+        lines.append(f"    N{i}[{label}]")
+        if i:
+            lines.append(f"    N{(i - 1) // 2} -->|完成| N{i}")
+    lines.append("    classDef done fill:#e3f2fd,stroke:#2196f3")
+    lines.append("```")
+    return "\n".join(lines)
+
+
+def make_llm_response(diagram_input: str) -> str:
+    """生成与输入规模相当的LLM风格响应（带代码块标记和结尾说明）"""
+    # 输入带说明文字且超过本地布局上限，本地引擎不会处理，这里直接解析代码块生成HTML
+    source = diagram_input.split("```mermaid\n", 1)[1].rsplit("```", 1)[0]
+    html = flowchart_to_html(parse_mermaid(source))
+    return f"```html\n{html}\n```\n\n以上是根据您的描述生成的流程图。"
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近秩法百分位数"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+async def measure(func: Callable[[], Awaitable[Any]], iterations: int, warmup: int = 2) -> Dict[str, float]:
+    """测量一个阶段：先计时，再单独运行一次测量内存峰值（tracemalloc会拖慢计时）"""
+    for _ in range(warmup):
+        await func()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        await func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p95_ms": round(percentile(samples, 95), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def _sync(func: Callable[[], Any]) -> Callable[[], Awaitable[Any]]:
+    async def wrapper():
+        return func()
+    return wrapper
+
+
+async def run_benchmarks(iterations: int, sizes: List[str], skip_render: bool) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    render = None
+    if not skip_render:
+        render = await _probe_renderer()
+
+    for size in sizes:
+        diagram_input = make_diagram_input(SIZES[size])
+        response = make_llm_response(diagram_input)
+        chart_type = detect_chart_type(diagram_input)
+        prompt = _create_prompt(normalize_input(diagram_input), chart_type)
+        html = _extract_html(response)
+        styled = _apply_styling(html, "default")
+
+        stages = {
+            "classify": _sync(lambda: detect_chart_type(diagram_input)),
+            "create_prompt": _sync(lambda: _create_prompt(normalize_input(diagram_input), chart_type)),
+            "fake_llm": lambda: _call_fake(prompt, fixture=FIXTURES[size]),
+            "extract_html": _sync(lambda: _extract_html(response)),
+            "apply_styling": _sync(lambda: _apply_styling(html, "default")),
+        }
+        if render is not None:
+            stages["render"] = lambda: render(styled, width=800, height=600, save_html=False, use_cache=False)
+
+        for stage, func in stages.items():
+            # 渲染较慢，减少迭代次数
+            count = max(5, iterations // 5) if stage == "render" else iterations
+            key = f"{stage}/{size}"
+            results[key] = await measure(func, count)
+            r = results[key]
+            print(f"{key:<24} p50={r['p50_ms']:>10.3f}ms  p95={r['p95_ms']:>10.3f}ms  "
+                  f"p99={r['p99_ms']:>10.3f}ms  peak={r['peak_kb']:>10.1f}KB", flush=True)
+
+    if render is not None:
+        from src.browser_pool import get_browser_pool
+        await get_browser_pool().close()
+    return results
+
+
+async def _probe_renderer() -> Optional[Callable]:
+    """检查浏览器是否可用，不可用时跳过渲染阶段"""
+    try:
+        from src.browser_pool import get_browser_pool
+        from src.renderer import render_html_to_png
+        lease = await get_browser_pool().acquire(800, 600)
+        await lease.release()
+        return render_html_to_png
+    except Exception as e:
+        print(f"浏览器不可用，跳过渲染阶段: {str(e).splitlines()[0]}")
+        return None
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """与基线比较，返回退化项描述"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_kb"):
+            # 极小的数值受计时噪声影响大，设置绝对下限
+            floor = 0.05 if metric.endswith("_ms") else 16.0
+            limit = max(base[metric], floor) * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(f"{key} {metric}: {base[metric]} -> {current[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成流水线分阶段基准测试")
+    parser.add_argument("--iterations", type=int, default=50, help="每个阶段的迭代次数")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="图表规模，逗号分隔（small,medium,large）")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="保存本次结果为基线")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="允许相对基线变慢/变大的比例")
+    parser.add_argument("--skip-render", action="store_true", help="跳过需要浏览器的渲染阶段")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip() in SIZES]
+    results = asyncio.run(run_benchmarks(args.iterations, sizes, args.skip_render))
+
+    if args.save_baseline:
+        data = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "iterations": args.iterations,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            },
+            "results": results,
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基线已保存: {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("发现性能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("与基线相比未发现退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+冷启动基准测试。MCP客户端按需启动服务器进程，启动耗时直接体现为用户等待时间。
+
+每次迭代在新的解释器进程中导入src.server，测量进程总耗时和模块导入耗时，
+并检查应当延迟导入的重量级模块（LLM SDK、Playwright）没有在启动时被导入。
+可保存为基线并与基线比较，发现退化时以非零状态退出。
+
+用法：
+    python benchmarks/bench_startup.py                    # 运行并与基线比较（存在时）
+    python benchmarks/bench_startup.py --save-baseline    # 运行并保存为新基线
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from typing import Any, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+# 启动时不应导入的模块：只在首次使用对应提供商或首次渲染时导入
+LAZY_MODULES = ("anthropic", "openai", "playwright")
+
+# 在子进程中执行：导入服务器模块并报告耗时和已导入的重量级模块
+_CHILD_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import src.server
+elapsed = (time.perf_counter() - start) * 1000
+lazy = {lazy!r}
+print(json.dumps({{
+    "import_ms": elapsed,
+    "loaded": [name for name in lazy if name in sys.modules],
+}}))
+"""
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近秩法百分位数"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_once() -> Dict[str, Any]:
+    """在新进程中导入服务器模块一次"""
+    env = dict(os.environ)
+    # 不提供API密钥，验证导入阶段不依赖密钥
+    env.pop("ANTHROPIC_API_KEY", None)
+    env.pop("OPENAI_API_KEY", None)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD_SCRIPT.format(lazy=LAZY_MODULES)],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True
+    )
+    total_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入src.server失败:\n{proc.stderr}")
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    report["process_ms"] = total_ms
+    return report
+
+
+def run_benchmarks(iterations: int) -> Dict[str, Any]:
+    # 预热一次，使字节码缓存和文件系统缓存就绪
+    run_once()
+    reports = [run_once() for _ in range(iterations)]
+    results: Dict[str, Any] = {}
+    for key in ("process_ms", "import_ms"):
+        samples = [r[key] for r in reports]
+        results[key] = {
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+        }
+        print(f"{key:<12} p50={results[key]['p50_ms']:>9.1f}ms  p95={results[key]['p95_ms']:>9.1f}ms")
+    loaded = sorted({name for r in reports for name in r["loaded"]})
+    results["eager_modules"] = loaded
+    print(f"启动时导入的延迟模块: {', '.join(loaded) or '无'}")
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """与基线比较，返回退化项描述"""
+    regressions = [f"启动时导入了应延迟导入的模块: {name}" for name in results["eager_modules"]]
+    for key in ("process_ms", "import_ms"):
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        # 子进程启动受系统负载影响，设置绝对下限
+        limit = max(base["p50_ms"], 50.0) * (1 + tolerance)
+        if results[key]["p50_ms"] > limit:
+            regressions.append(f"{key} p50_ms: {base['p50_ms']} -> {results[key]['p50_ms']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准测试")
+    parser.add_argument("--iterations", type=int, default=10, help="启动次数")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="保存本次结果为基线")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="允许相对基线变慢的比例")
+    args = parser.parse_args()
+
+    results = run_benchmarks(max(1, args.iterations))
+
+    if args.save_baseline:
+        data = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "iterations": args.iterations,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            },
+            "results": results,
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基线已保存: {args.baseline}")
+        return
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("发现启动性能退化：")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("未发现启动性能退化")
+
+
+if __name__ == "__main__":
+    main()
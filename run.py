@@ -32,15 +32,25 @@ async def main():
     """程序入口点"""
     host = os.getenv("HOST", "localhost")
     port = int(os.getenv("PORT", "5000"))
+    render_workers = int(os.getenv("RENDER_WORKERS", "0"))
     
     # 创建并启动服务器
-    server = MermaidMCPServer()
+    server = MermaidMCPServer(render_workers=render_workers)
     
     # 输出启动信息
     logger.info(f"启动 Mermaid-MCP 服务器...")
     logger.info(f"监听地址: {host}:{port}")
+    logger.info(f"运行模式: {server.mode}")
+    if server.mode != "standalone":
+        logger.info(f"任务队列: {os.getenv('JOB_QUEUE_URL') or 'sqlite（默认路径）'}")
     logger.info(f"LLM提供商: {os.getenv('LLM_PROVIDER', 'anthropic')}")
     logger.info(f"浏览器类型: {os.getenv('BROWSER_TYPE', 'chromium')}")
+    if server.mode == "api":
+        logger.info("API节点不渲染，生成任务由工作节点执行")
+    elif render_workers > 0:
+        logger.info(f"渲染工作进程: {render_workers} 个，每个 {os.getenv('RENDER_WORKER_BROWSERS', '1')} 个浏览器")
+    else:
+        logger.info(f"浏览器池大小: {os.getenv('BROWSER_POOL_SIZE', '2')}")
     
     try:
         # 启动服务器
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+准入控制模块，限制同时处理的请求数，超出时按优先级排队，队列满时直接拒绝。
+"""
+
+import os
+import time
+import heapq
+import itertools
+import logging
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# 优先级类别，数值越小越优先
+PRIORITY_CLASSES = {"high": 0, "normal": 1, "low": 2}
+
+
+class OverloadedError(Exception):
+    """服务器过载，请求未被接受"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    带优先级等待队列的并发准入控制。
+
+    - 进行中的请求数未达上限时直接放行
+    - 否则进入有界等待队列，按优先级和到达顺序放行
+    - 队列已满时，若新请求优先级高于队尾请求，则挤出队尾请求，否则拒绝新请求
+    - 等待超过截止时间或调用方取消时，请求从队列中移除
+    """
+
+    def __init__(self, max_inflight: Optional[int] = None, max_queue: Optional[int] = None):
+        """
+        Args:
+            max_inflight: 同时处理的请求数上限，默认读取MCP_MAX_INFLIGHT
+            max_queue: 等待队列长度上限，默认读取MCP_MAX_QUEUE
+        """
+        if max_inflight is None:
+            max_inflight = int(os.getenv("MCP_MAX_INFLIGHT", "8"))
+        if max_queue is None:
+            max_queue = int(os.getenv("MCP_MAX_QUEUE", "32"))
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+
+        self._inflight = 0
+        # 堆元素: (优先级, 序号, future)
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        # 平均处理耗时（指数加权），用于估算Retry-After
+        self._avg_service_time = 1.0
+        self.stats: Dict[str, int] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": 0,
+            "shed": 0,
+            "expired": 0,
+            "cancelled": 0,
+        }
+
+    @property
+    def inflight(self) -> int:
+        """当前处理中的请求数"""
+        return self._inflight
+
+    @property
+    def queued(self) -> int:
+        """当前排队中的请求数"""
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def retry_after(self) -> float:
+        """根据排队长度和平均处理耗时估算客户端应等待的秒数"""
+        waves = (self.queued + self._inflight) / self.max_inflight
+        return max(1.0, round(waves * self._avg_service_time, 1))
+
+    @asynccontextmanager
+    async def admit(self, priority: str = "normal", timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        获取处理名额，退出上下文时归还。
+
+        Args:
+            priority: 优先级类别（high、normal、low）
+            timeout: 排队最多等待的秒数，None表示不限
+
+        Raises:
+            OverloadedError: 队列已满或排队期间被更高优先级的请求挤出
+            asyncio.TimeoutError: 排队超时
+        """
+        await self._acquire(PRIORITY_CLASSES.get(priority, PRIORITY_CLASSES["normal"]), timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+            self._release()
+
+    async def _acquire(self, rank: int, timeout: Optional[float]):
+        if self._inflight < self.max_inflight and not self.queued:
+            self._inflight += 1
+            self.stats["admitted"] += 1
+            return
+
+        self._drop_done()
+        if len(self._queue) >= self.max_queue:
+            # 队列已满：挤出优先级最低且最晚到达的请求，或拒绝当前请求
+            worst = max(self._queue, default=None)
+            if worst is None or worst[0] <= rank:
+                self.stats["rejected"] += 1
+                raise OverloadedError("服务器繁忙，等待队列已满", self.retry_after())
+            self._queue.remove(worst)
+            heapq.heapify(self._queue)
+            worst[2].set_exception(OverloadedError("服务器繁忙，请求被更高优先级的请求挤出", self.retry_after()))
+            self.stats["shed"] += 1
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (rank, next(self._counter), future))
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # 已经拿到名额但同时被取消或超时，归还名额
+                self._release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["expired"] += 1
+            elif isinstance(e, asyncio.CancelledError):
+                self.stats["cancelled"] += 1
+            raise
+        self.stats["admitted"] += 1
+
+    def _release(self):
+        """归还名额，并把名额直接交给队列中最优先的请求"""
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._inflight -= 1
+
+    def _drop_done(self):
+        """移除已取消或已超时的排队项"""
+        if any(future.done() for _, _, future in self._queue):
+            self._queue = [item for item in self._queue if not item[2].done()]
+            heapq.heapify(self._queue)
+
+
+async def run_with_deadline(coro, deadline: Optional[float], is_disconnected=None, poll_interval: float = 0.5):
+    """
+    执行协程，超过截止时间或客户端断开连接时取消。
+
+    Args:
+        coro: 要执行的协程
+        deadline: 截止时间（time.monotonic()时间点），None表示不限
+        is_disconnected: 检查客户端是否断开的异步函数（可选）
+        poll_interval: 检查客户端连接的间隔秒数
+
+    Returns:
+        协程的返回值
+
+    Raises:
+        asyncio.TimeoutError: 超过截止时间
+        asyncio.CancelledError: 客户端断开连接
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            wait = poll_interval if is_disconnected is not None else None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                wait = remaining if wait is None else min(wait, remaining)
+            done, _ = await asyncio.wait({task}, timeout=wait)
+            if done:
+                return task.result()
+            if is_disconnected is not None and await is_disconnected():
+                logger.info("客户端已断开连接，取消请求")
+                raise asyncio.CancelledError()
+    finally:
+        if not task.done():
+            # 取消任务并等待其清理完成（释放浏览器页面、关闭LLM流等）
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
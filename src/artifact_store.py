@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+调试产物存储模块，保存渲染前的HTML，便于排查图表问题。
+写入在线程池中进行，按内容哈希去重，并按总大小、数量和存放时间清理。
+
+产物包含用户输入和LLM生成的内容，默认不保存，且保存在静态目录之外，不对外提供。
+"""
+
+import os
+import time
+import random
+import hashlib
+import logging
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Optional, Set, Dict
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# 默认产物目录（位于缓存目录下，不通过/static对外提供）
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "cache", "artifacts")
+
+
+class ArtifactStore:
+    """有界的调试产物存储"""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        max_count: Optional[int] = None,
+        max_age: Optional[float] = None,
+        sample_rate: Optional[float] = None
+    ):
+        """
+        Args:
+            directory: 产物目录，默认读取ARTIFACT_DIR
+            max_bytes: 产物总字节上限，默认读取ARTIFACT_MAX_BYTES
+            max_count: 产物数量上限，默认读取ARTIFACT_MAX_COUNT
+            max_age: 产物最长保留秒数，默认读取ARTIFACT_MAX_AGE，0表示不限
+            sample_rate: 保存比例（0-1），默认读取ARTIFACT_SAMPLE_RATE，未设置时为0（不保存）
+        """
+        self.directory = directory or os.getenv("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("ARTIFACT_MAX_BYTES", str(50 * 1024 * 1024)))
+        self.max_count = max_count if max_count is not None else int(os.getenv("ARTIFACT_MAX_COUNT", "500"))
+        self.max_age = max_age if max_age is not None else float(os.getenv("ARTIFACT_MAX_AGE", "86400"))
+        if sample_rate is None:
+            sample_rate = float(os.getenv("ARTIFACT_SAMPLE_RATE", "0"))
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+
+        # 索引：文件名 -> (大小, 写入时间)，按写入顺序排列
+        self._index: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._pending: Set[asyncio.Future] = set()
+        self.stats: Dict[str, int] = {"saved": 0, "deduplicated": 0, "skipped": 0, "evicted": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 and self.max_count > 0 and self.max_bytes > 0
+
+    def save(self, content: str, suffix: str = ".html", force: bool = False) -> Optional[str]:
+        """
+        在后台保存一个产物，不等待写入完成。
+
+        Args:
+            content: 产物内容
+            suffix: 文件扩展名
+            force: 为True时忽略采样比例（仍受容量限制）
+
+        Returns:
+            产物文件路径，未被采样时为None
+        """
+        if not force and (not self.enabled or random.random() >= self.sample_rate):
+            self.stats["skipped"] += 1
+            return None
+
+        data = content.encode("utf-8")
+        name = f"chart_{hashlib.sha256(data).hexdigest()[:32]}{suffix}"
+        path = os.path.join(self.directory, name)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self._write, name, data)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return path
+
+    async def flush(self):
+        """等待所有进行中的写入完成"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def _load_index(self):
+        """扫描产物目录重建索引（调用方需持有锁）"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.startswith("chart_"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        for mtime, name, size in sorted(entries):
+            self._index[name] = (size, mtime)
+            self._size += size
+        self._loaded = True
+
+    def _write(self, name: str, data: bytes):
+        path = os.path.join(self.directory, name)
+        # 检查是否已存在、写入文件和更新索引在同一把锁内完成，
+        # 相同内容的并发写入只会计入一次大小
+        with self._lock:
+            if not self._loaded:
+                self._load_index()
+            if name in self._index:
+                # 相同内容已存在，只刷新其写入时间
+                self._index.move_to_end(name)
+                self._index[name] = (self._index[name][0], time.time())
+                self.stats["deduplicated"] += 1
+                try:
+                    os.utime(path, None)
+                except OSError:
+                    pass
+                return
+            try:
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"保存调试产物失败: {str(e)}")
+                return
+            self._index[name] = (len(data), time.time())
+            self._size += len(data)
+            self.stats["saved"] += 1
+            self._enforce_retention()
+        logger.info(f"已保存调试产物: {path}")
+
+    def _enforce_retention(self):
+        """删除过期产物，再按写入顺序删除最旧的产物，直到满足数量和大小限制（调用方需持有锁）"""
+        now = time.time()
+        while self._index:
+            name, (size, mtime) = next(iter(self._index.items()))
+            expired = self.max_age > 0 and now - mtime > self.max_age
+            if not expired and len(self._index) <= self.max_count and self._size <= self.max_bytes:
+                break
+            del self._index[name]
+            self._size -= size
+            self.stats["evicted"] += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+# 全局产物存储实例
+_artifact_store: Optional[ArtifactStore] = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """获取全局产物存储实例（首次调用时创建）"""
+    global _artifact_store
+    if _artifact_store is None:
+        _artifact_store = ArtifactStore()
+    return _artifact_store
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+浏览器池模块，负责维护常驻的Playwright浏览器实例。
+避免每次渲染都重新启动Playwright驱动和浏览器进程。
+"""
+
+import os
+import json
+import time
+import logging
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, AsyncIterator
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+
+class _BrowserSlot:
+    """浏览器池中的一个槽位，持有一个浏览器及其可复用的上下文和页面"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.render_count = 0
+        self.last_used = time.monotonic()
+        # 为True时拦截外部资源请求：白名单内的从本地文件返回，其余直接中止
+        self.block_external = False
+        self.device_scale_factor = 1.0
+
+    @property
+    def is_alive(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    async def close(self):
+        """关闭浏览器，忽略关闭过程中的错误"""
+        browser = self.browser
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.render_count = 0
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"关闭浏览器 #{self.index} 时出错: {str(e)}")
+
+
+# 外部资源白名单：URL -> 本地文件路径
+_asset_allowlist: Optional[Dict[str, str]] = None
+
+
+def get_asset_allowlist() -> Dict[str, str]:
+    """
+    读取RENDER_ASSET_MAP指定的JSON文件（URL到本地文件路径的映射），
+    相对路径相对于该JSON文件所在目录。
+    """
+    global _asset_allowlist
+    if _asset_allowlist is None:
+        _asset_allowlist = {}
+        map_path = os.getenv("RENDER_ASSET_MAP")
+        if map_path:
+            try:
+                with open(map_path, "r", encoding="utf-8") as f:
+                    mapping = json.load(f)
+                base_dir = os.path.dirname(os.path.abspath(map_path))
+                _asset_allowlist = {
+                    url: path if os.path.isabs(path) else os.path.join(base_dir, path)
+                    for url, path in mapping.items()
+                }
+                logger.info(f"已加载 {len(_asset_allowlist)} 个本地资源映射")
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取资源白名单 {map_path} 失败: {str(e)}")
+    return _asset_allowlist
+
+
+async def _route_request(route, slot: _BrowserSlot):
+    """拦截页面发出的资源请求"""
+    if not slot.block_external:
+        await route.continue_()
+        return
+    local_path = get_asset_allowlist().get(route.request.url)
+    if local_path and os.path.isfile(local_path):
+        await route.fulfill(path=local_path)
+    else:
+        await route.abort()
+
+
+class PageLease:
+    """从浏览器池借出的页面，归还后不可再使用"""
+
+    def __init__(self, pool: "BrowserPool", slot: _BrowserSlot):
+        self._pool = pool
+        self._slot = slot
+        self.page = slot.page
+        self.released = False
+        # 是否在该页面上实际渲染过；只有实际渲染计入浏览器的渲染次数（预热、投机准备不计）
+        self.rendered = False
+
+    def set_block_external(self, block: bool):
+        """设置是否拦截该页面的外部资源请求"""
+        self._slot.block_external = block
+
+    async def release(self, failed: bool = False):
+        """归还页面，重复调用无副作用"""
+        if self.released:
+            return
+        self.released = True
+        await self._pool._release(self._slot, failed, rendered=self.rendered)
+
+
+class BrowserPool:
+    """
+    大小受限的常驻浏览器池。
+
+    每个槽位持有一个浏览器进程，以及一个复用的上下文和页面。
+    浏览器在渲染达到指定次数、崩溃或空闲超时后会被回收。
+    """
+
+    def __init__(
+        self,
+        browser_type: Optional[str] = None,
+        size: Optional[int] = None,
+        max_renders: Optional[int] = None,
+        idle_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            browser_type: 浏览器类型（chromium、firefox、webkit），默认读取BROWSER_TYPE
+            size: 池中浏览器数量上限，默认读取BROWSER_POOL_SIZE
+            max_renders: 单个浏览器最多渲染次数，超过后回收，默认读取BROWSER_MAX_RENDERS
+            idle_timeout: 浏览器空闲多少秒后关闭，默认读取BROWSER_IDLE_TIMEOUT
+        """
+        self.browser_type = browser_type or os.getenv("BROWSER_TYPE", "chromium")
+        self.size = max(1, size if size is not None else int(os.getenv("BROWSER_POOL_SIZE", "2")))
+        self.max_renders = max_renders if max_renders is not None else int(os.getenv("BROWSER_MAX_RENDERS", "100"))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv("BROWSER_IDLE_TIMEOUT", "300"))
+
+        self._playwright = None
+        self._slots: List[_BrowserSlot] = []
+        self._idle: Optional[asyncio.Queue] = None
+        # 投机准备好、尚未被使用的页面租约，有请求等待浏览器时收回
+        self._parked: List[PageLease] = []
+        self._waiters = 0
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self._started = False
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    @property
+    def alive_count(self) -> int:
+        """当前已启动且连接正常的浏览器数"""
+        return sum(1 for slot in self._slots if slot.is_alive)
+
+    async def start(self):
+        """启动Playwright驱动并初始化池槽位（浏览器按需启动）"""
+        async with self._start_lock:
+            if self._started:
+                return
+            # Playwright导入较慢，推迟到第一次启动浏览器池时
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            self._slots = [_BrowserSlot(i) for i in range(self.size)]
+            self._idle = asyncio.Queue()
+            for slot in self._slots:
+                self._idle.put_nowait(slot)
+            if self.idle_timeout > 0:
+                self._reaper_task = asyncio.create_task(self._reap_idle())
+            self._started = True
+            logger.info(
+                f"浏览器池已启动: 类型={self.browser_type}, 大小={self.size}, "
+                f"最大渲染次数={self.max_renders}, 空闲超时={self.idle_timeout}s"
+            )
+
+    async def close(self):
+        """关闭池中所有浏览器和Playwright驱动"""
+        async with self._start_lock:
+            if not self._started:
+                return
+            self._started = False
+            if self._reaper_task:
+                self._reaper_task.cancel()
+                self._reaper_task = None
+            self._parked = []
+            for slot in self._slots:
+                await slot.close()
+            self._slots = []
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+            logger.info("浏览器池已关闭")
+
+    async def prewarm(self) -> bool:
+        """
+        启动Playwright驱动，检查浏览器是否已安装并预先启动一个浏览器，
+        使第一个请求不必等待浏览器启动。失败时只记录日志。
+
+        Returns:
+            是否预热成功
+        """
+        start = time.perf_counter()
+        try:
+            await self.start()
+            executable = self._launcher().executable_path
+            if executable and not os.path.exists(executable):
+                logger.error(f"未找到{self.browser_type}浏览器（{executable}），请运行: playwright install {self.browser_type}")
+                return False
+            # 没有空闲槽位说明已有请求在使用浏览器，无需预热
+            lease = await self.acquire(wait=False)
+            if lease is not None:
+                await lease.release()
+        except Exception as e:
+            logger.error(f"预热浏览器失败: {str(e)}")
+            return False
+        logger.info(f"浏览器预热完成，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        return True
+
+    def _launcher(self):
+        if self.browser_type == "firefox":
+            return self._playwright.firefox
+        if self.browser_type == "webkit":
+            return self._playwright.webkit
+        return self._playwright.chromium  # 默认使用Chromium
+
+    async def _launch(self, slot: _BrowserSlot):
+        """为槽位启动浏览器，并创建复用的上下文和页面"""
+        slot.browser = await self._launcher().launch(headless=True)
+        await self._new_context(slot, 1.0)
+        slot.render_count = 0
+        logger.info(f"浏览器 #{slot.index} 已启动")
+
+    async def _new_context(self, slot: _BrowserSlot, device_scale_factor: float):
+        """为槽位创建新的上下文和页面（设备像素比只能在创建上下文时指定）"""
+        if slot.context is not None:
+            try:
+                await slot.context.close()
+            except Exception as e:
+                logger.warning(f"关闭浏览器 #{slot.index} 的上下文时出错: {str(e)}")
+        slot.context = await slot.browser.new_context(device_scale_factor=device_scale_factor)
+        await slot.context.route("**/*", lambda route: _route_request(route, slot))
+        slot.page = await slot.context.new_page()
+        slot.device_scale_factor = device_scale_factor
+
+    async def _ensure_ready(self, slot: _BrowserSlot):
+        """确保槽位中的浏览器可用，必要时回收并重新启动"""
+        if slot.browser is not None and not slot.is_alive:
+            logger.warning(f"浏览器 #{slot.index} 已断开连接，重新启动")
+            await slot.close()
+        elif slot.is_alive and self.max_renders > 0 and slot.render_count >= self.max_renders:
+            logger.info(f"浏览器 #{slot.index} 已渲染 {slot.render_count} 次，回收")
+            await slot.close()
+
+        if slot.browser is None:
+            await self._launch(slot)
+        elif slot.page is None or slot.page.is_closed():
+            slot.page = await slot.context.new_page()
+
+    async def acquire(
+        self,
+        width: int = 800,
+        height: int = 600,
+        wait: bool = True,
+        device_scale_factor: float = 1.0
+    ) -> Optional["PageLease"]:
+        """
+        从池中借出一个已设置好视口的页面，使用完毕后必须调用release归还。
+
+        Args:
+            width: 视口宽度（像素）
+            height: 视口高度（像素）
+            wait: 没有空闲浏览器时是否等待；为False时直接返回None
+            device_scale_factor: 设备像素比，与槽位当前上下文不同时会重建上下文
+
+        Returns:
+            页面租约，wait为False且没有空闲浏览器时为None
+        """
+        if not self._started:
+            await self.start()
+
+        if wait:
+            if self._idle.empty() and self._parked:
+                # 没有空闲浏览器时收回一个投机准备的页面，实际渲染优先
+                await self._parked.pop(0).release()
+            self._waiters += 1
+            try:
+                slot = await self._idle.get()
+            finally:
+                self._waiters -= 1
+        else:
+            try:
+                slot = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+
+        try:
+            await self._ensure_ready(slot)
+            if slot.device_scale_factor != device_scale_factor:
+                await self._new_context(slot, device_scale_factor)
+            await slot.page.set_viewport_size({"width": width, "height": height})
+        except asyncio.CancelledError:
+            # 请求被取消（客户端断开或超过截止时间）不代表浏览器有问题
+            await self._release(slot, failed=not slot.is_alive, rendered=False)
+            raise
+        except BaseException:
+            await self._release(slot, failed=True, rendered=False)
+            raise
+        return PageLease(self, slot)
+
+    async def park(self, lease: PageLease):
+        """
+        登记一个投机准备好的页面租约。其他请求等待浏览器时，
+        该租约会被收回（归还到池中），持有方需通过unpark确认租约仍然有效。
+        """
+        if self._waiters > 0:
+            await lease.release()
+            return
+        self._parked.append(lease)
+
+    def unpark(self, lease: PageLease) -> bool:
+        """取消登记并取回租约，租约已被收回时返回False"""
+        if lease in self._parked:
+            self._parked.remove(lease)
+        return not lease.released
+
+    async def _release(self, slot: _BrowserSlot, failed: bool = False, rendered: bool = True):
+        """归还槽位，rendered为False时不计入渲染次数"""
+        if rendered:
+            slot.render_count += 1
+        slot.last_used = time.monotonic()
+        # 渲染出错或浏览器崩溃时回收，避免将损坏的页面交给下一个请求
+        if failed or not slot.is_alive:
+            await slot.close()
+        self._idle.put_nowait(slot)
+
+    @asynccontextmanager
+    async def page(self, width: int = 800, height: int = 600) -> AsyncIterator:
+        """
+        从池中借出一个已设置好视口的页面，退出上下文时自动归还。
+
+        Args:
+            width: 视口宽度（像素）
+            height: 视口高度（像素）
+
+        Yields:
+            可直接用于渲染的Playwright页面
+        """
+        lease = await self.acquire(width, height)
+        lease.rendered = True
+        failed = False
+        try:
+            yield lease.page
+        except asyncio.CancelledError:
+            # 取消时正常归还，不回收浏览器
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            await lease.release(failed)
+
+    async def _reap_idle(self):
+        """定期关闭空闲超时的浏览器"""
+        interval = max(1.0, min(self.idle_timeout / 2, 30.0))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            # 只检查当前空闲的槽位，正在使用的槽位不在队列中
+            for _ in range(self._idle.qsize()):
+                slot = self._idle.get_nowait()
+                if slot.browser is not None and now - slot.last_used > self.idle_timeout:
+                    logger.info(f"浏览器 #{slot.index} 空闲超时，关闭")
+                    await slot.close()
+                self._idle.put_nowait(slot)
+
+
+# 全局浏览器池实例
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """获取全局浏览器池实例（首次调用时创建）"""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
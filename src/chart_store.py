@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图表存储模块，按内容哈希保存渲染好的图像，供response_mode=url的请求返回资源URL。
+文件名即内容的SHA-256，内容不可变，因此可以使用强ETag和永久缓存。
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# 默认图表目录
+DEFAULT_CHART_DIR = os.path.join(os.path.dirname(__file__), "cache", "charts")
+
+# 扩展名 -> MIME类型
+CHART_MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+}
+
+_NAME_RE = re.compile(r'^([0-9a-f]{64})\.([a-z]+)$')
+
+
+class ChartStore:
+    """按内容哈希寻址的图表文件存储，总大小超过上限时按最近写入顺序淘汰"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            directory: 图表目录，默认读取CHART_STORE_DIR
+            max_bytes: 图表总字节上限，默认读取CHART_STORE_MAX_BYTES，0表示不限
+        """
+        self.directory = directory or os.getenv("CHART_STORE_DIR", DEFAULT_CHART_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("CHART_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+        # 索引：文件名 -> 大小，按写入顺序排列
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    async def put(self, data: bytes, extension: str) -> Tuple[str, str]:
+        """
+        保存图像，相同内容只写入一次。
+
+        Args:
+            data: 图像数据
+            extension: 扩展名（png、jpeg、webp、svg、pdf）
+
+        Returns:
+            (文件名, 内容哈希)
+        """
+        if extension not in CHART_MIME_TYPES:
+            raise ValueError(f"不支持的图表格式: {extension}")
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest}.{extension}"
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, name, data)
+        return name, digest
+
+    def path_for(self, name: str) -> Optional[str]:
+        """文件名合法且文件存在时返回其路径"""
+        match = _NAME_RE.match(name)
+        if match is None or match.group(2) not in CHART_MIME_TYPES:
+            return None
+        path = self._path(name)
+        return path if os.path.isfile(path) else None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def _load_index(self):
+        """扫描目录重建索引（调用方需持有锁）"""
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not _NAME_RE.match(name):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._size += size
+        self._loaded = True
+
+    def _write(self, name: str, data: bytes):
+        path = self._path(name)
+        with self._lock:
+            if not self._loaded:
+                self._load_index()
+            if name in self._index and os.path.exists(path):
+                self._index.move_to_end(name)
+                return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"保存图表文件失败: {str(e)}")
+            raise
+        with self._lock:
+            old = self._index.pop(name, None)
+            if old is not None:
+                self._size -= old
+            self._index[name] = len(data)
+            self._size += len(data)
+            self._evict(keep=name)
+
+    def _evict(self, keep: str):
+        """按写入顺序删除最旧的图表，直到总大小不超过上限（调用方需持有锁）"""
+        if self.max_bytes <= 0:
+            return
+        while self._size > self.max_bytes and len(self._index) > 1:
+            name, size = next(iter(self._index.items()))
+            if name == keep:
+                break
+            del self._index[name]
+            self._size -= size
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回图表数量和总大小"""
+        return {"count": len(self._index), "bytes": self._size}
+
+
+def chart_url(name: str) -> str:
+    """图表的访问URL，CHART_BASE_URL未设置时返回相对路径"""
+    return f"{os.getenv('CHART_BASE_URL', '').rstrip('/')}/charts/{name}"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断If-None-Match是否与ETag匹配（支持多个值、弱比较前缀和*）"""
+    if not if_none_match:
+        return False
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        if value == "*" or value == etag:
+            return True
+    return False
+
+
+# 全局图表存储实例
+_chart_store: Optional[ChartStore] = None
+
+
+def get_chart_store() -> ChartStore:
+    """获取全局图表存储实例（首次调用时创建）"""
+    global _chart_store
+    if _chart_store is None:
+        _chart_store = ChartStore()
+    return _chart_store
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+离线的假LLM提供商（LLM_PROVIDER=fake），回放预先录制的HTML响应。
+用于没有API密钥的环境下做基准测试和联调，可配置首字延迟和生成速度。
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, List, Optional
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# 默认的录制响应目录
+DEFAULT_RESPONSES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "benchmarks", "fixtures", "responses"
+)
+
+# 没有录制响应时使用的内置响应
+_BUILTIN_RESPONSE = """```html
+<html>
+<head><meta charset="utf-8"></head>
+<body>
+<div class="chart-container">
+  <div class="chart-title">示例流程图</div>
+  <div class="node start">开始</div>
+  <div class="edge">→</div>
+  <div class="node">处理</div>
+  <div class="edge">→</div>
+  <div class="node end">结束</div>
+</div>
+</body>
+</html>
+```
+以上是生成的图表。"""
+
+
+class FakeLLMProvider:
+    """
+    回放录制响应的假LLM。
+
+    响应选择规则：指定fixture时使用同名文件（<fixture>.html）；目录中存在以提示词哈希
+    前16位命名的文件（<hash>.html）时使用该文件，否则按提示词哈希在所有录制响应中
+    确定性地选择一个。基准测试按图表规模显式指定fixture，避免哈希选中其他规模的响应。
+    """
+
+    def __init__(
+        self,
+        responses_dir: Optional[str] = None,
+        latency_ms: Optional[float] = None,
+        ttft_ms: Optional[float] = None,
+        chunk_size: int = 64
+    ):
+        """
+        Args:
+            responses_dir: 录制响应目录，默认读取FAKE_LLM_RESPONSES_DIR
+            latency_ms: 从请求到最后一个片段的总耗时（毫秒），默认读取FAKE_LLM_LATENCY_MS
+            ttft_ms: 首个片段的延迟（毫秒），默认读取FAKE_LLM_TTFT_MS，未设置时为总耗时的20%
+            chunk_size: 每个流式片段的字符数
+        """
+        self.responses_dir = responses_dir or os.getenv("FAKE_LLM_RESPONSES_DIR", DEFAULT_RESPONSES_DIR)
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+        ttft_env = os.getenv("FAKE_LLM_TTFT_MS")
+        if ttft_ms is None:
+            ttft_ms = float(ttft_env) if ttft_env else self.latency_ms * 0.2
+        self.ttft_ms = min(ttft_ms, self.latency_ms) if self.latency_ms else ttft_ms
+        self.chunk_size = max(1, chunk_size)
+        self._responses: Optional[List[str]] = None
+
+    def _load(self) -> List[str]:
+        if self._responses is None:
+            files = []
+            if os.path.isdir(self.responses_dir):
+                files = sorted(f for f in os.listdir(self.responses_dir) if f.endswith(".html"))
+            self._responses = files
+            if not files:
+                logger.warning(f"未找到录制的LLM响应（{self.responses_dir}），使用内置响应")
+        return self._responses
+
+    def response_for(self, prompt: str, fixture: Optional[str] = None) -> str:
+        """
+        返回提示词对应的录制响应。
+
+        Args:
+            prompt: 提示词
+            fixture: 录制响应名称（不含.html），指定时不按提示词选择
+
+        Raises:
+            FileNotFoundError: 指定的录制响应不存在
+        """
+        files = self._load()
+        if fixture is not None:
+            name = f"{fixture}.html"
+            if name not in files:
+                raise FileNotFoundError(f"未找到录制的LLM响应: {os.path.join(self.responses_dir, name)}")
+        elif not files:
+            return _BUILTIN_RESPONSE
+        else:
+            digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+            name = f"{digest[:16]}.html"
+            if name not in files:
+                name = files[int(digest, 16) % len(files)]
+        with open(os.path.join(self.responses_dir, name), "r", encoding="utf-8") as f:
+            return f.read()
+
+    async def stream(self, prompt: str, fixture: Optional[str] = None) -> AsyncIterator[str]:
+        """按配置的延迟流式返回录制响应，参数同response_for"""
+        response = self.response_for(prompt, fixture)
+        chunks = [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)] or [""]
+        if self.ttft_ms > 0:
+            await asyncio.sleep(self.ttft_ms / 1000)
+        # 剩余时间均匀分配到后续片段
+        remaining = max(0.0, self.latency_ms - self.ttft_ms) / 1000
+        interval = remaining / max(1, len(chunks) - 1)
+        for index, chunk in enumerate(chunks):
+            if index and interval > 0:
+                await asyncio.sleep(interval)
+            yield chunk
+
+
+# 全局假LLM实例
+_fake_llm: Optional[FakeLLMProvider] = None
+
+
+def get_fake_llm() -> FakeLLMProvider:
+    """获取全局假LLM实例（首次调用时创建）"""
+    global _fake_llm
+    if _fake_llm is None:
+        _fake_llm = FakeLLMProvider()
+    return _fake_llm
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+不依赖浏览器的简单图像生成模块，用Pillow绘制错误提示卡片和文本列表卡片。
+生成失败时的错误图和CSS模板列表图都走这里，结果按内容缓存，
+LLM提供商故障导致大量请求失败时也不会额外启动浏览器。
+"""
+
+import io
+import os
+import base64
+import logging
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# Pillow不可用时返回的1x1空白PNG
+_BLANK_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+P+/HgAFdQJ+OwRXvQAAAABJRU5ErkJggg=="
+)
+
+# 常见的中文字体位置，按顺序尝试
+_CJK_FONT_CANDIDATES = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "Arial",
+)
+
+_PADDING = 20
+_LINE_SPACING = 6
+
+# 卡片配色：(标题颜色, 正文颜色)
+_ERROR_COLORS = ((200, 30, 30), (60, 60, 60))
+_LIST_COLORS = ((30, 30, 30), (60, 60, 60))
+
+
+@lru_cache(maxsize=8)
+def _load_font(size: int):
+    """加载字体，优先使用CARD_FONT_PATH指定的字体，其次是常见的中文字体"""
+    from PIL import ImageFont
+
+    candidates = [os.getenv("CARD_FONT_PATH")] + list(_CJK_FONT_CANDIDATES)
+    for path in candidates:
+        if not path:
+            continue
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    logger.warning("未找到可用的中文字体，图像中的中文可能无法显示，可通过CARD_FONT_PATH指定字体")
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow 10.1之前的默认字体不支持指定字号
+        return ImageFont.load_default()
+
+
+def _wrap_text(draw, text: str, font, max_width: int) -> List[str]:
+    """按像素宽度折行，中文按字符、英文尽量按单词断开"""
+    lines = []
+    for paragraph in text.splitlines() or [""]:
+        line = ""
+        for char in paragraph:
+            candidate = line + char
+            if line and draw.textlength(candidate, font=font) > max_width:
+                # 英文单词中间断开时，把整个单词移到下一行
+                cut = line.rfind(" ")
+                if char != " " and cut > 0 and line[-1] != " ":
+                    lines.append(line[:cut])
+                    line = line[cut + 1:] + char
+                else:
+                    lines.append(line.rstrip())
+                    line = char.lstrip()
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def _draw_card(
+    title: str,
+    lines: Sequence[str],
+    width: int,
+    height: int,
+    colors: Tuple[Tuple[int, int, int], Tuple[int, int, int]]
+) -> bytes:
+    """绘制标题加正文的卡片，正文超出高度时截断"""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return _BLANK_PNG
+
+    img = Image.new("RGB", (width, height), color=(255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    title_font = _load_font(20)
+    body_font = _load_font(14)
+    max_width = width - 2 * _PADDING
+
+    y = _PADDING
+    for line in _wrap_text(draw, title, title_font, max_width):
+        draw.text((_PADDING, y), line, fill=colors[0], font=title_font)
+        y += 20 + _LINE_SPACING
+    y += _LINE_SPACING
+
+    body = []
+    for text in lines:
+        body.extend(_wrap_text(draw, text, body_font, max_width))
+    line_height = 14 + _LINE_SPACING
+    for i, line in enumerate(body):
+        if y + 2 * line_height > height - _PADDING and i < len(body) - 1:
+            draw.text((_PADDING, y), "…", fill=colors[1], font=body_font)
+            break
+        draw.text((_PADDING, y), line, fill=colors[1], font=body_font)
+        y += line_height
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=256)
+def render_error_card(title: str, message: str, width: int = 400, height: int = 300) -> bytes:
+    """
+    生成错误提示图像（PNG），相同参数直接返回缓存结果。
+
+    Args:
+        title: 标题
+        message: 错误消息
+        width: 图像宽度
+        height: 图像高度
+
+    Returns:
+        PNG图像的二进制内容
+    """
+    try:
+        return _draw_card(title, [message], width, height, _ERROR_COLORS)
+    except Exception as e:
+        logger.error(f"生成错误图像失败: {str(e)}")
+        return _BLANK_PNG
+
+
+@lru_cache(maxsize=32)
+def render_list_card(title: str, items: Tuple[str, ...], width: int = 400, height: int = 400) -> bytes:
+    """
+    生成文本列表图像（PNG），相同参数直接返回缓存结果。
+
+    Args:
+        title: 标题
+        items: 列表项（元组，作为缓存键）
+        width: 图像宽度
+        height: 图像高度
+
+    Returns:
+        PNG图像的二进制内容
+    """
+    try:
+        return _draw_card(title, [f"• {item}" for item in items], width, height, _LIST_COLORS)
+    except Exception as e:
+        logger.error(f"生成列表图像失败: {str(e)}")
+        return _BLANK_PNG
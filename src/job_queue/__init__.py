@@ -0,0 +1,59 @@
+"""
+任务队列包：多节点部署时，API节点只把generate_chart任务放入队列，
+由独立的工作节点领取执行并发布结果，两者可以分别扩容。
+"""
+
+import os
+from typing import Optional
+
+from .base import Job, JobFailedError, JobQueue, decode_result, encode_result
+from .sqlite_queue import SQLiteJobQueue
+from .redis_queue import RedisJobQueue
+from .worker import JobWorker
+
+
+def create_job_queue(url: Optional[str] = None) -> JobQueue:
+    """
+    按地址创建任务队列。
+
+    Args:
+        url: 队列地址，默认读取JOB_QUEUE_URL；redis://、rediss://或unix://为Redis，
+            sqlite:///路径为SQLite，为空时使用src/cache/jobs.sqlite3
+
+    Returns:
+        任务队列实例
+    """
+    url = url if url is not None else os.getenv("JOB_QUEUE_URL", "")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobQueue(url)
+    if url.startswith("sqlite://"):
+        return SQLiteJobQueue(url[len("sqlite://"):] or None)
+    if url:
+        raise ValueError(f"不支持的任务队列地址: {url}")
+    return SQLiteJobQueue()
+
+
+# 全局任务队列实例
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """获取全局任务队列实例（首次调用时创建）"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = create_job_queue()
+    return _job_queue
+
+
+__all__ = [
+    'Job',
+    'JobFailedError',
+    'JobQueue',
+    'JobWorker',
+    'RedisJobQueue',
+    'SQLiteJobQueue',
+    'create_job_queue',
+    'decode_result',
+    'encode_result',
+    'get_job_queue'
+]
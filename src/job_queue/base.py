@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务队列的公共接口和结果编解码。
+
+任务以内容键（规范化后的请求参数哈希）为ID，相同内容的任务在队列中只存在一份：
+排队中或执行中的任务被再次提交时直接等待已有任务，已完成的结果在有效期内可以复用。
+工作节点领取任务时获得一个租约，需要定期续约；租约过期的任务会被重新放回队列。
+
+带会话ID的任务按提交顺序逐个执行：同一会话有任务在执行时，该会话后续的任务不会被领取。
+会话的最新状态也保存在队列后端中，由所有工作节点共享。
+"""
+
+import os
+import abc
+import json
+import base64
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobFailedError(RuntimeError):
+    """任务在工作节点上执行失败，或工作节点多次失联后放弃"""
+
+
+@dataclass
+class Job:
+    """工作节点领取到的任务"""
+    key: str
+    payload: Dict[str, Any]
+    # 包括本次在内的执行次数
+    attempts: int = 1
+    # 入队时间（time.time()，跨节点比较）
+    enqueued_at: float = 0.0
+
+
+def encode_result(result: Dict[str, Any]) -> str:
+    """把任务结果编码为JSON，bytes值（如图像数据）以base64保存"""
+    def default(value):
+        if isinstance(value, (bytes, bytearray)):
+            return {"$bytes": base64.b64encode(value).decode("ascii")}
+        raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+    return json.dumps(result, ensure_ascii=False, default=default)
+
+
+def decode_result(data: str) -> Dict[str, Any]:
+    """encode_result的逆操作"""
+    def hook(obj):
+        if len(obj) == 1 and "$bytes" in obj:
+            return base64.b64decode(obj["$bytes"])
+        return obj
+    return json.loads(data, object_hook=hook)
+
+
+class JobQueue(abc.ABC):
+    """
+    任务队列接口。
+
+    API节点调用submit/wait提交任务并等待结果，工作节点调用claim领取任务，
+    执行期间调用extend续约，最后调用complete或fail发布结果。
+    """
+
+    def __init__(
+        self,
+        lease_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        result_ttl: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            lease_seconds: 任务租约时长（秒），默认读取JOB_LEASE_SECONDS
+            max_attempts: 工作节点失联后最多执行的次数，默认读取JOB_MAX_ATTEMPTS
+            result_ttl: 已完成任务的结果保留时长（秒），默认读取JOB_RESULT_TTL
+            poll_interval: 轮询间隔（秒），默认读取JOB_POLL_INTERVAL
+        """
+        self.lease_seconds = lease_seconds if lease_seconds is not None else float(
+            os.getenv("JOB_LEASE_SECONDS", "60"))
+        self.max_attempts = max(1, max_attempts if max_attempts is not None else int(
+            os.getenv("JOB_MAX_ATTEMPTS", "2")))
+        self.result_ttl = result_ttl if result_ttl is not None else float(
+            os.getenv("JOB_RESULT_TTL", "600"))
+        self.poll_interval = max(0.01, poll_interval if poll_interval is not None else float(
+            os.getenv("JOB_POLL_INTERVAL", "0.2")))
+
+    @abc.abstractmethod
+    async def submit(
+        self,
+        key: str,
+        payload: Dict[str, Any],
+        reuse_result: bool = True,
+        session_id: Optional[str] = None
+    ) -> bool:
+        """
+        提交任务。相同键的任务正在排队或执行时不重复提交。
+
+        Args:
+            key: 任务内容键
+            payload: 任务参数（可JSON序列化）
+            reuse_result: 是否复用有效期内已完成的结果
+            session_id: 图表会话ID，同一会话的任务不会同时执行
+
+        Returns:
+            是否创建了新任务（False表示与已有任务合并）
+        """
+
+    @abc.abstractmethod
+    async def wait(self, key: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        等待任务完成并返回结果。
+
+        Raises:
+            JobFailedError: 任务执行失败或不存在
+            asyncio.TimeoutError: 超过timeout仍未完成
+        """
+
+    @abc.abstractmethod
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        """
+        领取最早入队的任务（跳过会话中已有任务在执行的任务），同时把租约过期的任务放回队列；
+        没有任务时返回None
+        """
+
+    @abc.abstractmethod
+    async def extend(self, key: str, worker_id: str) -> bool:
+        """续约，任务已不属于该工作节点时返回False"""
+
+    @abc.abstractmethod
+    async def complete(self, key: str, worker_id: str, result: Dict[str, Any]):
+        """发布任务结果"""
+
+    @abc.abstractmethod
+    async def fail(self, key: str, worker_id: str, error: str):
+        """把任务标记为失败"""
+
+    @abc.abstractmethod
+    async def depth(self) -> int:
+        """排队中的任务数"""
+
+    @abc.abstractmethod
+    async def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """读取会话的最新状态，不存在或已过期时返回None"""
+
+    @abc.abstractmethod
+    async def save_session(self, session_id: str, state: Dict[str, Any], ttl: float):
+        """保存会话的最新状态，ttl为有效期（秒），0表示不过期"""
+
+    @abc.abstractmethod
+    async def delete_session(self, session_id: str):
+        """删除会话"""
+
+    async def close(self):
+        """释放连接"""
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于Redis协议的任务队列，供多台机器上的API节点和工作节点共享。
+使用redis-py的asyncio客户端（可选依赖：pip install redis），
+任何兼容Redis协议并支持Lua脚本和发布订阅的服务都可以作为后端。
+
+数据结构（前缀默认为mcp:jobs:）：
+    <前缀>job:<键>      任务哈希（payload、status、result、error、worker、attempts、enqueued_at、session）
+    <前缀>pending       排队中的任务键列表
+    <前缀>running       执行中的任务键，分值为租约到期时间
+    <前缀>done:<键>     任务结束通知频道
+    <前缀>busy          会话ID到该会话执行中任务键的哈希
+    <前缀>session:<ID>  会话最新状态（JSON），按会话有效期过期
+"""
+
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from .base import DONE, FAILED, Job, JobFailedError, JobQueue, decode_result, encode_result
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 提交：相同键的任务排队中、执行中或（允许复用时）已完成时不重复提交
+_SUBMIT_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status == 'pending' or status == 'running' then return 0 end
+if status == 'done' and ARGV[4] == '1' then return 0 end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'payload', ARGV[2], 'status', 'pending', 'attempts', 0, 'enqueued_at', ARGV[3])
+if ARGV[5] ~= '' then redis.call('HSET', KEYS[1], 'session', ARGV[5]) end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+return 1
+"""
+
+# 领取：先处理租约过期的任务，再从队首起取出第一个所属会话没有任务在执行的排队中任务
+_CLAIM_SCRIPT = """
+local prefix = ARGV[5]
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, key in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], key)
+    local job = prefix .. 'job:' .. key
+    local session = redis.call('HGET', job, 'session')
+    if session and redis.call('HGET', KEYS[3], session) == key then
+        redis.call('HDEL', KEYS[3], session)
+    end
+    if redis.call('HGET', job, 'status') == 'running' then
+        if tonumber(redis.call('HGET', job, 'attempts')) >= tonumber(ARGV[4]) then
+            redis.call('HSET', job, 'status', 'failed', 'error', ARGV[7], 'finished_at', ARGV[1])
+            redis.call('EXPIRE', job, ARGV[6])
+            redis.call('PUBLISH', prefix .. 'done:' .. key, 'failed')
+        else
+            redis.call('HSET', job, 'status', 'pending')
+            redis.call('LPUSH', KEYS[1], key)
+        end
+    end
+end
+local index = 0
+while true do
+    local key = redis.call('LINDEX', KEYS[1], index)
+    if not key then return false end
+    local job = prefix .. 'job:' .. key
+    local fields = redis.call('HMGET', job, 'status', 'session')
+    local session = fields[2]
+    if fields[1] == 'pending' and session and redis.call('HEXISTS', KEYS[3], session) == 1 then
+        index = index + 1
+    else
+        -- 按位置移除（同一键可能在列表中出现多次）
+        redis.call('LSET', KEYS[1], index, '')
+        redis.call('LREM', KEYS[1], 1, '')
+        if fields[1] == 'pending' then
+            local attempts = redis.call('HINCRBY', job, 'attempts', 1)
+            redis.call('HSET', job, 'status', 'running', 'worker', ARGV[3])
+            redis.call('ZADD', KEYS[2], ARGV[2], key)
+            if session then redis.call('HSET', KEYS[3], session, key) end
+            return {key, redis.call('HGET', job, 'payload'), attempts, redis.call('HGET', job, 'enqueued_at')}
+        end
+    end
+end
+"""
+
+# 续约：任务仍由该工作节点执行时更新租约到期时间
+_EXTEND_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' or redis.call('HGET', KEYS[1], 'worker') ~= ARGV[2] then
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+# 结束：写入结果或错误，释放会话，设置过期时间并通知等待方
+_FINISH_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+local session = redis.call('HGET', KEYS[1], 'session')
+if ARGV[2] == 'done' then
+    if status == false or status == 'done' then return 0 end
+    redis.call('HSET', KEYS[1], 'status', 'done', 'result', ARGV[3], 'finished_at', ARGV[5])
+    redis.call('HDEL', KEYS[1], 'error')
+else
+    if status ~= 'running' or redis.call('HGET', KEYS[1], 'worker') ~= ARGV[6] then return 0 end
+    redis.call('HSET', KEYS[1], 'status', 'failed', 'error', ARGV[4], 'finished_at', ARGV[5])
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+if session and redis.call('HGET', KEYS[4], session) == ARGV[1] then
+    redis.call('HDEL', KEYS[4], session)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+redis.call('PUBLISH', KEYS[3], ARGV[2])
+return 1
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """Redis任务队列，所有状态变更都在Lua脚本中原子完成，等待结果通过发布订阅通知"""
+
+    def __init__(self, url: str, prefix: str = "mcp:jobs:", **kwargs):
+        """
+        Args:
+            url: 连接地址，如redis://localhost:6379/0
+            prefix: 键前缀
+            **kwargs: 传给JobQueue的租约、重试和轮询参数
+        """
+        super().__init__(**kwargs)
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise ValueError("使用Redis任务队列需要安装redis（pip install redis）")
+        self.url = url
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url, decode_responses=True)
+        self._submit = self._client.register_script(_SUBMIT_SCRIPT)
+        self._claim = self._client.register_script(_CLAIM_SCRIPT)
+        self._extend = self._client.register_script(_EXTEND_SCRIPT)
+        self._finish = self._client.register_script(_FINISH_SCRIPT)
+
+    def _job_key(self, key: str) -> str:
+        return f"{self.prefix}job:{key}"
+
+    @property
+    def _pending_key(self) -> str:
+        return f"{self.prefix}pending"
+
+    @property
+    def _running_key(self) -> str:
+        return f"{self.prefix}running"
+
+    def _channel(self, key: str) -> str:
+        return f"{self.prefix}done:{key}"
+
+    @property
+    def _busy_key(self) -> str:
+        return f"{self.prefix}busy"
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.prefix}session:{session_id}"
+
+    def _ttl(self) -> int:
+        return max(1, int(self.result_ttl))
+
+    async def submit(
+        self,
+        key: str,
+        payload: Dict[str, Any],
+        reuse_result: bool = True,
+        session_id: Optional[str] = None
+    ) -> bool:
+        created = await self._submit(
+            keys=[self._job_key(key), self._pending_key],
+            args=[key, json.dumps(payload, ensure_ascii=False), time.time(), "1" if reuse_result else "0",
+                  session_id or ""]
+        )
+        return bool(created)
+
+    async def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取已结束任务的结果；未结束时返回None"""
+        status, result, error = await self._client.hmget(self._job_key(key), "status", "result", "error")
+        if status is None:
+            raise JobFailedError("任务不存在或结果已过期")
+        if status == DONE:
+            return decode_result(result)
+        if status == FAILED:
+            raise JobFailedError(error or "任务执行失败")
+        return None
+
+    async def wait(self, key: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pubsub = self._client.pubsub()
+        try:
+            # 先订阅再检查状态，避免错过在两者之间发布的通知
+            await pubsub.subscribe(self._channel(key))
+            while True:
+                result = await self._read(key)
+                if result is not None:
+                    return result
+                wait_for = 1.0
+                if deadline is not None:
+                    wait_for = deadline - time.monotonic()
+                    if wait_for <= 0:
+                        raise asyncio.TimeoutError()
+                    wait_for = min(wait_for, 1.0)
+                # 最多等待1秒后重新检查，防止通知丢失
+                await pubsub.get_message(ignore_subscribe_messages=True, timeout=wait_for)
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except Exception as e:
+                logger.debug(f"关闭订阅时出错: {str(e)}")
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        now = time.time()
+        row = await self._claim(
+            keys=[self._pending_key, self._running_key, self._busy_key],
+            args=[now, now + self.lease_seconds, worker_id, self.max_attempts,
+                  self.prefix, self._ttl(), "工作节点失联，任务已放弃"]
+        )
+        if not row:
+            return None
+        key, payload, attempts, enqueued_at = row
+        return Job(key=key, payload=json.loads(payload), attempts=int(attempts), enqueued_at=float(enqueued_at))
+
+    async def extend(self, key: str, worker_id: str) -> bool:
+        extended = await self._extend(
+            keys=[self._job_key(key), self._running_key],
+            args=[key, worker_id, time.time() + self.lease_seconds]
+        )
+        return bool(extended)
+
+    async def _finish_job(self, key: str, worker_id: str, status: str, result: str = "", error: str = ""):
+        await self._finish(
+            keys=[self._job_key(key), self._running_key, self._channel(key), self._busy_key],
+            args=[key, status, result, error, time.time(), worker_id, self._ttl()]
+        )
+
+    async def complete(self, key: str, worker_id: str, result: Dict[str, Any]):
+        await self._finish_job(key, worker_id, DONE, result=encode_result(result))
+
+    async def fail(self, key: str, worker_id: str, error: str):
+        await self._finish_job(key, worker_id, FAILED, error=error)
+
+    async def depth(self) -> int:
+        return int(await self._client.llen(self._pending_key))
+
+    async def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        state = await self._client.get(self._session_key(session_id))
+        return json.loads(state) if state is not None else None
+
+    async def save_session(self, session_id: str, state: Dict[str, Any], ttl: float):
+        await self._client.set(
+            self._session_key(session_id),
+            json.dumps(state, ensure_ascii=False),
+            ex=max(1, int(ttl)) if ttl > 0 else None
+        )
+
+    async def delete_session(self, session_id: str):
+        await self._client.delete(self._session_key(session_id))
+
+    async def close(self):
+        await self._client.aclose()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于SQLite的任务队列，适合单机上的多个进程共享（数据库文件需在同一台机器上）。
+等待结果通过轮询实现。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from .base import (
+    DONE, FAILED, PENDING, RUNNING,
+    Job, JobFailedError, JobQueue, decode_result, encode_result
+)
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 默认数据库路径
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "jobs.sqlite3")
+
+
+class SQLiteJobQueue(JobQueue):
+    """SQLite任务队列，领取任务在IMMEDIATE事务中完成，多个进程不会领取到同一任务"""
+
+    def __init__(self, path: Optional[str] = None, **kwargs):
+        """
+        Args:
+            path: 数据库路径，默认为src/cache/jobs.sqlite3
+            **kwargs: 传给JobQueue的租约、重试和轮询参数
+        """
+        super().__init__(**kwargs)
+        self.path = path or DEFAULT_QUEUE_PATH
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # 自行管理事务，领取任务时需要BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " worker TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " lease_until REAL,"
+                " enqueued_at REAL NOT NULL,"
+                " finished_at REAL,"
+                " session TEXT)"
+            )
+            # 旧版本创建的数据库没有session列
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "session" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN session TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, enqueued_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " expires_at REAL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, func, *args):
+        """在IMMEDIATE事务中执行func(conn, *args)"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn, *args)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._transaction, func, *args)
+
+    def _submit_sync(self, conn, key: str, payload: str, reuse_result: bool, session_id: Optional[str]) -> bool:
+        now = time.time()
+        # 清理过期的结果
+        if self.result_ttl > 0:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, now - self.result_ttl)
+            )
+        row = conn.execute("SELECT status FROM jobs WHERE key = ?", (key,)).fetchone()
+        if row is not None and (row[0] in (PENDING, RUNNING) or (row[0] == DONE and reuse_result)):
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (key, payload, status, attempts, enqueued_at, session) "
+            "VALUES (?, ?, ?, 0, ?, ?)",
+            (key, payload, PENDING, now, session_id)
+        )
+        return True
+
+    def _claim_sync(self, conn, worker_id: str) -> Optional[Job]:
+        now = time.time()
+        # 租约过期的任务：未超过重试次数时放回队列，否则标记为失败
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+            "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (FAILED, "工作节点失联，任务已放弃", now, RUNNING, now, self.max_attempts)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND lease_until < ?",
+            (PENDING, RUNNING, now)
+        )
+        # 同一会话有任务在执行时跳过该会话的任务
+        row = conn.execute(
+            "SELECT key, payload, attempts, enqueued_at FROM jobs WHERE status = ? AND (session IS NULL"
+            " OR session NOT IN (SELECT session FROM jobs WHERE status = ? AND session IS NOT NULL)) "
+            "ORDER BY enqueued_at LIMIT 1",
+            (PENDING, RUNNING)
+        ).fetchone()
+        if row is None:
+            return None
+        key, payload, attempts, enqueued_at = row
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = ?, attempts = ?, lease_until = ? WHERE key = ?",
+            (RUNNING, worker_id, attempts + 1, now + self.lease_seconds, key)
+        )
+        return Job(key=key, payload=json.loads(payload), attempts=attempts + 1, enqueued_at=enqueued_at)
+
+    def _extend_sync(self, conn, key: str, worker_id: str) -> bool:
+        cur = conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE key = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease_seconds, key, worker_id, RUNNING)
+        )
+        return cur.rowcount > 0
+
+    def _finish_sync(self, conn, key: str, worker_id: str, status: str, result: Optional[str], error: Optional[str]):
+        if status == DONE:
+            # 租约过期后迟到的结果同样有效，只要任务还没有其他节点的结果
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, finished_at = ? WHERE key = ? AND status != ?",
+                (DONE, result, time.time(), key, DONE)
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE key = ? AND worker = ? AND status = ?",
+                (FAILED, error, time.time(), key, worker_id, RUNNING)
+            )
+
+    def _save_session_sync(self, conn, session_id: str, state: str, ttl: float):
+        now = time.time()
+        conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, state, expires_at) VALUES (?, ?, ?)",
+            (session_id, state, now + ttl if ttl > 0 else None)
+        )
+
+    def _read_sync(self, key: str):
+        with self._lock:
+            return self._connect().execute(
+                "SELECT status, result, error FROM jobs WHERE key = ?", (key,)
+            ).fetchone()
+
+    async def submit(
+        self,
+        key: str,
+        payload: Dict[str, Any],
+        reuse_result: bool = True,
+        session_id: Optional[str] = None
+    ) -> bool:
+        return await self._run(
+            self._submit_sync, key, json.dumps(payload, ensure_ascii=False), reuse_result, session_id
+        )
+
+    async def wait(self, key: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            row = await loop.run_in_executor(None, self._read_sync, key)
+            if row is None:
+                raise JobFailedError("任务不存在或结果已过期")
+            status, result, error = row
+            if status == DONE:
+                return decode_result(result)
+            if status == FAILED:
+                raise JobFailedError(error or "任务执行失败")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(self.poll_interval)
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        return await self._run(self._claim_sync, worker_id)
+
+    async def extend(self, key: str, worker_id: str) -> bool:
+        return await self._run(self._extend_sync, key, worker_id)
+
+    async def complete(self, key: str, worker_id: str, result: Dict[str, Any]):
+        await self._run(self._finish_sync, key, worker_id, DONE, encode_result(result), None)
+
+    async def fail(self, key: str, worker_id: str, error: str):
+        await self._run(self._finish_sync, key, worker_id, FAILED, None, error)
+
+    async def depth(self) -> int:
+        loop = asyncio.get_running_loop()
+
+        def count():
+            with self._lock:
+                return self._connect().execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ?", (PENDING,)
+                ).fetchone()[0]
+        return await loop.run_in_executor(None, count)
+
+    async def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+
+        def read():
+            with self._lock:
+                return self._connect().execute(
+                    "SELECT state FROM sessions WHERE id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                    (session_id, time.time())
+                ).fetchone()
+        row = await loop.run_in_executor(None, read)
+        return json.loads(row[0]) if row is not None else None
+
+    async def save_session(self, session_id: str, state: Dict[str, Any], ttl: float):
+        await self._run(self._save_session_sync, session_id, json.dumps(state, ensure_ascii=False), ttl)
+
+    async def delete_session(self, session_id: str):
+        await self._run(lambda conn: conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)))
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
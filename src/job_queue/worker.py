@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+工作节点的任务循环：从任务队列领取任务，执行期间定期续约，完成后发布结果。
+"""
+
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.metrics import JOB_QUEUE_WAIT, JOBS
+from .base import JobQueue
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """并发执行队列中任务的工作节点"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        concurrency: Optional[int] = None,
+        worker_id: Optional[str] = None
+    ):
+        """
+        Args:
+            queue: 任务队列
+            handler: 执行单个任务的协程函数，参数为任务payload，返回结果（可含bytes）
+            concurrency: 同时执行的任务数，默认读取JOB_WORKER_CONCURRENCY
+            worker_id: 工作节点标识，默认为主机名、进程号加随机后缀
+        """
+        if concurrency is None:
+            concurrency = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """启动任务循环"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.ensure_future(self._loop()) for _ in range(self.concurrency)]
+        logger.info(f"工作节点 {self.worker_id} 已启动，并发数 {self.concurrency}")
+
+    async def close(self):
+        """停止领取新任务，取消执行中的任务（其租约到期后会被其他节点重新执行）"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"工作节点 {self.worker_id} 已停止")
+
+    async def _loop(self):
+        while True:
+            try:
+                job = await self.queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"领取任务失败: {str(e)}")
+                await asyncio.sleep(max(1.0, self.queue.poll_interval))
+                continue
+            if job is None:
+                await asyncio.sleep(self.queue.poll_interval)
+                continue
+            JOB_QUEUE_WAIT.observe(max(0.0, time.time() - job.enqueued_at))
+            try:
+                await self._run(job.key, job.payload, job.attempts)
+            except Exception as e:
+                # 结果未能发布时，任务在租约到期后由其他节点重新执行
+                logger.error(f"发布任务 {job.key[:12]} 的结果失败: {str(e)}")
+
+    async def _run(self, key: str, payload: Dict[str, Any], attempts: int):
+        logger.info(f"执行任务 {key[:12]}（第 {attempts} 次）")
+        heartbeat = asyncio.ensure_future(self._heartbeat(key))
+        try:
+            result = await self.handler(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"任务 {key[:12]} 执行失败: {str(e)}")
+            JOBS.inc(event="failed")
+            await self.queue.fail(key, self.worker_id, str(e))
+            return
+        finally:
+            heartbeat.cancel()
+        JOBS.inc(event="completed")
+        await self.queue.complete(key, self.worker_id, result)
+
+    async def _heartbeat(self, key: str):
+        """每隔租约时长的三分之一续约一次"""
+        interval = max(0.1, self.queue.lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.queue.extend(key, self.worker_id):
+                    logger.warning(f"任务 {key[:12]} 的租约已失效")
+                    return
+            except Exception as e:
+                logger.warning(f"任务 {key[:12]} 续约失败: {str(e)}")
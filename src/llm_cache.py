@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+LLM响应缓存模块，基于SQLite持久化保存LLM的原始响应。
+按提供商、模型和提示内容的哈希作为键，支持TTL过期和条目数上限淘汰。
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import asyncio
+import threading
+from typing import Optional, Dict
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# 默认缓存数据库路径
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "cache", "llm_cache.sqlite3")
+
+
+def make_llm_key(provider: str, model: str, prompt: str) -> str:
+    """
+    计算LLM响应缓存键。
+
+    Args:
+        provider: LLM提供商
+        model: 模型名称
+        prompt: 发送给LLM的提示
+
+    Returns:
+        十六进制SHA-256哈希
+    """
+    hasher = hashlib.sha256()
+    for part in (provider, model, prompt):
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+class LLMResponseCache:
+    """基于SQLite的LLM响应缓存"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None
+    ):
+        """
+        Args:
+            path: SQLite数据库路径，默认读取LLM_CACHE_PATH
+            ttl: 缓存有效期（秒），默认读取LLM_CACHE_TTL，0表示永不过期
+            max_entries: 最大缓存条目数，默认读取LLM_CACHE_MAX_ENTRIES
+        """
+        self.path = path or os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " provider TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if self.ttl > 0 and now - created_at > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                self.stats["evictions"] += 1
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return response
+
+    def _put_sync(self, key: str, provider: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, model, response, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, now, now)
+            )
+            # 清理过期条目
+            if self.ttl > 0:
+                cur = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+                self.stats["evictions"] += max(cur.rowcount, 0)
+            # 超出条目上限时按最近访问时间淘汰
+            if self.max_entries > 0:
+                cur = conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self.stats["evictions"] += max(cur.rowcount, 0)
+            conn.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """查询缓存的LLM响应，数据库访问在线程池中执行"""
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(None, self._get_sync, key)
+        except sqlite3.Error as e:
+            logger.warning(f"读取LLM响应缓存失败: {str(e)}")
+            response = None
+        if response is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        return response
+
+    async def put(self, key: str, provider: str, model: str, response: str):
+        """写入LLM响应缓存，数据库访问在线程池中执行"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._put_sync, key, provider, model, response)
+        except sqlite3.Error as e:
+            logger.warning(f"写入LLM响应缓存失败: {str(e)}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回命中/未命中/淘汰计数"""
+        return dict(self.stats)
+
+
+# 全局LLM响应缓存实例
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """获取全局LLM响应缓存实例，LLM_CACHE_ENABLED为false时返回None"""
+    global _llm_cache
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
@@ -6,16 +6,27 @@ LLM处理模块，负责调用LLM理解用户输入并生成HTML图表。
 """
 
 import os
+import time
+import difflib
 import logging
 import asyncio
-from typing import Optional, Dict, Any
-import anthropic
-import openai
-import jinja2
+from typing import Optional, Dict, Any, Tuple
 from dotenv import load_dotenv
 
 # 导入工具函数
-from src.utils import detect_chart_type, extract_css_template_name, extract_custom_css
+from src.utils import (
+    InputClassification, PatchError, apply_patch, classify_input, normalize_input,
+    get_template_registry, inject_style
+)
+from src.llm_cache import get_llm_cache, make_llm_key
+from src.mermaid import MermaidParseError, render_mermaid_to_html
+from src.fake_llm import get_fake_llm
+from src.provider_router import get_provider_router
+from src.session_store import DiagramSession, get_session_store
+from src.metrics import (
+    CACHE_HITS, CACHE_MISSES, ERRORS, LLM_DURATION, LLM_OUTPUT_BUDGET, LLM_TOKENS, LLM_TTFT,
+    SESSION_TURNS, stage_timer
+)
 
 # 配置日志
 logging.basicConfig(
@@ -27,19 +38,39 @@ logger = logging.getLogger(__name__)
 # 加载环境变量
 load_dotenv()
 
-# 初始化模板引擎
-template_loader = jinja2.FileSystemLoader(searchpath=os.path.join(os.path.dirname(__file__), "templates"))
-template_env = jinja2.Environment(loader=template_loader)
+class LLMTruncatedError(RuntimeError):
+    """LLM响应在输出</html>之前结束（通常是超出了输出token预算）"""
+
+    def __init__(self, provider: str, max_tokens: int, content: str):
+        super().__init__(f"{provider}响应未包含</html>，可能超出输出预算（{max_tokens}）")
+        self.provider = provider
+        self.max_tokens = max_tokens
+        # 已收到的不完整内容
+        self.content = content
+
+# API客户端，首次调用对应提供商时才导入SDK并创建（两个SDK的导入都较慢）
+_clients: Dict[str, Any] = {}
 
-# 初始化API客户端
-anthropic_client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
-openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+def _get_client(provider: str):
+    """获取提供商的异步客户端（首次调用时创建）"""
+    client = _clients.get(provider)
+    if client is None:
+        if provider == "anthropic":
+            import anthropic
+            client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+        else:
+            import openai
+            client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+        _clients[provider] = client
+    return client
 
 async def process_user_input(
     input_text: str,
     chart_type: Optional[str] = None,
     css_template: Optional[str] = None,
-    custom_css: Optional[str] = None
+    custom_css: Optional[str] = None,
+    use_cache: bool = True,
+    session_id: Optional[str] = None
 ) -> str:
     """
     处理用户输入，调用LLM生成HTML图表。
@@ -49,112 +80,742 @@ async def process_user_input(
         chart_type: 指定图表类型（可选）
         css_template: 要使用的CSS模板名称（可选）
         custom_css: 用户提供的自定义CSS（可选）
+        use_cache: 是否读取LLM响应缓存（为False时仍会写入新结果）
+        session_id: 图表会话ID（可选）。同一会话的后续输入视为对上一次图表的修改，
+            小改动时只让LLM返回补丁
         
     Returns:
         生成的HTML内容
     """
     logger.info(f"处理用户输入，图表类型: {chart_type}, CSS模板: {css_template}")
     
-    # 如果未指定图表类型，尝试从输入中检测
-    if not chart_type:
-        detected_type = detect_chart_type(input_text)
-        if detected_type:
-            chart_type = detected_type
-            logger.info(f"检测到图表类型: {chart_type}")
-    
-    # 如果未指定CSS模板，尝试从输入中检测
-    if not css_template:
-        detected_template = extract_css_template_name(input_text)
-        if detected_template:
-            css_template = detected_template
-            logger.info(f"检测到CSS模板: {css_template}")
-    
-    # 如果未指定自定义CSS，尝试从输入中检测
-    if not custom_css:
-        detected_css = extract_custom_css(input_text)
-        if detected_css:
-            custom_css = detected_css
-            logger.info(f"检测到自定义CSS")
+    # 一次扫描输入，检测未指定的图表类型、CSS模板和自定义CSS
+    detected = InputClassification()
+    if not (chart_type and css_template and custom_css):
+        with stage_timer("classify"):
+            detected = classify_input(input_text)
+    
+    if session_id:
+        store = get_session_store()
+        async with store.lock(session_id):
+            session = await store.get(session_id)
+            if session is not None:
+                # 修改请求沿用会话的图表类型和样式，显式指定的参数优先
+                chart_type = chart_type or session.chart_type
+                css_template = css_template or session.css_template
+                custom_css = custom_css or session.custom_css
+            chart_type, css_template, custom_css = _fill_detected(detected, chart_type, css_template, custom_css)
+            html_code, session_input = await _generate_session_html(
+                session, input_text, chart_type, use_cache
+            )
+            await store.put(session_id, DiagramSession(
+                input_text=session_input,
+                html=html_code,
+                chart_type=chart_type,
+                css_template=css_template,
+                custom_css=custom_css,
+                turns=session.turns + 1 if session is not None else 1
+            ))
+    else:
+        chart_type, css_template, custom_css = _fill_detected(detected, chart_type, css_template, custom_css)
+        html_code = await _generate_html(input_text, chart_type, use_cache)
+    
+    # 应用CSS样式
+    with stage_timer("styling"):
+        final_html = _apply_styling(html_code, css_template, custom_css)
+    
+    return final_html
+
+def _fill_detected(
+    detected: InputClassification,
+    chart_type: Optional[str],
+    css_template: Optional[str],
+    custom_css: Optional[str]
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """未指定的图表类型、CSS模板和自定义CSS使用检测结果"""
+    # 如果未指定图表类型，使用检测结果
+    if not chart_type and detected.chart_type:
+        chart_type = detected.chart_type
+        logger.info(f"检测到图表类型: {chart_type}")
+    
+    # 如果未指定CSS模板，使用检测结果
+    if not css_template and detected.css_template:
+        css_template = detected.css_template
+        logger.info(f"检测到CSS模板: {css_template}")
+    
+    # 如果未指定自定义CSS，使用检测结果
+    if not custom_css and detected.custom_css:
+        custom_css = detected.custom_css
+        logger.info(f"检测到自定义CSS")
+    
+    return chart_type, css_template, custom_css
+
+async def _generate_html(input_text: str, chart_type: Optional[str], use_cache: bool) -> str:
+    """完整生成HTML（应用CSS样式之前）"""
+    # 输入为受支持的Mermaid源码时，直接在本地解析和布局，无需调用LLM
+    html_code = await _render_locally(input_text)
+    if html_code is not None:
+        return html_code
     
     # 根据环境变量选择使用的LLM
-    llm_provider = os.getenv("LLM_PROVIDER", "anthropic").lower()
+    llm_provider = _get_llm_provider()
+    llm_model = _get_llm_model(llm_provider)
+    
+    # 准备LLM的提示：LLM看到的是原始输入，规范化后的输入只用于缓存键，
+    # 使仅有格式差异的输入命中同一缓存
+    with stage_timer("prompt_build"):
+        prompt = _create_prompt(input_text, chart_type)
+        key_prompt = _create_prompt(normalize_input(input_text), chart_type)
     
-    # 准备LLM的提示
-    prompt = _create_prompt(input_text, chart_type)
+    # 优先从缓存获取LLM响应
+    cache = get_llm_cache()
+    # 系统指令也是请求的一部分，修改后旧的缓存响应不再命中
+    cache_key = make_llm_key(llm_provider, llm_model, SYSTEM_PROMPT + key_prompt)
+    html_content = None
+    if cache is not None and use_cache:
+        html_content = await cache.get(cache_key)
+        if html_content is not None:
+            logger.info(f"LLM响应缓存命中: {cache_key[:12]}")
+            CACHE_HITS.inc(cache="llm")
+        else:
+            CACHE_MISSES.inc(cache="llm")
     
     # 获取HTML内容
-    if llm_provider == "anthropic":
-        html_content = await _call_anthropic(prompt)
-    else:  # 默认使用OpenAI
-        html_content = await _call_openai(prompt)
+    if html_content is None:
+        max_tokens = _max_output_tokens(prompt, chart_type)
+        answered_by, (html_content, truncated) = await _route_llm_call(
+            lambda provider, text: _call_html_provider(provider, text, max_tokens),
+            prompt, llm_provider
+        )
+        # 不完整的响应不写入缓存，下次请求重新生成
+        if cache is not None and not truncated:
+            await cache.put(cache_key, answered_by, _get_llm_model(answered_by), html_content)
     
     # 提取HTML代码
-    html_code = _extract_html(html_content)
+    with stage_timer("html_extract"):
+        return _extract_html(html_content)
+
+async def _render_locally(input_text: str) -> Optional[str]:
+    """使用本地Mermaid引擎生成HTML，未启用或无法处理时返回None"""
+    if not _local_render_enabled():
+        return None
+    # 解析和布局是纯CPU计算，在线程池中执行，避免大图阻塞事件循环
+    loop = asyncio.get_running_loop()
+    try:
+        html_code = await loop.run_in_executor(None, render_mermaid_to_html, input_text)
+    except MermaidParseError as e:
+        logger.info(f"本地Mermaid引擎无法处理输入，使用LLM生成: {str(e)}")
+        return None
+    logger.info("使用本地Mermaid引擎生成图表")
+    return html_code
+
+async def _call_html_provider(provider: str, prompt: str, max_tokens: int) -> Tuple[str, bool]:
+    """
+    调用提供商生成HTML，响应被截断时以LLM_MAX_OUTPUT_TOKENS重试一次。
     
-    # 应用CSS样式
-    final_html = _apply_styling(html_code, css_template, custom_css)
+    Returns:
+        (响应内容, 是否仍不完整)
+    """
+    try:
+        return await _call_provider(provider, prompt, max_tokens), False
+    except LLMTruncatedError as e:
+        ceiling = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "4000"))
+        if max_tokens >= ceiling:
+            logger.warning(f"{str(e)}，已达到输出上限，使用不完整的响应")
+            return e.content, True
+        logger.warning(f"{str(e)}，以 {ceiling} 重试")
+    try:
+        return await _call_provider(provider, prompt, ceiling), False
+    except LLMTruncatedError as e:
+        logger.warning(f"{str(e)}，使用不完整的响应")
+        return e.content, True
+
+async def _route_llm_call(invoke, prompt: str, llm_provider: str) -> Tuple[str, Any]:
+    """通过提供商路由调用LLM，主提供商慢或失败时对冲/切换到备用提供商"""
+    try:
+        return await get_provider_router().call(
+            invoke, prompt, llm_provider, _get_secondary_provider(llm_provider)
+        )
+    except Exception:
+        ERRORS.inc(stage="llm")
+        raise
+
+# 修改已有图表时使用的系统指令
+PATCH_SYSTEM_PROMPT = """你是一个HTML图表编辑助手。用户会给出一个已有的HTML图表和修改要求，请只返回修改所需的SEARCH/REPLACE块，不要返回完整的HTML。
+
+格式:
+<<<<<<< SEARCH
+（原HTML中需要修改的连续几行，必须与原文逐字一致）
+=======
+（修改后的内容）
+>>>>>>> REPLACE
+
+规则:
+1. SEARCH部分必须能在原HTML中唯一定位，只包含需要修改的行和必要的少量上下文
+2. 可以返回多个块，按在HTML中出现的顺序排列
+3. 保持原有的CSS类名（如.node、.edge、.start、.end、.chart-container等）和整体风格
+4. 新增的节点和连接线要与已有元素的布局、样式保持一致
+5. 不要输出任何解释"""
+
+async def _generate_session_html(
+    session: Optional[DiagramSession],
+    input_text: str,
+    chart_type: Optional[str],
+    use_cache: bool
+) -> Tuple[str, str]:
+    """
+    为会话中的一次输入生成HTML。
     
-    return final_html
+    Returns:
+        (HTML, 会话中保存的输入)。修改指令会合并到上一次的输入中，
+        使之后需要完整重新生成时仍有完整的描述
+    """
+    if session is None:
+        SESSION_TURNS.inc(mode="new")
+        return await _generate_html(input_text, chart_type, use_cache), input_text
+    
+    # 新输入为Mermaid源码时本地重新生成的代价很小，无需补丁
+    html_code = await _render_locally(input_text)
+    if html_code is not None:
+        SESSION_TURNS.inc(mode="local")
+        return html_code, input_text
+    
+    edit = _classify_edit(session.input_text, input_text)
+    if edit == "unchanged":
+        logger.info("会话输入未变化，复用上一次的HTML")
+        SESSION_TURNS.inc(mode="unchanged")
+        return session.html, session.input_text
+    if edit is None:
+        SESSION_TURNS.inc(mode="full")
+        return await _generate_html(input_text, chart_type, use_cache), input_text
+    
+    # 修改指令：完整重新生成时使用合并后的描述；修改后的完整输入：直接使用新输入
+    full_input = f"{session.input_text}\n\n修改要求：{input_text}" if edit == "instruction" else input_text
+    try:
+        html_code = await _patch_html(session, input_text, edit)
+        logger.info(f"已按补丁修改会话图表（第{session.turns + 1}轮）")
+        SESSION_TURNS.inc(mode="patched")
+        return html_code, full_input
+    except (PatchError, ValueError) as e:
+        logger.warning(f"补丁无法应用，完整重新生成: {str(e)}")
+    SESSION_TURNS.inc(mode="fallback")
+    return await _generate_html(full_input, chart_type, use_cache), full_input
+
+def _classify_edit(previous_input: str, input_text: str) -> Optional[str]:
+    """
+    判断会话中的新输入属于哪种修改。
+    
+    Returns:
+        "unchanged"（输入未变化）、"revision"（与上一次输入大部分相同的完整输入）、
+        "instruction"（简短的修改指令），或None（与上一次无关的新图表）
+    """
+    previous = normalize_input(previous_input)
+    current = normalize_input(input_text)
+    if previous == current:
+        return "unchanged"
+    # 按行比较，避免长输入上逐字符比较的平方复杂度
+    matcher = difflib.SequenceMatcher(None, previous.splitlines(), current.splitlines(), autojunk=False)
+    if matcher.quick_ratio() >= 0.6 and matcher.ratio() >= 0.6:
+        return "revision"
+    if len(current) <= int(os.getenv("SESSION_EDIT_MAX_CHARS", "500")):
+        return "instruction"
+    return None
+
+def _create_patch_prompt(html_code: str, previous_input: str, input_text: str, edit: str) -> str:
+    """创建修改已有图表的LLM提示"""
+    if edit == "revision":
+        diff = "\n".join(difflib.unified_diff(
+            normalize_input(previous_input).splitlines(),
+            normalize_input(input_text).splitlines(),
+            "原输入", "新输入", lineterm=""
+        ))
+        request = f"用户输入已修改如下（统一diff格式），请相应地更新图表:\n```diff\n{diff}\n```"
+    else:
+        request = f"修改要求:\n{input_text}"
+    
+    return f"""当前图表的HTML:
+```html
+{html_code}
+```
+
+{request}"""
+
+async def _patch_html(session: DiagramSession, input_text: str, edit: str) -> str:
+    """让LLM返回SEARCH/REPLACE补丁并应用到会话的HTML上，补丁无法应用时抛出PatchError"""
+    llm_provider = _get_llm_provider()
+    with stage_timer("prompt_build"):
+        prompt = _create_patch_prompt(session.html, session.input_text, input_text, edit)
+    max_tokens = int(os.getenv("LLM_PATCH_MAX_TOKENS", "1024"))
+    _, patch = await _route_llm_call(
+        lambda provider, text: _call_provider(
+            provider, text, max_tokens, system=PATCH_SYSTEM_PROMPT, stop_at_html=False
+        ),
+        prompt, llm_provider
+    )
+    with stage_timer("html_extract"):
+        return apply_patch(session.html, patch)
+
+def _local_render_enabled() -> bool:
+    """是否启用本地Mermaid引擎"""
+    return os.getenv("LOCAL_MERMAID_RENDER", "true").lower() in ("1", "true", "yes")
+
+def _get_llm_provider() -> str:
+    """获取当前使用的LLM提供商"""
+    provider = os.getenv("LLM_PROVIDER", "anthropic").lower()
+    return provider if provider in ("anthropic", "fake") else "openai"
+
+def _get_llm_model(provider: str) -> str:
+    """获取指定提供商使用的模型名称"""
+    if provider == "anthropic":
+        return os.getenv("ANTHROPIC_MODEL", "claude-3-haiku-20240307")
+    if provider == "fake":
+        return "fake"
+    return os.getenv("OPENAI_MODEL", "gpt-4o")
+
+def _get_secondary_provider(provider: str) -> Optional[str]:
+    """获取备用提供商，只有配置了API密钥时才使用"""
+    if provider == "fake":
+        return None
+    secondary = "openai" if provider == "anthropic" else "anthropic"
+    api_key_env = "OPENAI_API_KEY" if secondary == "openai" else "ANTHROPIC_API_KEY"
+    return secondary if os.getenv(api_key_env) else None
+
+async def _call_provider(
+    provider: str,
+    prompt: str,
+    max_tokens: int = 4000,
+    system: Optional[str] = None,
+    stop_at_html: bool = True
+) -> str:
+    """
+    调用指定的提供商，成功时记录总耗时。
+    
+    Raises:
+        LLMTruncatedError: stop_at_html为True且响应在</html>之前结束
+    """
+    start = time.perf_counter()
+    system = system or SYSTEM_PROMPT
+    if provider == "anthropic":
+        content = await _call_anthropic(prompt, max_tokens, system, stop_at_html)
+    elif provider == "fake":
+        content = await _call_fake(prompt, stop_at_html)
+    else:  # 默认使用OpenAI
+        content = await _call_openai(prompt, max_tokens, system, stop_at_html)
+    LLM_DURATION.observe(time.perf_counter() - start, provider=provider, model=_get_llm_model(provider))
+    return content
+
+# 固定的系统指令。所有请求共用同一前缀，提供商可以缓存这部分输入（前缀需达到提供商的最小长度，
+# 见_prompt_cache_min_tokens），因此除规则外还包含CSS模板依赖的类名约定和两个完整示例
+SYSTEM_PROMPT = """你是一个专业的图表生成专家，能够根据用户输入生成精美的HTML图表（无需使用Mermaid库）。
+
+要求:
+1. 请直接生成HTML和CSS代码，不需要使用任何外部库（如Mermaid.js）
+2. 确保图表美观、专业且易于理解
+3. 你的代码将被直接用于生成PNG图像，因此请确保自包含且完整
+4. 使用内联CSS样式或内部样式表，不要引用外部样式表
+5. 确保元素有适当的边距和内边距，使图表看起来整洁和专业
+6. 使用清晰可辨的字体和颜色方案
+7. 请在合适的地方添加箭头、连接线或其他视觉元素来表示关系和流程
+8. 如果输入包含Mermaid代码，请尝试参考其结构和内容，但始终输出HTML/CSS代码
+9. 为节点和连接线添加适当的CSS类（如.node、.edge、.start、.end等），以便样式定制
+10. 将主要内容包装在一个带有类名"chart-container"的div中
+
+类名约定（服务器会在你的HTML之后追加CSS模板，模板按下列类名设置样式，请严格使用这些类名）:
+- 所有图表：最外层容器为div.chart-container，标题为div.chart-title，放在容器内的最前面
+- 流程图和状态图：每个节点是一个带class="node"的元素，并按含义加上start（开始）、end（结束）、
+  process（普通步骤）或decision（判断）中的一个；判断节点内的文字放在span中，
+  因为模板会把判断节点旋转45度，再把span旋转回来
+- 连接线画在覆盖整个画布的SVG中，每条线是一个class="edge"的path或line，
+  线上的文字是class="edge-text"的text元素；箭头使用id为arrowhead的marker，
+  marker中的形状加class="arrow"
+- 序列图：参与者方框为class="actor"的rect，参与者名称为普通text，
+  生命线为class="lifeline"的虚线，消息为class="message"的line，消息文字为class="message-text"的text
+- 甘特图：任务条为class="task"的rect，里程碑为class="milestone"的菱形
+- 饼图：每个扇区是class="pie-slice"的path，并依次加上accent1到accent6表示颜色序号，
+  扇区的fill使用currentColor，使模板可以通过color统一配色
+- 类图和ER图：类或实体方框为class="class"的元素，关系线为class="relationship"的line或path
+
+布局要求:
+- 节点位置用绝对定位（或SVG坐标）明确计算，连接线的端点落在节点边框上，不要穿过其他节点
+- 画布（SVG和节点的共同父元素）使用固定的宽高，整个图表放在容器内，不要依赖窗口宽度
+- 文字不要溢出节点：较长的标签适当加宽节点，或在词语之间换行
+- 同一层级的节点对齐，相邻节点之间至少留出40像素的间距
+- 颜色保持克制：节点使用浅色填充和稍深的同色系边框，连接线使用中性灰色
+
+下面两个示例展示了期望的HTML结构、类名和坐标计算方式。请根据用户输入生成新的图表，不要照抄示例内容。
+
+示例一（流程图）:
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+body { font-family: 'Arial', 'Microsoft YaHei', sans-serif; margin: 0; padding: 20px; background: #ffffff; color: #333333; }
+.chart-container { width: 640px; margin: 0 auto; padding: 20px; }
+.chart-title { text-align: center; font-size: 22px; font-weight: bold; margin-bottom: 16px; color: #2c3e50; }
+.canvas { position: relative; width: 640px; height: 520px; }
+.canvas svg { position: absolute; left: 0; top: 0; width: 640px; height: 520px; overflow: visible; }
+.node { position: absolute; box-sizing: border-box; width: 160px; height: 48px; line-height: 44px; padding: 0 12px; text-align: center; background: #f8f9fa; border: 2px solid #4b90e2; border-radius: 8px; font-size: 14px; }
+.node.start, .node.end { border-radius: 24px; }
+.node.start { background: #e3f2fd; border-color: #2196f3; }
+.node.end { background: #e8f5e9; border-color: #4caf50; }
+.node.decision { width: 120px; height: 120px; line-height: normal; padding: 0; display: flex; align-items: center; justify-content: center; background: #fff8e1; border-color: #ffc107; border-radius: 4px; transform: rotate(45deg); }
+.node.decision span { display: inline-block; transform: rotate(-45deg); }
+.edge { stroke: #78909c; stroke-width: 2px; fill: none; marker-end: url(#arrowhead); }
+.edge-text { font-size: 12px; fill: #546e7a; text-anchor: middle; }
+.arrow { fill: #78909c; }
+</style>
+</head>
+<body>
+<div class="chart-container">
+  <div class="chart-title">订单处理流程</div>
+  <div class="canvas">
+    <svg xmlns="http://www.w3.org/2000/svg">
+      <defs>
+        <marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto">
+          <polygon class="arrow" points="0 0, 10 3.5, 0 7"/>
+        </marker>
+      </defs>
+      <path class="edge" d="M 320 48 L 320 88"/>
+      <path class="edge" d="M 320 138 L 320 173"/>
+      <path class="edge" d="M 320 345 L 320 388"/>
+      <text class="edge-text" x="334" y="372">是</text>
+      <path class="edge" d="M 405 260 L 448 260"/>
+      <text class="edge-text" x="426" y="252">否</text>
+      <path class="edge" d="M 530 236 L 530 114 L 402 114"/>
+      <text class="edge-text" x="566" y="178">补货后重试</text>
+      <path class="edge" d="M 320 438 L 320 470"/>
+    </svg>
+    <div class="node start" style="left: 240px; top: 0;">收到订单</div>
+    <div class="node process" style="left: 240px; top: 90px;">校验库存</div>
+    <div class="node decision" style="left: 260px; top: 200px;"><span>库存充足？</span></div>
+    <div class="node process" style="left: 450px; top: 236px;">通知补货</div>
+    <div class="node process" style="left: 240px; top: 390px;">创建发货单</div>
+    <div class="node end" style="left: 240px; top: 472px;">订单完成</div>
+  </div>
+</div>
+</body>
+</html>
+
+示例二（序列图）:
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+body { font-family: 'Arial', 'Microsoft YaHei', sans-serif; margin: 0; padding: 20px; background: #ffffff; color: #333333; }
+.chart-container { width: 600px; margin: 0 auto; padding: 20px; }
+.chart-title { text-align: center; font-size: 22px; font-weight: bold; margin-bottom: 16px; color: #2c3e50; }
+.actor { fill: #e3f2fd; stroke: #2196f3; stroke-width: 2px; }
+.actor-name { font-size: 14px; text-anchor: middle; dominant-baseline: middle; fill: #333333; }
+.lifeline { stroke: #b0bec5; stroke-width: 1.5px; stroke-dasharray: 6 4; }
+.message { stroke: #78909c; stroke-width: 1.5px; marker-end: url(#arrowhead); }
+.message.reply { stroke-dasharray: 5 4; }
+.message-text { font-size: 12px; fill: #546e7a; text-anchor: middle; }
+.arrow { fill: #78909c; }
+</style>
+</head>
+<body>
+<div class="chart-container">
+  <div class="chart-title">用户登录时序</div>
+  <svg xmlns="http://www.w3.org/2000/svg" width="600" height="330" viewBox="0 0 600 330">
+    <defs>
+      <marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto">
+        <polygon class="arrow" points="0 0, 10 3.5, 0 7"/>
+      </marker>
+    </defs>
+    <rect class="actor" x="30" y="10" width="120" height="40" rx="6"/>
+    <text class="actor-name" x="90" y="30">浏览器</text>
+    <rect class="actor" x="240" y="10" width="120" height="40" rx="6"/>
+    <text class="actor-name" x="300" y="30">认证服务</text>
+    <rect class="actor" x="450" y="10" width="120" height="40" rx="6"/>
+    <text class="actor-name" x="510" y="30">用户数据库</text>
+    <line class="lifeline" x1="90" y1="50" x2="90" y2="320"/>
+    <line class="lifeline" x1="300" y1="50" x2="300" y2="320"/>
+    <line class="lifeline" x1="510" y1="50" x2="510" y2="320"/>
+    <text class="message-text" x="195" y="92">提交用户名和密码</text>
+    <line class="message" x1="90" y1="100" x2="298" y2="100"/>
+    <text class="message-text" x="405" y="142">查询用户记录</text>
+    <line class="message" x1="300" y1="150" x2="508" y2="150"/>
+    <text class="message-text" x="405" y="192">返回密码哈希</text>
+    <line class="message reply" x1="510" y1="200" x2="302" y2="200"/>
+    <text class="message-text" x="195" y="262">返回会话令牌</text>
+    <line class="message reply" x1="300" y1="270" x2="92" y2="270"/>
+  </svg>
+</div>
+</body>
+</html>
+
+只返回完整的HTML代码，不需要任何解释。确保代码放在<html>和</html>标签内。"""
+
+# 各图表类型输出HTML的基础token预算
+_BASE_OUTPUT_TOKENS = {
+    "pie": 1200,
+    "flowchart": 1600,
+    "state": 1600,
+    "sequence": 1800,
+    "gantt": 2000,
+    "class": 2000,
+    "er": 2000,
+}
 
 def _create_prompt(input_text: str, chart_type: Optional[str] = None) -> str:
-    """创建LLM提示"""
+    """创建LLM提示（用户消息部分，固定指令见SYSTEM_PROMPT）"""
     chart_type_str = f"类型为 {chart_type} 的" if chart_type else ""
     
-    prompt = f"""
-    作为一个专业的图表生成专家，请根据以下用户输入，生成一个精美的HTML图表（无需使用Mermaid库）。
+    prompt = f"""请根据以下用户输入，生成一个{chart_type_str}HTML图表。
 
-    用户输入:
-    ```
-    {input_text}
-    ```
+用户输入:
+```
+{input_text}
+```"""
+    
+    return prompt
+
+def _max_output_tokens(prompt: str, chart_type: Optional[str] = None) -> int:
+    """
+    根据输入规模和图表类型估算输出token预算。
+    
+    HTML输出的长度大致与输入描述的节点数成正比，按输入token数的3倍加上图表类型的基础预算估算，
+    并限制在LLM_MIN_OUTPUT_TOKENS到LLM_MAX_OUTPUT_TOKENS之间。
+    """
+    min_tokens = int(os.getenv("LLM_MIN_OUTPUT_TOKENS", "1024"))
+    max_tokens = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "4000"))
+    budget = _BASE_OUTPUT_TOKENS.get(chart_type or "", 2000) + _estimate_tokens(prompt) * 3
+    return max(min_tokens, min(max_tokens, budget))
 
-    要求:
-    1. 请直接生成HTML和CSS代码，不需要使用任何外部库（如Mermaid.js）
-    2. 请生成一个{chart_type_str}图表，确保图表美观、专业且易于理解
-    3. 你的代码将被直接用于生成PNG图像，因此请确保自包含且完整
-    4. 使用内联CSS样式或内部样式表，不要引用外部样式表
-    5. 确保元素有适当的边距和内边距，使图表看起来整洁和专业
-    6. 使用清晰可辨的字体和颜色方案
-    7. 请在合适的地方添加箭头、连接线或其他视觉元素来表示关系和流程
-    8. 如果输入包含Mermaid代码，请尝试参考其结构和内容，但始终输出HTML/CSS代码
-    9. 为节点和连接线添加适当的CSS类（如.node、.edge、.start、.end等），以便样式定制
-    10. 将主要内容包装在一个带有类名"chart-container"的div中
+def _prompt_cache_min_tokens(provider: str) -> int:
+    """提供商可缓存前缀的最小token数，更短的前缀不会产生缓存命中"""
+    if provider == "anthropic" and "haiku" in _get_llm_model("anthropic"):
+        return 2048
+    return 1024
 
-    只返回完整的HTML代码，不需要任何解释。确保代码放在<html>和</html>标签内。
+def _cacheable(provider: str, system: str) -> bool:
+    """系统指令是否达到提供商缓存前缀的最小长度（补丁指令等较短的前缀不标记缓存）"""
+    return _estimate_tokens(system) >= _prompt_cache_min_tokens(provider)
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算token数：ASCII约4个字符一个token，其他字符（如中文）约一个字符一个token"""
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def _record_token_usage(
+    provider: str,
+    max_tokens: int,
+    input_tokens: Optional[int] = None,
+    cached_tokens: Optional[int] = None,
+    cache_write_tokens: Optional[int] = None,
+    output_tokens: Optional[int] = None,
+    prompt_text: str = "",
+    output_text: str = ""
+):
     """
+    记录一次LLM调用的token用量。
     
-    return prompt
+    提前结束流式响应时提供商可能不返回用量，缺少的输入/输出token数按文本估算并单独计数。
+    """
+    model = _get_llm_model(provider)
+    usage = {
+        "input": input_tokens,
+        "cached_input": cached_tokens,
+        "cache_write": cache_write_tokens,
+        "output": output_tokens,
+    }
+    if input_tokens is None:
+        usage["input_estimated"] = _estimate_tokens(prompt_text)
+    if output_tokens is None:
+        usage["output_estimated"] = _estimate_tokens(output_text)
+    for kind, count in usage.items():
+        if count:
+            LLM_TOKENS.inc(count, provider=provider, model=model, kind=kind)
+    LLM_OUTPUT_BUDGET.observe(max_tokens, provider=provider, model=model)
+    input_str = input_tokens if input_tokens is not None else f"约{usage['input_estimated']}"
+    output_str = output_tokens if output_tokens is not None else f"约{usage['output_estimated']}"
+    logger.info(
+        f"LLM token用量（{provider}/{model}）: 输入 {input_str}，缓存读取 {cached_tokens or 0}，"
+        f"缓存写入 {cache_write_tokens or 0}，输出 {output_str}，输出预算 {max_tokens}"
+    )
 
-async def _call_anthropic(prompt: str) -> str:
-    """调用Anthropic API"""
+class HtmlStreamExtractor:
+    """
+    流式响应的增量HTML提取器。
+    
+    边接收边去掉开头的 ```html 代码块标记，一旦出现 </html> 即认为HTML已完整，
+    调用方可以立即停止接收后续的解释性文字。
+    stop_at_html为False时原样收集全部文本（例如补丁响应）。
+    """
+    
+    _END_TAG = "</html>"
+    
+    def __init__(self, provider: Optional[str] = None, stop_at_html: bool = True):
+        self._parts = []
+        self.stop_at_html = stop_at_html
+        # 记录首个片段延迟时使用的提供商（为None时不记录）
+        self._provider = provider
+        self._started = time.perf_counter()
+        self._pending = ""  # 尚未确认是否为代码块标记的开头部分
+        self._fence_checked = False
+        self._tail = ""  # 上一段末尾，用于检测跨块的结束标签
+        self.done = False
+    
+    def feed(self, chunk: str) -> bool:
+        """
+        追加一段流式文本。
+        
+        Returns:
+            是否已经读到 </html>，为True时应停止接收
+        """
+        if self.done or not chunk:
+            return self.done
+        
+        if self._provider is not None:
+            LLM_TTFT.observe(
+                time.perf_counter() - self._started,
+                provider=self._provider, model=_get_llm_model(self._provider)
+            )
+            self._provider = None
+        
+        if not self.stop_at_html:
+            self._parts.append(chunk)
+            return False
+        
+        if not self._fence_checked:
+            self._pending += chunk
+            stripped = self._pending.lstrip()
+            if not stripped:
+                return False
+            if stripped.startswith("```") or "```".startswith(stripped):
+                # 等待代码块标记行结束后再丢弃整行
+                newline = stripped.find("\n")
+                if newline < 0:
+                    return False
+                chunk = stripped[newline + 1:]
+            else:
+                chunk = self._pending
+            self._pending = ""
+            self._fence_checked = True
+        
+        window = self._tail + chunk
+        index = window.lower().find(self._END_TAG)
+        if index >= 0:
+            keep = index + len(self._END_TAG) - len(self._tail)
+            self._parts.append(chunk[:keep])
+            self.done = True
+        else:
+            self._parts.append(chunk)
+            self._tail = window[-(len(self._END_TAG) - 1):]
+        return self.done
+    
+    def result(self) -> str:
+        """返回目前提取到的内容（未完整时去掉结尾的代码块标记）"""
+        if not self.stop_at_html:
+            return "".join(self._parts)
+        content = "".join(self._parts) or self._pending
+        if not self.done:
+            content = content.rstrip()
+            if content.endswith("```"):
+                content = content[:-3]
+        return content
+
+async def _call_anthropic(
+    prompt: str,
+    max_tokens: int = 4000,
+    system: str = SYSTEM_PROMPT,
+    stop_at_html: bool = True
+) -> str:
+    """调用Anthropic API（流式，读到 </html> 即停止）"""
+    extractor = HtmlStreamExtractor(provider="anthropic", stop_at_html=stop_at_html)
+    # 足够长的固定系统指令标记为可缓存前缀
+    system_block = {"type": "text", "text": system}
+    if _cacheable("anthropic", system):
+        system_block["cache_control"] = {"type": "ephemeral"}
     try:
-        message = await anthropic_client.messages.create(
-            model=os.getenv("ANTHROPIC_MODEL", "claude-3-haiku-20240307"),
-            max_tokens=4000,
+        async with _get_client("anthropic").messages.stream(
+            model=_get_llm_model("anthropic"),
+            max_tokens=max_tokens,
+            system=[system_block],
             messages=[
                 {"role": "user", "content": prompt}
             ]
-        )
-        return message.content[0].text
+        ) as stream:
+            async for text in stream.text_stream:
+                if extractor.feed(text):
+                    # 退出上下文会关闭连接，放弃剩余的输出
+                    break
+            usage = stream.current_message_snapshot.usage
+            _record_token_usage(
+                "anthropic", max_tokens,
+                input_tokens=usage.input_tokens,
+                cached_tokens=usage.cache_read_input_tokens,
+                cache_write_tokens=usage.cache_creation_input_tokens,
+                # 提前结束时还没有收到最终的输出token数
+                output_tokens=None if extractor.done else usage.output_tokens,
+                prompt_text=system + prompt,
+                output_text=extractor.result()
+            )
     except Exception as e:
         logger.error(f"调用Anthropic API时出错: {str(e)}", exc_info=True)
         raise
+    if stop_at_html and not extractor.done:
+        raise LLMTruncatedError("anthropic", max_tokens, extractor.result())
+    return extractor.result()
 
-async def _call_openai(prompt: str) -> str:
-    """调用OpenAI API"""
+async def _call_openai(
+    prompt: str,
+    max_tokens: int = 4000,
+    system: str = SYSTEM_PROMPT,
+    stop_at_html: bool = True
+) -> str:
+    """调用OpenAI API（流式，读到 </html> 即停止）"""
+    extractor = HtmlStreamExtractor(provider="openai", stop_at_html=stop_at_html)
+    usage = None
+    # 固定的系统指令在前，OpenAI会自动缓存足够长的相同前缀；缓存键使相同前缀的请求落到同一缓存
+    options = {"prompt_cache_key": "mermaid-mcp-chart"} if _cacheable("openai", system) else {}
     try:
-        response = await openai_client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o"),
+        stream = await _get_client("openai").chat.completions.create(
+            model=_get_llm_model("openai"),
             messages=[
-                {"role": "system", "content": "你是一个专业的图表生成专家，能够生成精美的HTML图表。"},
+                {"role": "system", "content": system},
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=4000
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            **options
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                if extractor.feed(chunk.choices[0].delta.content or ""):
+                    break
+        finally:
+            # 提前结束时关闭连接，放弃剩余的输出
+            await stream.close()
+        # 用量在最后一个片段中返回，提前结束时无法获得
+        details = getattr(usage, "prompt_tokens_details", None)
+        _record_token_usage(
+            "openai", max_tokens,
+            input_tokens=usage.prompt_tokens if usage else None,
+            cached_tokens=getattr(details, "cached_tokens", None),
+            output_tokens=usage.completion_tokens if usage else None,
+            prompt_text=system + prompt,
+            output_text=extractor.result()
         )
-        return response.choices[0].message.content
     except Exception as e:
         logger.error(f"调用OpenAI API时出错: {str(e)}", exc_info=True)
         raise
+    if stop_at_html and not extractor.done:
+        raise LLMTruncatedError("openai", max_tokens, extractor.result())
+    return extractor.result()
+
+async def _call_fake(prompt: str, stop_at_html: bool = True, fixture: Optional[str] = None) -> str:
+    """调用离线假LLM（流式回放录制响应，读到 </html> 即停止；fixture指定回放的录制响应）"""
+    extractor = HtmlStreamExtractor(provider="fake", stop_at_html=stop_at_html)
+    async for text in get_fake_llm().stream(prompt, fixture):
+        if extractor.feed(text):
+            break
+    return extractor.result()
 
 def _extract_html(content: str) -> str:
     """从LLM响应中提取HTML代码"""
@@ -177,19 +838,24 @@ def _extract_html(content: str) -> str:
     
     return content
 
+def _prune_css_enabled() -> bool:
+    """是否裁剪HTML中用不到的模板CSS规则"""
+    return os.getenv("CSS_PRUNE_UNUSED", "false").lower() in ("1", "true", "yes")
+
 def _apply_styling(html_code: str, css_template: Optional[str] = None, custom_css: Optional[str] = None) -> str:
     """应用CSS样式到HTML"""
     # 如果没有指定CSS模板，使用默认模板
     template_name = css_template if css_template else "default"
     
-    # 尝试加载模板
+    # 从内存中的模板注册表获取CSS
     try:
         css_content = ""
         if template_name != "none":
-            template_path = os.path.join(os.path.dirname(__file__), "templates", f"{template_name}.css")
-            if os.path.exists(template_path):
-                with open(template_path, "r", encoding="utf-8") as f:
-                    css_content = f.read()
+            template_css = get_template_registry().get_for_html(
+                template_name, html_code, prune=_prune_css_enabled()
+            )
+            if template_css is not None:
+                css_content = template_css
             else:
                 logger.warning(f"未找到模板 {template_name}.css，使用内联样式")
         
@@ -197,15 +863,10 @@ def _apply_styling(html_code: str, css_template: Optional[str] = None, custom_cs
         if custom_css:
             css_content += f"\n\n/* 自定义CSS */\n{custom_css}"
         
-        # 如果有CSS内容，将其嵌入到HTML中
+        # 如果有CSS内容，单次扫描将其嵌入到<head>（或<html>）之后
         if css_content:
-            # 检查HTML中是否已经有<head>标签
-            if "<head>" in html_code:
-                html_code = html_code.replace("<head>", f"<head>\n<style>\n{css_content}\n</style>")
-            else:
-                # 如果没有<head>标签，在<html>标签后添加
-                html_code = html_code.replace("<html>", f"<html>\n<head>\n<style>\n{css_content}\n</style>\n</head>")
+            html_code = inject_style(html_code, css_content)
     except Exception as e:
         logger.error(f"应用CSS样式时出错: {str(e)}", exc_info=True)
     
-    return html_code 
\ No newline at end of file
+    return html_code
@@ -0,0 +1,52 @@
+"""
+本地Mermaid引擎：解析Mermaid源码、计算布局并直接输出HTML/SVG，无需调用LLM。
+"""
+
+import os
+
+from .parser import MermaidParseError, parse_mermaid, Flowchart, SequenceDiagram, PieChart
+from .svg import flowchart_to_html, sequence_to_html, pie_to_html
+
+# 本地引擎支持的图表类型
+SUPPORTED_CHART_TYPES = ("flowchart", "sequence", "pie")
+
+
+def _check_flowchart_size(diagram: Flowchart):
+    """布局耗时随规模超线性增长，超过LOCAL_MERMAID_MAX_NODES/LOCAL_MERMAID_MAX_EDGES的流程图交给LLM"""
+    max_nodes = int(os.getenv("LOCAL_MERMAID_MAX_NODES", "200"))
+    max_edges = int(os.getenv("LOCAL_MERMAID_MAX_EDGES", "400"))
+    if len(diagram.nodes) > max_nodes or len(diagram.edges) > max_edges:
+        raise MermaidParseError(
+            f"流程图过大（{len(diagram.nodes)} 个节点、{len(diagram.edges)} 条连线），"
+            f"本地布局上限为 {max_nodes} 个节点、{max_edges} 条连线"
+        )
+
+
+def render_mermaid_to_html(input_text: str) -> str:
+    """
+    将Mermaid源码渲染为自包含的HTML/SVG。
+
+    Args:
+        input_text: 用户输入（Mermaid源码或只含 ```mermaid 代码块）
+
+    Returns:
+        HTML内容
+
+    Raises:
+        MermaidParseError: 无法在本地解析，调用方应回退到LLM
+    """
+    diagram = parse_mermaid(input_text)
+    if isinstance(diagram, Flowchart):
+        _check_flowchart_size(diagram)
+        return flowchart_to_html(diagram)
+    if isinstance(diagram, SequenceDiagram):
+        return sequence_to_html(diagram)
+    return pie_to_html(diagram)
+
+
+__all__ = [
+    'MermaidParseError',
+    'SUPPORTED_CHART_TYPES',
+    'parse_mermaid',
+    'render_mermaid_to_html'
+]
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+分层图布局模块（Sugiyama风格），用于流程图的本地布局。
+
+步骤：去环 -> 最长路径分层 -> 插入虚拟节点 -> 重心法减少交叉 -> 坐标分配。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+Point = Tuple[float, float]
+
+
+@dataclass
+class LayoutResult:
+    """布局结果，坐标均为最终方向下的像素坐标"""
+    positions: Dict[str, Point] = field(default_factory=dict)      # 节点中心
+    edge_points: List[List[Point]] = field(default_factory=list)   # 每条边经过的点（起点和终点为节点中心）
+    width: float = 0.0
+    height: float = 0.0
+
+
+def layered_layout(
+    node_sizes: Dict[str, Tuple[float, float]],
+    edges: List[Tuple[str, str]],
+    direction: str = "TB",
+    node_sep: float = 40.0,
+    rank_sep: float = 60.0,
+    edge_label_sizes: Optional[List[Optional[Tuple[float, float]]]] = None,
+    sweeps: int = 12
+) -> LayoutResult:
+    """
+    计算分层布局。
+
+    Args:
+        node_sizes: 节点ID -> (宽, 高)，保持插入顺序
+        edges: (源节点, 目标节点) 列表
+        direction: TB / BT / LR / RL
+        node_sep: 同层节点间距
+        rank_sep: 层间距
+        edge_label_sizes: 与edges对应的连线标签尺寸，用于预留空间
+        sweeps: 交叉最小化的扫描次数
+
+    Returns:
+        LayoutResult
+    """
+    horizontal = direction in ("LR", "RL")
+    label_sizes = edge_label_sizes or [None] * len(edges)
+
+    # 横向布局时交换宽高，统一按自上而下计算
+    sizes: Dict[str, Tuple[float, float]] = {}
+    for node_id, (w, h) in node_sizes.items():
+        sizes[node_id] = (h, w) if horizontal else (w, h)
+
+    def oriented(size: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+        if size is None:
+            return None
+        return (size[1], size[0]) if horizontal else size
+
+    nodes = list(sizes)
+    reversed_edges = _find_back_edges(nodes, edges)
+
+    # 去环后的有向边（自环不参与分层）
+    dag_edges: List[Tuple[int, str, str]] = []
+    for index, (source, target) in enumerate(edges):
+        if source == target:
+            continue
+        if index in reversed_edges:
+            source, target = target, source
+        dag_edges.append((index, source, target))
+
+    rank = _assign_ranks(nodes, [(s, t) for _, s, t in dag_edges])
+
+    # 插入虚拟节点，使每条边只跨越相邻两层
+    chains: Dict[int, List[str]] = {}
+    gap_extra: Dict[int, float] = {}
+    succ: Dict[str, List[str]] = {n: [] for n in nodes}
+    pred: Dict[str, List[str]] = {n: [] for n in nodes}
+    for index, source, target in dag_edges:
+        span = rank[target] - rank[source]
+        label = oriented(label_sizes[index])
+        chain = [source]
+        for step in range(1, span):
+            dummy = f"\0dummy{index}_{step}"
+            # 跨层边的标签放在中间的虚拟节点上，预留标签空间
+            if label is not None and step == span // 2:
+                sizes[dummy] = (label[0], label[1])
+            else:
+                sizes[dummy] = (8.0, 8.0)
+            rank[dummy] = rank[source] + step
+            succ[dummy] = []
+            pred[dummy] = []
+            chain.append(dummy)
+        chain.append(target)
+        if label is not None and span == 1:
+            gap_extra[rank[source]] = max(gap_extra.get(rank[source], 0.0), label[1])
+        for a, b in zip(chain, chain[1:]):
+            succ[a].append(b)
+            pred[b].append(a)
+        chains[index] = chain
+
+    layers = _initial_order(nodes, rank, succ, sizes)
+    layers = _minimize_crossings(layers, succ, pred, sweeps)
+    xs = _assign_x(layers, succ, pred, sizes, node_sep)
+
+    # 纵向坐标：每层高度取该层最高节点
+    ys: Dict[str, float] = {}
+    top = 0.0
+    for k, layer in enumerate(layers):
+        layer_height = max((sizes[n][1] for n in layer), default=0.0)
+        for n in layer:
+            ys[n] = top + layer_height / 2
+        top += layer_height + rank_sep + gap_extra.get(k, 0.0)
+    total_height = max(top - rank_sep - gap_extra.get(len(layers) - 1, 0.0), 0.0)
+
+    min_x = min((xs[n] - sizes[n][0] / 2 for layer in layers for n in layer), default=0.0)
+    max_x = max((xs[n] + sizes[n][0] / 2 for layer in layers for n in layer), default=0.0)
+    total_width = max_x - min_x
+
+    def transform(point: Point) -> Point:
+        x, y = point[0] - min_x, point[1]
+        if direction == "BT":
+            return (x, total_height - y)
+        if direction == "LR":
+            return (y, x)
+        if direction == "RL":
+            return (total_height - y, x)
+        return (x, y)
+
+    result = LayoutResult()
+    for n in nodes:
+        result.positions[n] = transform((xs[n], ys[n]))
+
+    for index, (source, target) in enumerate(edges):
+        if source == target:
+            result.edge_points.append([result.positions[source]])
+            continue
+        chain = chains[index]
+        points = [transform((xs[n], ys[n])) for n in chain]
+        if index in reversed_edges:
+            points.reverse()
+        result.edge_points.append(points)
+
+    if horizontal:
+        result.width, result.height = total_height, total_width
+    else:
+        result.width, result.height = total_width, total_height
+    return result
+
+
+def _find_back_edges(nodes: List[str], edges: List[Tuple[str, str]]) -> set:
+    """深度优先搜索找出构成环的回边，返回需反转的边序号"""
+    adjacency: Dict[str, List[Tuple[int, str]]] = {n: [] for n in nodes}
+    for index, (source, target) in enumerate(edges):
+        if source != target:
+            adjacency[source].append((index, target))
+
+    state: Dict[str, int] = {n: 0 for n in nodes}  # 0未访问 1在栈上 2已完成
+    back = set()
+    for root in nodes:
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(adjacency[root]))]
+        while stack:
+            node, it = stack[-1]
+            advanced = False
+            for index, target in it:
+                if state[target] == 1:
+                    back.add(index)
+                elif state[target] == 0:
+                    state[target] = 1
+                    stack.append((target, iter(adjacency[target])))
+                    advanced = True
+                    break
+            if not advanced:
+                state[node] = 2
+                stack.pop()
+    return back
+
+
+def _assign_ranks(nodes: List[str], edges: List[Tuple[str, str]]) -> Dict[str, int]:
+    """最长路径分层，再把源节点下移到紧贴其后继的位置以缩短连线"""
+    succ: Dict[str, List[str]] = {n: [] for n in nodes}
+    indegree: Dict[str, int] = {n: 0 for n in nodes}
+    for source, target in edges:
+        succ[source].append(target)
+        indegree[target] += 1
+
+    rank = {n: 0 for n in nodes}
+    queue = [n for n in nodes if indegree[n] == 0]
+    head = 0
+    while head < len(queue):
+        node = queue[head]
+        head += 1
+        for target in succ[node]:
+            rank[target] = max(rank[target], rank[node] + 1)
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                queue.append(target)
+
+    has_pred = {t for _, t in edges}
+    for node in nodes:
+        if node not in has_pred and succ[node]:
+            rank[node] = min(rank[t] for t in succ[node]) - 1
+    return rank
+
+
+def _initial_order(
+    nodes: List[str],
+    rank: Dict[str, int],
+    succ: Dict[str, List[str]],
+    sizes: Dict[str, Tuple[float, float]]
+) -> List[List[str]]:
+    """按深度优先顺序生成各层的初始排列"""
+    max_rank = max(rank.values(), default=0)
+    layers: List[List[str]] = [[] for _ in range(max_rank + 1)]
+    seen = set()
+
+    def visit(root: str):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            layers[rank[node]].append(node)
+            stack.extend(reversed(succ.get(node, [])))
+
+    for node in sorted(nodes, key=lambda n: rank[n]):
+        visit(node)
+    for node in sizes:
+        if node not in seen:
+            visit(node)
+    return layers
+
+
+def _count_crossings(upper: List[str], lower: List[str], succ: Dict[str, List[str]]) -> int:
+    """
+    统计相邻两层之间的连线交叉数。
+
+    连线按(上层位置, 下层位置)排序后，交叉数等于下层位置序列的逆序对数，
+    用树状数组统计，复杂度为O(E log V)。
+    """
+    position = {n: i for i, n in enumerate(lower)}
+    pairs = []
+    for i, node in enumerate(upper):
+        for target in succ[node]:
+            if target in position:
+                pairs.append((i, position[target]))
+    pairs.sort()
+    tree = [0] * (len(lower) + 1)
+    crossings = 0
+    for inserted, (_, j) in enumerate(pairs):
+        # 已插入的连线中下层位置不大于j的数量
+        not_crossing = 0
+        k = j + 1
+        while k > 0:
+            not_crossing += tree[k]
+            k -= k & -k
+        crossings += inserted - not_crossing
+        k = j + 1
+        while k <= len(lower):
+            tree[k] += 1
+            k += k & -k
+    return crossings
+
+
+def _total_crossings(layers: List[List[str]], succ: Dict[str, List[str]]) -> int:
+    return sum(_count_crossings(layers[k], layers[k + 1], succ) for k in range(len(layers) - 1))
+
+
+def _minimize_crossings(
+    layers: List[List[str]],
+    succ: Dict[str, List[str]],
+    pred: Dict[str, List[str]],
+    sweeps: int
+) -> List[List[str]]:
+    """重心法上下交替扫描，保留交叉数最少的排列"""
+    best = [list(layer) for layer in layers]
+    best_crossings = _total_crossings(best, succ)
+    current = [list(layer) for layer in layers]
+
+    for sweep in range(sweeps):
+        if best_crossings == 0:
+            break
+        downward = sweep % 2 == 0
+        indices = range(1, len(current)) if downward else range(len(current) - 2, -1, -1)
+        for k in indices:
+            fixed = current[k - 1] if downward else current[k + 1]
+            neighbors = pred if downward else succ
+            position = {n: i for i, n in enumerate(fixed)}
+            keyed = []
+            for i, node in enumerate(current[k]):
+                adjacent = [position[m] for m in neighbors[node] if m in position]
+                key = sum(adjacent) / len(adjacent) if adjacent else float(i)
+                keyed.append((key, i, node))
+            keyed.sort()
+            current[k] = [node for _, _, node in keyed]
+        crossings = _total_crossings(current, succ)
+        if crossings < best_crossings:
+            best_crossings = crossings
+            best = [list(layer) for layer in current]
+    return best
+
+
+def _place_layer(
+    layer: List[str],
+    desired: List[float],
+    sizes: Dict[str, Tuple[float, float]],
+    node_sep: float
+) -> List[float]:
+    """在保持顺序和最小间距的前提下，让节点尽量靠近期望位置"""
+    gaps = [(sizes[a][0] + sizes[b][0]) / 2 + node_sep for a, b in zip(layer, layer[1:])]
+
+    left = list(desired)
+    for i in range(1, len(left)):
+        left[i] = max(left[i], left[i - 1] + gaps[i - 1])
+
+    right = list(desired)
+    for i in range(len(right) - 2, -1, -1):
+        right[i] = min(right[i], right[i + 1] - gaps[i])
+
+    # 两种放置都满足间距约束，取平均仍然满足
+    return [(a + b) / 2 for a, b in zip(left, right)]
+
+
+def _assign_x(
+    layers: List[List[str]],
+    succ: Dict[str, List[str]],
+    pred: Dict[str, List[str]],
+    sizes: Dict[str, Tuple[float, float]],
+    node_sep: float,
+    iterations: int = 8
+) -> Dict[str, float]:
+    """迭代地把节点拉向相邻层邻居的平均位置"""
+    xs: Dict[str, float] = {}
+    for layer in layers:
+        cursor = 0.0
+        for node in layer:
+            width = sizes[node][0]
+            xs[node] = cursor + width / 2
+            cursor += width + node_sep
+
+    # 各层居中对齐到最宽的一层
+    widest = max((xs[l[-1]] + sizes[l[-1]][0] / 2 for l in layers if l), default=0.0)
+    for layer in layers:
+        if not layer:
+            continue
+        layer_width = xs[layer[-1]] + sizes[layer[-1]][0] / 2
+        offset = (widest - layer_width) / 2
+        for node in layer:
+            xs[node] += offset
+
+    for iteration in range(iterations):
+        downward = iteration % 2 == 0
+        order = layers if downward else list(reversed(layers))
+        for layer in order:
+            if not layer:
+                continue
+            neighbors = pred if downward else succ
+            desired = []
+            for node in layer:
+                adjacent = [xs[m] for m in neighbors[node]]
+                desired.append(sum(adjacent) / len(adjacent) if adjacent else xs[node])
+            for node, x in zip(layer, _place_layer(layer, desired, sizes, node_sep)):
+                xs[node] = x
+    return xs
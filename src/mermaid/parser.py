@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mermaid解析模块，将Mermaid源码解析为语法树。
+目前支持流程图（graph/flowchart）、时序图（sequenceDiagram）和饼图（pie）。
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class MermaidParseError(ValueError):
+    """Mermaid源码无法被本地解析（语法错误或暂不支持的语法）"""
+
+
+# ---------------------------------------------------------------------------
+# 语法树
+# ---------------------------------------------------------------------------
+
+@dataclass
+class FlowNode:
+    id: str
+    label: str
+    shape: str = "rect"
+    classes: List[str] = field(default_factory=list)
+    style: Optional[str] = None
+
+
+@dataclass
+class FlowEdge:
+    source: str
+    target: str
+    label: Optional[str] = None
+    line: str = "solid"            # solid / dotted / thick
+    arrow_end: Optional[str] = "arrow"   # arrow / cross / circle / None
+    arrow_start: Optional[str] = None
+
+
+@dataclass
+class Flowchart:
+    direction: str = "TB"
+    nodes: Dict[str, FlowNode] = field(default_factory=dict)
+    edges: List[FlowEdge] = field(default_factory=list)
+    class_defs: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Participant:
+    id: str
+    label: str
+    kind: str = "participant"      # participant / actor
+
+
+@dataclass
+class Message:
+    source: str
+    target: str
+    text: str = ""
+    line: str = "solid"            # solid / dotted
+    arrow: Optional[str] = "arrow"  # arrow / open / cross / None
+
+
+@dataclass
+class Note:
+    position: str                  # left / right / over
+    actors: List[str]
+    text: str
+
+
+@dataclass
+class SequenceDiagram:
+    participants: List[Participant] = field(default_factory=list)
+    events: List[Union[Message, Note]] = field(default_factory=list)
+    autonumber: bool = False
+    title: Optional[str] = None
+
+
+@dataclass
+class PieChart:
+    title: Optional[str] = None
+    show_data: bool = False
+    slices: List[Tuple[str, float]] = field(default_factory=list)
+
+
+Diagram = Union[Flowchart, SequenceDiagram, PieChart]
+
+
+# ---------------------------------------------------------------------------
+# 源码提取
+# ---------------------------------------------------------------------------
+
+_FENCE_RE = re.compile(r'```\s*mermaid\s*\n([\s\S]*?)```', re.IGNORECASE)
+# 未闭合代码块的起始标记
+_OPEN_FENCE_RE = re.compile(r'^\s*```\s*(mermaid)?\s*$', re.IGNORECASE)
+_HEADER_RE = re.compile(
+    r'^[ \t]*(graph|flowchart|sequenceDiagram|pie)\b[^\n]*$',
+    re.MULTILINE
+)
+
+
+def extract_mermaid_source(input_text: str) -> str:
+    """
+    从用户输入中提取Mermaid源码。
+
+    只接受纯Mermaid源码，或前后没有其他文字的 ```mermaid 代码块。
+    代码块外或图表声明前的说明文字可能是修改要求（如“把节点C标红”），
+    本地引擎无法执行，这类输入交给LLM处理。
+
+    Raises:
+        MermaidParseError: 输入不是纯Mermaid源码，或没有受支持的图表声明
+    """
+    fence = _FENCE_RE.search(input_text)
+    if fence:
+        if input_text[:fence.start()].strip() or input_text[fence.end():].strip():
+            raise MermaidParseError("代码块外有说明文字")
+        text = fence.group(1)
+    else:
+        text = input_text
+    header = _HEADER_RE.search(text)
+    if not header:
+        raise MermaidParseError("未找到受支持的Mermaid图表声明")
+    for line in text[:header.start()].split("\n"):
+        stripped = line.strip()
+        # 声明之前只允许空行、%%注释/指令和未闭合代码块的起始标记
+        if stripped and not stripped.startswith("%%") and not (not fence and _OPEN_FENCE_RE.match(line)):
+            raise MermaidParseError("图表声明前有说明文字")
+    source = text[header.start():]
+    if not fence:
+        # 去掉未闭合代码块遗留的结束标记
+        source = re.sub(r'\n\s*```\s*$', '', source)
+    return source
+
+
+def _clean_lines(source: str) -> List[str]:
+    """去除注释和空行，返回去掉首尾空白的语句行"""
+    lines = []
+    for raw in source.replace("\r\n", "\n").split("\n"):
+        line = raw.strip()
+        if not line or line.startswith("%%"):
+            continue
+        lines.append(line)
+    return lines
+
+
+def _clean_label(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+        text = text[1:-1]
+    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
+    return text.replace("#quot;", '"').strip()
+
+
+def parse_mermaid(input_text: str) -> Diagram:
+    """
+    解析Mermaid源码。
+
+    Args:
+        input_text: 用户输入（Mermaid源码或只含 ```mermaid 代码块）
+
+    Returns:
+        Flowchart、SequenceDiagram或PieChart语法树
+
+    Raises:
+        MermaidParseError: 语法错误或包含暂不支持的语法
+    """
+    lines = _clean_lines(extract_mermaid_source(input_text))
+    keyword = lines[0].split()[0]
+    if keyword in ("graph", "flowchart"):
+        return _parse_flowchart(lines)
+    if keyword == "sequenceDiagram":
+        return _parse_sequence(lines)
+    return _parse_pie(lines)
+
+
+# ---------------------------------------------------------------------------
+# 流程图
+# ---------------------------------------------------------------------------
+
+_DIRECTIONS = {"TD": "TB", "TB": "TB", "BT": "BT", "LR": "LR", "RL": "RL"}
+
+# 节点形状：(起始符, 结束符, 形状)，按起始符从长到短排列
+_SHAPES = [
+    ("(((", ")))", "doublecircle"),
+    ("((", "))", "circle"),
+    ("([", "])", "stadium"),
+    ("[[", "]]", "subroutine"),
+    ("[(", ")]", "cylinder"),
+    ("{{", "}}", "hexagon"),
+    ("[/", "/]", "parallelogram"),
+    ("[\\", "\\]", "parallelogram"),
+    ("[/", "\\]", "trapezoid"),
+    ("[\\", "/]", "trapezoid"),
+    ("[", "]", "rect"),
+    ("(", ")", "round"),
+    ("{", "}", "rhombus"),
+    (">", "]", "asymmetric"),
+]
+
+_NODE_ID_RE = re.compile(r'\s*(\w+)')
+_NODE_CLASS_RE = re.compile(r':::([\w-]+)')
+_AMP_RE = re.compile(r'\s*&')
+_LINK_OP_RE = re.compile(
+    r'\s*(?P<op><?(?:-{2,}[->xo]|={2,}[=>xo]|-\.+-[>xo]?))\s*(?:\|(?P<label>[^|]*)\|)?'
+)
+_LINK_TEXT_RE = re.compile(
+    r'\s*(?P<start><?(?:--|==|-\.))(?![-=>.])\s*(?P<label>[^|]+?)\s*'
+    r'(?P<end>-{2,}[->xo]|={2,}[=>xo]|\.-+[>xo]?)'
+)
+_UNSUPPORTED_FLOW_RE = re.compile(r'^(subgraph|end|direction|click)\b')
+
+
+def _parse_flowchart(lines: List[str]) -> Flowchart:
+    # 声明行后面可以直接用分号跟语句，如 graph LR; A-->B
+    first, _, rest = lines[0].partition(";")
+    header = first.split()
+    lines = [first] + ([rest] if rest.strip() else []) + lines[1:]
+    chart = Flowchart()
+    if len(header) > 1:
+        direction = header[1].upper()
+        if direction not in _DIRECTIONS:
+            raise MermaidParseError(f"未知的流程图方向: {header[1]}")
+        chart.direction = _DIRECTIONS[direction]
+
+    statements: List[str] = []
+    for line in lines[1:]:
+        statements.extend(part.strip() for part in line.split(";") if part.strip())
+
+    for stmt in statements:
+        if _UNSUPPORTED_FLOW_RE.match(stmt):
+            raise MermaidParseError(f"暂不支持的流程图语法: {stmt}")
+        if stmt.startswith("classDef "):
+            parts = stmt.split(None, 2)
+            if len(parts) < 3:
+                raise MermaidParseError(f"classDef语法错误: {stmt}")
+            for name in parts[1].split(","):
+                chart.class_defs[name] = parts[2]
+            continue
+        if stmt.startswith("class "):
+            parts = stmt.split()
+            if len(parts) != 3:
+                raise MermaidParseError(f"class语法错误: {stmt}")
+            for node_id in parts[1].split(","):
+                _ensure_node(chart, node_id).classes.append(parts[2])
+            continue
+        if stmt.startswith("style "):
+            parts = stmt.split(None, 2)
+            if len(parts) < 3:
+                raise MermaidParseError(f"style语法错误: {stmt}")
+            _ensure_node(chart, parts[1]).style = parts[2]
+            continue
+        if stmt.startswith("linkStyle "):
+            # 连线样式不影响结构，本地渲染忽略
+            continue
+        _parse_flow_statement(chart, stmt)
+
+    if not chart.nodes:
+        raise MermaidParseError("流程图中没有节点")
+    return chart
+
+
+def _ensure_node(chart: Flowchart, node_id: str) -> FlowNode:
+    node = chart.nodes.get(node_id)
+    if node is None:
+        node = FlowNode(id=node_id, label=node_id)
+        chart.nodes[node_id] = node
+    return node
+
+
+def _parse_node(chart: Flowchart, stmt: str, pos: int) -> Tuple[str, int]:
+    """解析一个节点（可带形状和标签），返回节点ID和新位置"""
+    match = _NODE_ID_RE.match(stmt, pos)
+    if not match:
+        raise MermaidParseError(f"无法解析节点: {stmt[pos:]!r}")
+    node_id = match.group(1)
+    pos = match.end()
+    node = _ensure_node(chart, node_id)
+
+    for open_tok, close_tok, shape in _SHAPES:
+        if not stmt.startswith(open_tok, pos):
+            continue
+        start = pos + len(open_tok)
+        if stmt.startswith('"', start):
+            quote_end = stmt.find('"', start + 1)
+            if quote_end < 0 or not stmt.startswith(close_tok, quote_end + 1):
+                continue
+            end = quote_end + 1
+        else:
+            end = stmt.find(close_tok, start)
+            # 以[开头的形状标签中不应出现]，否则说明匹配到了后面其他节点的结束符
+            if end < 0 or (open_tok.startswith("[") and "]" in stmt[start:end]):
+                continue
+        node.label = _clean_label(stmt[start:end])
+        node.shape = shape
+        pos = end + len(close_tok)
+        break
+
+    class_match = _NODE_CLASS_RE.match(stmt, pos)
+    if class_match:
+        node.classes.append(class_match.group(1))
+        pos = class_match.end()
+    return node_id, pos
+
+
+def _parse_node_group(chart: Flowchart, stmt: str, pos: int) -> Tuple[List[str], int]:
+    """解析以 & 连接的一组节点"""
+    ids = []
+    while True:
+        node_id, pos = _parse_node(chart, stmt, pos)
+        ids.append(node_id)
+        amp = _AMP_RE.match(stmt, pos)
+        if not amp:
+            return ids, pos
+        pos = amp.end()
+
+
+def _link_style(op: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """根据连线符号确定线型和两端箭头"""
+    if "=" in op:
+        line = "thick"
+    elif "." in op:
+        line = "dotted"
+    else:
+        line = "solid"
+    ends = {">": "arrow", "x": "cross", "o": "circle"}
+    arrow_end = ends.get(op[-1])
+    arrow_start = "arrow" if op.startswith("<") else None
+    return line, arrow_end, arrow_start
+
+
+def _parse_flow_statement(chart: Flowchart, stmt: str):
+    sources, pos = _parse_node_group(chart, stmt, 0)
+    while pos < len(stmt):
+        text_match = _LINK_TEXT_RE.match(stmt, pos)
+        op_match = None if text_match else _LINK_OP_RE.match(stmt, pos)
+        if text_match:
+            op = text_match.group("start") + text_match.group("end")
+            label = text_match.group("label")
+            pos = text_match.end()
+        elif op_match:
+            op = op_match.group("op")
+            label = op_match.group("label")
+            pos = op_match.end()
+        else:
+            if stmt[pos:].strip():
+                raise MermaidParseError(f"无法解析连线: {stmt[pos:]!r}")
+            break
+
+        targets, pos = _parse_node_group(chart, stmt, pos)
+        line, arrow_end, arrow_start = _link_style(op)
+        label = _clean_label(label) if label else None
+        for source in sources:
+            for target in targets:
+                chart.edges.append(FlowEdge(
+                    source=source, target=target, label=label or None,
+                    line=line, arrow_end=arrow_end, arrow_start=arrow_start
+                ))
+        sources = targets
+
+
+# ---------------------------------------------------------------------------
+# 时序图
+# ---------------------------------------------------------------------------
+
+_PARTICIPANT_RE = re.compile(r'^(participant|actor)\s+(.+?)(?:\s+as\s+(.+))?$')
+_MESSAGE_RE = re.compile(
+    r'^(?P<source>[^\s:>+-][^:>]*?)\s*(?P<arrow>-->>|->>|--x|-x|--\)|-\)|-->|->)\s*[+-]?'
+    r'\s*(?P<target>[^:]+?)\s*(?::\s*(?P<text>.*))?$'
+)
+_NOTE_RE = re.compile(r'^note\s+(left of|right of|over)\s+([^:]+?)\s*:\s*(.*)$', re.IGNORECASE)
+_IGNORED_SEQ_RE = re.compile(r'^(activate|deactivate)\s')
+_UNSUPPORTED_SEQ_RE = re.compile(r'^(loop|alt|else|opt|par|and|rect|critical|break|end|box)\b')
+
+_MESSAGE_ARROWS = {
+    "->": ("solid", None),
+    "-->": ("dotted", None),
+    "->>": ("solid", "arrow"),
+    "-->>": ("dotted", "arrow"),
+    "-x": ("solid", "cross"),
+    "--x": ("dotted", "cross"),
+    "-)": ("solid", "open"),
+    "--)": ("dotted", "open"),
+}
+
+
+def _parse_sequence(lines: List[str]) -> SequenceDiagram:
+    diagram = SequenceDiagram()
+    known: Dict[str, Participant] = {}
+
+    def ensure(actor_id: str) -> str:
+        actor_id = actor_id.strip()
+        if not actor_id:
+            raise MermaidParseError("时序图参与者名称为空")
+        if actor_id not in known:
+            known[actor_id] = Participant(id=actor_id, label=actor_id)
+            diagram.participants.append(known[actor_id])
+        return actor_id
+
+    for line in lines[1:]:
+        if line == "autonumber":
+            diagram.autonumber = True
+            continue
+        if line.startswith("title"):
+            diagram.title = line[len("title"):].lstrip(" :").strip() or None
+            continue
+        if _IGNORED_SEQ_RE.match(line):
+            continue
+        if _UNSUPPORTED_SEQ_RE.match(line):
+            raise MermaidParseError(f"暂不支持的时序图语法: {line}")
+
+        match = _PARTICIPANT_RE.match(line)
+        if match:
+            actor_id = ensure(match.group(2))
+            known[actor_id].kind = match.group(1)
+            if match.group(3):
+                known[actor_id].label = _clean_label(match.group(3))
+            continue
+
+        match = _NOTE_RE.match(line)
+        if match:
+            position = match.group(1).split()[0].lower()
+            actors = [ensure(a) for a in match.group(2).split(",")]
+            if position != "over" and len(actors) != 1:
+                raise MermaidParseError(f"注释语法错误: {line}")
+            diagram.events.append(Note(position=position, actors=actors[:2], text=_clean_label(match.group(3))))
+            continue
+
+        match = _MESSAGE_RE.match(line)
+        if match:
+            line_style, arrow = _MESSAGE_ARROWS[match.group("arrow")]
+            diagram.events.append(Message(
+                source=ensure(match.group("source")),
+                target=ensure(match.group("target")),
+                text=_clean_label(match.group("text") or ""),
+                line=line_style,
+                arrow=arrow
+            ))
+            continue
+
+        raise MermaidParseError(f"无法解析时序图语句: {line}")
+
+    if not diagram.participants:
+        raise MermaidParseError("时序图中没有参与者")
+    return diagram
+
+
+# ---------------------------------------------------------------------------
+# 饼图
+# ---------------------------------------------------------------------------
+
+_PIE_HEADER_RE = re.compile(r'^pie(?:\s+(showData))?(?:\s+title\s+(.+))?$')
+_PIE_SLICE_RE = re.compile(r'^"([^"]*)"\s*:\s*([0-9]*\.?[0-9]+)$')
+
+
+def _parse_pie(lines: List[str]) -> PieChart:
+    match = _PIE_HEADER_RE.match(lines[0])
+    if not match:
+        raise MermaidParseError(f"饼图声明语法错误: {lines[0]}")
+    chart = PieChart(show_data=bool(match.group(1)), title=match.group(2))
+
+    for line in lines[1:]:
+        if line.startswith("title"):
+            chart.title = line[len("title"):].strip() or None
+            continue
+        if line == "showData":
+            chart.show_data = True
+            continue
+        slice_match = _PIE_SLICE_RE.match(line)
+        if not slice_match:
+            raise MermaidParseError(f"无法解析饼图数据: {line}")
+        value = float(slice_match.group(2))
+        if value < 0:
+            raise MermaidParseError(f"饼图数据不能为负数: {line}")
+        chart.slices.append((slice_match.group(1), value))
+
+    if not chart.slices or sum(v for _, v in chart.slices) <= 0:
+        raise MermaidParseError("饼图中没有有效数据")
+    return chart
@@ -0,0 +1,506 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SVG生成模块，将语法树和布局结果输出为自包含的HTML/SVG。
+
+生成的元素使用CSS模板（src/templates/）所针对的类名：
+.chart-container、.chart-title、.node、.edge、.edge-text、.arrow、.actor、.message、.pie-slice。
+颜色以SVG属性给出默认值，模板中的同名规则可以覆盖。
+"""
+
+import math
+import re
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from .parser import Flowchart, FlowNode, SequenceDiagram, Message, Note, PieChart
+from .layout import Point, layered_layout
+
+FONT_SIZE = 14
+LINE_HEIGHT = 20
+PADDING_X = 16
+PADDING_Y = 10
+MARGIN = 20
+
+NODE_FILL = "#f8f9fa"
+NODE_STROKE = "#4b90e2"
+TEXT_FILL = "#333333"
+EDGE_STROKE = "#78909c"
+
+PIE_COLORS = [
+    "#4b90e2", "#f5a623", "#7ed321", "#d0021b", "#9013fe",
+    "#50e3c2", "#f8e71c", "#bd10e0", "#8b572a", "#417505",
+]
+
+# 本地渲染的SVG专用样式：抵消模板中面向HTML节点的变换，保证SVG节点不被旋转
+_BASE_STYLE = """
+.chart-container svg { display: block; margin: 0 auto; overflow: visible; }
+.chart-container svg text { font-size: 14px; }
+.chart-container svg .node, .chart-container svg .node.decision { transform: none; }
+.chart-container svg .edge-label-bg { fill: #ffffff; fill-opacity: 0.85; }
+"""
+
+
+def text_width(text: str, font_size: float = FONT_SIZE) -> float:
+    """估算单行文本宽度：全角字符按一个字号，半角字符按0.6个字号"""
+    width = 0.0
+    for ch in text:
+        width += font_size if ord(ch) > 0x2E80 else font_size * 0.6
+    return width
+
+
+def text_block_size(text: str) -> Tuple[float, float]:
+    lines = text.split("\n") or [""]
+    return max(text_width(line) for line in lines), len(lines) * LINE_HEIGHT
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _text(x: float, y: float, text: str, css_class: Optional[str] = None, anchor: str = "middle") -> str:
+    """多行文本，y为整体垂直中心"""
+    lines = text.split("\n")
+    first = y - (len(lines) - 1) * LINE_HEIGHT / 2
+    class_attr = f' class="{css_class}"' if css_class else ""
+    spans = "".join(
+        f'<tspan x="{_fmt(x)}" y="{_fmt(first + i * LINE_HEIGHT)}">{escape(line)}</tspan>'
+        for i, line in enumerate(lines)
+    )
+    return (
+        f'<text{class_attr} text-anchor="{anchor}" dominant-baseline="central" '
+        f'fill="{TEXT_FILL}">{spans}</text>'
+    )
+
+
+def _markers() -> str:
+    return (
+        "<defs>"
+        '<marker id="arrowhead" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="8" markerHeight="8" orient="auto-start-reverse">'
+        f'<path class="arrow" d="M0,0 L10,5 L0,10 z" fill="{EDGE_STROKE}"/></marker>'
+        '<marker id="openhead" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="8" markerHeight="8" orient="auto">'
+        f'<path d="M0,0 L10,5 L0,10" fill="none" stroke="{EDGE_STROKE}" stroke-width="1.5"/></marker>'
+        '<marker id="crosshead" viewBox="0 0 10 10" refX="5" refY="5" markerWidth="8" markerHeight="8" orient="auto">'
+        f'<path d="M1,1 L9,9 M9,1 L1,9" stroke="{EDGE_STROKE}" stroke-width="2"/></marker>'
+        '<marker id="circlehead" viewBox="0 0 10 10" refX="5" refY="5" markerWidth="8" markerHeight="8" orient="auto">'
+        f'<circle cx="5" cy="5" r="4" fill="#ffffff" stroke="{EDGE_STROKE}" stroke-width="1.5"/></marker>'
+        "</defs>"
+    )
+
+
+_MARKER_IDS = {"arrow": "arrowhead", "open": "openhead", "cross": "crosshead", "circle": "circlehead"}
+
+
+def _marker_style(arrow_end: Optional[str], arrow_start: Optional[str] = None) -> str:
+    """连线箭头通过内联样式指定，以覆盖模板中统一设置的marker-end"""
+    end = f"url(#{_MARKER_IDS[arrow_end]})" if arrow_end else "none"
+    start = f"url(#{_MARKER_IDS[arrow_start]})" if arrow_start else "none"
+    return f"marker-end:{end};marker-start:{start}"
+
+
+def _svg_document(body: str, width: float, height: float, kind: str, title: Optional[str] = None) -> str:
+    title_html = f'<div class="chart-title">{escape(title)}</div>\n' if title else ""
+    return (
+        "<html>\n<head>\n<meta charset=\"utf-8\">\n"
+        f"<style>{_BASE_STYLE}</style>\n</head>\n<body>\n"
+        f'<div class="chart-container">\n{title_html}'
+        f'<svg xmlns="http://www.w3.org/2000/svg" class="mermaid-{kind}" '
+        f'width="{_fmt(width)}" height="{_fmt(height)}" viewBox="0 0 {_fmt(width)} {_fmt(height)}">\n'
+        f"{_markers()}\n{body}\n</svg>\n</div>\n</body>\n</html>"
+    )
+
+
+# ---------------------------------------------------------------------------
+# 流程图
+# ---------------------------------------------------------------------------
+
+def _node_size(node: FlowNode) -> Tuple[float, float]:
+    w, h = text_block_size(node.label)
+    w, h = w + 2 * PADDING_X, h + 2 * PADDING_Y
+    if node.shape in ("circle", "doublecircle"):
+        d = max(w, h)
+        return d, d
+    if node.shape == "rhombus":
+        return w * 1.5, h * 1.5
+    if node.shape in ("hexagon", "parallelogram", "trapezoid", "asymmetric"):
+        return w + h, h
+    return max(w, 60.0), h
+
+
+# 样式声明的属性名和值；值中不允许出现可以闭合样式块、开始新规则或加载外部资源的内容
+_CSS_PROPERTY_RE = re.compile(r'^-?[a-zA-Z][\w-]*$')
+_CSS_UNSAFE_VALUE_RE = re.compile(r'[<>{}@\\;]|url\s*\(|expression\s*\(|javascript:', re.IGNORECASE)
+
+
+def _style_to_css(style: str) -> str:
+    """
+    Mermaid的 fill:#f9f,stroke:#333 转为CSS声明。
+
+    样式来自用户输入，会被写入<style>元素和style属性，
+    只保留“属性:值”形式且值中不含危险内容的声明，其余丢弃。
+    """
+    declarations = []
+    for part in style.split(","):
+        prop, sep, value = part.partition(":")
+        prop, value = prop.strip(), value.strip()
+        if not sep or not value or not _CSS_PROPERTY_RE.match(prop) or _CSS_UNSAFE_VALUE_RE.search(value):
+            continue
+        declarations.append(f"{prop}:{value}")
+    return ";".join(declarations)
+
+
+def _node_shape(node: FlowNode, cx: float, cy: float, w: float, h: float) -> str:
+    x, y = cx - w / 2, cy - h / 2
+    css = _style_to_css(node.style) if node.style else ""
+    style = f' style="{escape(css)}"' if css else ""
+    common = f'fill="{NODE_FILL}" stroke="{NODE_STROKE}" stroke-width="2"{style}'
+    shape = node.shape
+    if shape in ("circle", "doublecircle"):
+        r = w / 2
+        inner = ""
+        if shape == "doublecircle":
+            inner = f'<circle cx="{_fmt(cx)}" cy="{_fmt(cy)}" r="{_fmt(r - 4)}" {common}/>'
+        return f'<circle cx="{_fmt(cx)}" cy="{_fmt(cy)}" r="{_fmt(r)}" {common}/>{inner}'
+    if shape == "rhombus":
+        points = [(cx, y), (x + w, cy), (cx, y + h), (x, cy)]
+    elif shape == "hexagon":
+        d = h / 2
+        points = [(x + d, y), (x + w - d, y), (x + w, cy), (x + w - d, y + h), (x + d, y + h), (x, cy)]
+    elif shape == "parallelogram":
+        d = h / 2
+        points = [(x + d, y), (x + w, y), (x + w - d, y + h), (x, y + h)]
+    elif shape == "trapezoid":
+        d = h / 2
+        points = [(x + d, y), (x + w - d, y), (x + w, y + h), (x, y + h)]
+    elif shape == "asymmetric":
+        d = h / 2
+        points = [(x, y), (x + w, y), (x + w, y + h), (x, y + h), (x + d, cy)]
+    else:
+        points = None
+
+    if points:
+        pts = " ".join(f"{_fmt(px)},{_fmt(py)}" for px, py in points)
+        return f'<polygon points="{pts}" {common}/>'
+
+    rx = {"round": 10, "stadium": h / 2}.get(shape, 5)
+    rect = (
+        f'<rect x="{_fmt(x)}" y="{_fmt(y)}" width="{_fmt(w)}" height="{_fmt(h)}" '
+        f'rx="{_fmt(rx)}" ry="{_fmt(rx)}" {common}/>'
+    )
+    if shape == "subroutine":
+        rect += (
+            f'<line x1="{_fmt(x + 8)}" y1="{_fmt(y)}" x2="{_fmt(x + 8)}" y2="{_fmt(y + h)}" stroke="{NODE_STROKE}" stroke-width="2"/>'
+            f'<line x1="{_fmt(x + w - 8)}" y1="{_fmt(y)}" x2="{_fmt(x + w - 8)}" y2="{_fmt(y + h)}" stroke="{NODE_STROKE}" stroke-width="2"/>'
+        )
+    elif shape == "cylinder":
+        ry = min(8.0, h / 4)
+        rect = (
+            f'<path d="M{_fmt(x)},{_fmt(y + ry)} a{_fmt(w / 2)},{_fmt(ry)} 0 0,0 {_fmt(w)},0 '
+            f'a{_fmt(w / 2)},{_fmt(ry)} 0 0,0 {_fmt(-w)},0 l0,{_fmt(h - 2 * ry)} '
+            f'a{_fmt(w / 2)},{_fmt(ry)} 0 0,0 {_fmt(w)},0 l0,{_fmt(-(h - 2 * ry))}" {common}/>'
+        )
+    return rect
+
+
+def _clip(center: Point, size: Tuple[float, float], shape: str, toward: Point) -> Point:
+    """把连线端点从节点中心移到节点边界上"""
+    cx, cy = center
+    dx, dy = toward[0] - cx, toward[1] - cy
+    if dx == 0 and dy == 0:
+        return center
+    w, h = size[0] / 2, size[1] / 2
+    if shape in ("circle", "doublecircle"):
+        t = w / math.hypot(dx, dy)
+    elif shape == "rhombus":
+        t = 1.0 / (abs(dx) / w + abs(dy) / h)
+    else:
+        tx = w / abs(dx) if dx else math.inf
+        ty = h / abs(dy) if dy else math.inf
+        t = min(tx, ty)
+    t = min(t, 1.0)
+    return (cx + dx * t, cy + dy * t)
+
+
+def _polyline_midpoint(points: List[Point]) -> Point:
+    lengths = [math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(points, points[1:])]
+    half = sum(lengths) / 2
+    for (a, b), length in zip(zip(points, points[1:]), lengths):
+        if half <= length and length > 0:
+            t = half / length
+            return (a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t)
+        half -= length
+    return points[len(points) // 2]
+
+
+def _class_def_css(class_defs: Dict[str, str]) -> str:
+    rules = []
+    for name, style in class_defs.items():
+        if not re.match(r'^[\w-]+$', name):
+            continue
+        css = _style_to_css(style)
+        if not css:
+            continue
+        rules.append(
+            f".chart-container svg .node.{name} > rect, .chart-container svg .node.{name} > polygon, "
+            f".chart-container svg .node.{name} > circle, .chart-container svg .node.{name} > path {{ {css} }}"
+        )
+    return "\n".join(rules)
+
+
+def flowchart_to_html(chart: Flowchart) -> str:
+    """流程图语法树 -> HTML/SVG"""
+    sizes = {node_id: _node_size(node) for node_id, node in chart.nodes.items()}
+    edges = [(e.source, e.target) for e in chart.edges]
+    label_sizes = []
+    for e in chart.edges:
+        if e.label:
+            w, h = text_block_size(e.label)
+            label_sizes.append((w + 8, h + 4))
+        else:
+            label_sizes.append(None)
+
+    layout = layered_layout(sizes, edges, direction=chart.direction, edge_label_sizes=label_sizes)
+
+    def pos(node_id: str) -> Point:
+        x, y = layout.positions[node_id]
+        return (x + MARGIN, y + MARGIN)
+
+    pairs = {(e.source, e.target) for e in chart.edges}
+    incoming = {e.target for e in chart.edges if e.source != e.target}
+    outgoing = {e.source for e in chart.edges if e.source != e.target}
+
+    edge_parts = []
+    label_parts = []
+    for edge, raw_points in zip(chart.edges, layout.edge_points):
+        points = [(x + MARGIN, y + MARGIN) for x, y in raw_points]
+        source, target = chart.nodes[edge.source], chart.nodes[edge.target]
+        if edge.source == edge.target:
+            cx, cy = points[0]
+            w, h = sizes[edge.source]
+            x0, y0 = cx + w / 2, cy - h / 4
+            d = f"M{_fmt(x0)},{_fmt(y0)} C{_fmt(x0 + 40)},{_fmt(y0 - 30)} {_fmt(x0 + 40)},{_fmt(y0 + h / 2 + 30)} {_fmt(x0)},{_fmt(y0 + h / 2)}"
+            label_at = (x0 + 34, cy)
+        else:
+            if len(points) == 2 and (edge.target, edge.source) in pairs:
+                # 两个节点间有双向连线时各自向左侧弯出，避免重叠
+                (ax, ay), (bx, by) = points
+                length = math.hypot(bx - ax, by - ay) or 1.0
+                points.insert(1, ((ax + bx) / 2 + (by - ay) / length * 20, (ay + by) / 2 - (bx - ax) / length * 20))
+            points[0] = _clip(points[0], sizes[edge.source], source.shape, points[1])
+            points[-1] = _clip(points[-1], sizes[edge.target], target.shape, points[-2])
+            d = "M" + " L".join(f"{_fmt(x)},{_fmt(y)}" for x, y in points)
+            label_at = _polyline_midpoint(points)
+
+        dash = {"dotted": ' stroke-dasharray="3,3"'}.get(edge.line, "")
+        width = "3.5" if edge.line == "thick" else "2"
+        edge_parts.append(
+            f'<path class="edge" d="{d}" fill="none" stroke="{EDGE_STROKE}" stroke-width="{width}"{dash} '
+            f'style="{_marker_style(edge.arrow_end, edge.arrow_start)}"/>'
+        )
+        if edge.label:
+            w, h = text_block_size(edge.label)
+            lx, ly = label_at
+            label_parts.append(
+                f'<g class="edge-label"><rect class="edge-label-bg" x="{_fmt(lx - w / 2 - 4)}" y="{_fmt(ly - h / 2 - 2)}" '
+                f'width="{_fmt(w + 8)}" height="{_fmt(h + 4)}" rx="3"/>'
+                f"{_text(lx, ly, edge.label, 'edge-text')}</g>"
+            )
+
+    node_parts = []
+    for node_id, node in chart.nodes.items():
+        cx, cy = pos(node_id)
+        w, h = sizes[node_id]
+        classes = ["node"]
+        if chart.edges:
+            if node_id not in incoming:
+                classes.append("start")
+            elif node_id not in outgoing:
+                classes.append("end")
+            else:
+                classes.append("decision" if node.shape == "rhombus" else "process")
+        classes.extend(c for c in node.classes if re.match(r'^[\w-]+$', c))
+        node_parts.append(
+            f'<g class="{" ".join(classes)}" id="node-{escape(node_id)}">'
+            f"{_node_shape(node, cx, cy, w, h)}{_text(cx, cy, node.label)}</g>"
+        )
+
+    body = (
+        f'<g class="edges">{"".join(edge_parts)}</g>\n'
+        f'<g class="edge-labels">{"".join(label_parts)}</g>\n'
+        f'<g class="nodes">{"".join(node_parts)}</g>'
+    )
+    extra_css = _class_def_css(chart.class_defs)
+    if extra_css:
+        body = f"<style>{extra_css}</style>\n{body}"
+    # 自环会向右伸出节点
+    self_loop_extra = 50 if any(e.source == e.target for e in chart.edges) else 0
+    return _svg_document(
+        body,
+        layout.width + 2 * MARGIN + self_loop_extra,
+        layout.height + 2 * MARGIN,
+        "flowchart"
+    )
+
+
+# ---------------------------------------------------------------------------
+# 时序图
+# ---------------------------------------------------------------------------
+
+def sequence_to_html(diagram: SequenceDiagram) -> str:
+    """时序图语法树 -> HTML/SVG"""
+    index = {p.id: i for i, p in enumerate(diagram.participants)}
+    box_sizes = []
+    for p in diagram.participants:
+        w, h = text_block_size(p.label)
+        box_sizes.append((max(w + 2 * PADDING_X, 90.0), h + 2 * PADDING_Y))
+    box_height = max(h for _, h in box_sizes)
+
+    # 相邻参与者的间距要容纳两者之间的消息文字
+    gaps = [
+        max(150.0, (box_sizes[i][0] + box_sizes[i + 1][0]) / 2 + 40)
+        for i in range(len(box_sizes) - 1)
+    ]
+    numbered = 0
+    for event in diagram.events:
+        if isinstance(event, Message):
+            numbered += 1
+            text = f"{numbered}. {event.text}" if diagram.autonumber else event.text
+            a, b = sorted((index[event.source], index[event.target]))
+            if a == b:
+                if a < len(gaps):
+                    gaps[a] = max(gaps[a], text_width(text) + 70)
+                continue
+            needed = text_width(text) + 30
+            span = sum(gaps[a:b])
+            if span < needed:
+                extra = (needed - span) / (b - a)
+                for k in range(a, b):
+                    gaps[k] += extra
+
+    centers = [MARGIN + box_sizes[0][0] / 2]
+    for gap in gaps:
+        centers.append(centers[-1] + gap)
+
+    parts: List[str] = []
+    y = MARGIN + box_height + 30
+    numbered = 0
+    for event in diagram.events:
+        if isinstance(event, Note):
+            xs = [centers[index[a]] for a in event.actors]
+            w, h = text_block_size(event.text)
+            w, h = w + 20, h + 10
+            if event.position == "left":
+                x0 = xs[0] - 20 - w
+            elif event.position == "right":
+                x0 = xs[0] + 20
+            else:
+                lo, hi = min(xs), max(xs)
+                w = max(w, hi - lo + 40)
+                x0 = (lo + hi) / 2 - w / 2
+            parts.append(
+                f'<g class="note"><rect x="{_fmt(x0)}" y="{_fmt(y)}" width="{_fmt(w)}" height="{_fmt(h)}" '
+                f'fill="#fff5ad" stroke="#aaaa33" stroke-width="1"/>{_text(x0 + w / 2, y + h / 2, event.text)}</g>'
+            )
+            y += h + 20
+            continue
+
+        numbered += 1
+        text = f"{numbered}. {event.text}" if diagram.autonumber else event.text
+        _, text_h = text_block_size(text or " ")
+        x1, x2 = centers[index[event.source]], centers[index[event.target]]
+        dash = ' stroke-dasharray="5,4"' if event.line == "dotted" else ""
+        style = _marker_style(event.arrow)
+        if x1 == x2:
+            top = y + text_h
+            d = f"M{_fmt(x1)},{_fmt(top)} h40 v30 h-40"
+            if text:
+                parts.append(_text(x1 + 50, y + text_h / 2, text, "message-text", anchor="start"))
+            y = top + 30
+        else:
+            line_y = y + text_h + 4
+            d = f"M{_fmt(x1)},{_fmt(line_y)} L{_fmt(x2)},{_fmt(line_y)}"
+            if text:
+                parts.append(_text((x1 + x2) / 2, y + text_h / 2, text, "message-text"))
+            y = line_y
+        parts.append(
+            f'<path class="message" d="{d}" fill="none" stroke="{EDGE_STROKE}" stroke-width="1.5"{dash} style="{style}"/>'
+        )
+        y += 24
+
+    bottom = y + 10
+    actor_parts = []
+    for p, center, (w, _) in zip(diagram.participants, centers, box_sizes):
+        actor_parts.append(
+            f'<line class="lifeline" x1="{_fmt(center)}" y1="{_fmt(MARGIN + box_height)}" x2="{_fmt(center)}" '
+            f'y2="{_fmt(bottom)}" stroke="#999999" stroke-width="1" stroke-dasharray="4,4"/>'
+        )
+        for top in (MARGIN, bottom):
+            actor_parts.append(
+                f'<g class="participant {p.kind}"><rect class="actor" x="{_fmt(center - w / 2)}" y="{_fmt(top)}" '
+                f'width="{_fmt(w)}" height="{_fmt(box_height)}" rx="4" fill="#e3f2fd" stroke="#2196f3" stroke-width="2"/>'
+                f"{_text(center, top + box_height / 2, p.label)}</g>"
+            )
+
+    width = centers[-1] + box_sizes[-1][0] / 2 + MARGIN
+    # 自调用消息和右侧注释可能超出最右侧参与者
+    width += 80
+    height = bottom + box_height + MARGIN
+    body = "".join(actor_parts) + "\n" + "".join(parts)
+    return _svg_document(body, width, height, "sequence", diagram.title)
+
+
+# ---------------------------------------------------------------------------
+# 饼图
+# ---------------------------------------------------------------------------
+
+def pie_to_html(chart: PieChart) -> str:
+    """饼图语法树 -> HTML/SVG"""
+    radius = 150.0
+    cx, cy = MARGIN + radius, MARGIN + radius
+    total = sum(value for _, value in chart.slices)
+
+    slice_parts = []
+    legend_parts = []
+    angle = -math.pi / 2
+    legend_x = cx + radius + 40
+    legend_y = MARGIN + 10
+    legend_width = 0.0
+    for i, (label, value) in enumerate(chart.slices):
+        color = PIE_COLORS[i % len(PIE_COLORS)]
+        fraction = value / total
+        if fraction >= 0.999999:
+            slice_parts.append(
+                f'<circle class="pie-slice" cx="{_fmt(cx)}" cy="{_fmt(cy)}" r="{_fmt(radius)}" fill="{color}" stroke="#ffffff"/>'
+            )
+        elif fraction > 0:
+            end = angle + fraction * 2 * math.pi
+            x1, y1 = cx + radius * math.cos(angle), cy + radius * math.sin(angle)
+            x2, y2 = cx + radius * math.cos(end), cy + radius * math.sin(end)
+            large = 1 if fraction > 0.5 else 0
+            slice_parts.append(
+                f'<path class="pie-slice" d="M{_fmt(cx)},{_fmt(cy)} L{_fmt(x1)},{_fmt(y1)} '
+                f'A{_fmt(radius)},{_fmt(radius)} 0 {large},1 {_fmt(x2)},{_fmt(y2)} Z" fill="{color}" stroke="#ffffff"/>'
+            )
+            # 占比足够大时在扇区中显示百分比
+            if fraction >= 0.05:
+                mid = (angle + end) / 2
+                slice_parts.append(_text(
+                    cx + radius * 0.65 * math.cos(mid), cy + radius * 0.65 * math.sin(mid),
+                    f"{fraction * 100:.1f}%", "pie-label"
+                ))
+            angle = end
+
+        value_text = f" [{value:g}]" if chart.show_data else ""
+        legend_text = f"{label}{value_text}"
+        legend_width = max(legend_width, text_width(legend_text) + 26)
+        legend_parts.append(
+            f'<g class="legend"><rect x="{_fmt(legend_x)}" y="{_fmt(legend_y - 8)}" width="16" height="16" fill="{color}"/>'
+            f"{_text(legend_x + 24, legend_y, legend_text, anchor='start')}</g>"
+        )
+        legend_y += 24
+
+    width = legend_x + legend_width + MARGIN
+    height = max(2 * radius + 2 * MARGIN, legend_y + MARGIN)
+    body = "".join(slice_parts) + "\n" + "".join(legend_parts)
+    return _svg_document(body, width, height, "pie", chart.title)
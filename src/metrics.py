@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+指标模块，以Prometheus文本格式暴露计数器、仪表盘和直方图。
+实现保持最小化，不依赖prometheus_client。
+
+渲染工作进程中记录的计数器和直方图通过take_deltas取出增量，
+随结果发回主进程后由merge_deltas合并，/metrics只需输出主进程的注册表。
+"""
+
+import os
+import abc
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(abc.ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """各样本行"""
+
+    def take_delta(self) -> Dict[LabelValues, Any]:
+        """取出上次调用以来的增量（只有计数器和直方图支持，仪表盘是进程内的瞬时值）"""
+        return {}
+
+    def merge_delta(self, delta: Dict[LabelValues, Any]):
+        """合并其他进程的增量"""
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        # 上次take_delta时的值
+        self._taken: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def take_delta(self) -> Dict[LabelValues, Any]:
+        with self._lock:
+            delta = {
+                key: value - self._taken.get(key, 0.0)
+                for key, value in self._values.items() if value != self._taken.get(key, 0.0)
+            }
+            self._taken = dict(self._values)
+        return delta
+
+    def merge_delta(self, delta: Dict[LabelValues, Any]):
+        with self._lock:
+            for key, amount in delta.items():
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘，也可以在采集时通过回调取值"""
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """进入时加一，退出时减一"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                value = float(self._callback())
+            except Exception:
+                return []
+            return [f"{self.name} {_format_value(value)}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    """按固定分桶统计的直方图"""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> (各分桶计数, 总和, 总数)
+        self._values: Dict[LabelValues, List] = {}
+        # 上次take_delta时的总数和各项值
+        self._taken: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """记录代码块耗时（秒），代码块抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def take_delta(self) -> Dict[LabelValues, Any]:
+        delta = {}
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                taken = self._taken.get(key)
+                if taken is None:
+                    taken = [[0] * len(self.buckets), 0.0, 0]
+                if count == taken[2]:
+                    continue
+                delta[key] = [[a - b for a, b in zip(counts, taken[0])], total - taken[1], count - taken[2]]
+                self._taken[key] = [list(counts), total, count]
+        return delta
+
+    def merge_delta(self, delta: Dict[LabelValues, Any]):
+        with self._lock:
+            for key, (counts, total, count) in delta.items():
+                entry = self._values.get(key)
+                if entry is None:
+                    entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*entry[0]], entry[1], entry[2])) for key, entry in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def take_deltas(self) -> Dict[str, Dict[LabelValues, Any]]:
+        """取出所有计数器和直方图上次调用以来的增量（可pickle），没有变化的指标不包含在内"""
+        deltas = {}
+        for name, metric in self._metrics.items():
+            delta = metric.take_delta()
+            if delta:
+                deltas[name] = delta
+        return deltas
+
+    def merge_deltas(self, deltas: Dict[str, Dict[LabelValues, Any]]):
+        """合并其他进程take_deltas的结果，未注册的指标忽略"""
+        for name, delta in deltas.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge_delta(delta)
+
+    def render(self) -> str:
+        """输出Prometheus文本格式"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# Prometheus文本格式的Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+# 无法读取/proc时，进程运行时间从本模块导入时算起
+_IMPORTED_AT = time.monotonic()
+
+
+def _rss_bytes() -> float:
+    """当前进程的常驻内存（Linux读取/proc，其他平台退化为峰值）"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return float(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def process_uptime() -> float:
+    """进程启动至今的秒数（Linux读取/proc，包含解释器启动和模块导入的时间）"""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            stat = f.read()
+        # 第22个字段为进程启动时间（系统启动后的时钟滴答数）
+        start_ticks = int(stat[stat.rindex(")") + 2:].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - _IMPORTED_AT
+
+
+def _child_process_count() -> float:
+    """当前进程的所有后代进程数（浏览器及其渲染/GPU子进程），仅支持Linux"""
+    parents: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            # 进程名可能包含空格和括号，从最后一个')'之后解析
+            parents[int(entry)] = int(stat[stat.rindex(")") + 2:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    descendants = {os.getpid()}
+    changed = True
+    while changed:
+        changed = False
+        for pid, ppid in parents.items():
+            if ppid in descendants and pid not in descendants:
+                descendants.add(pid)
+                changed = True
+    return float(len(descendants) - 1)
+
+
+# 请求
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "mcp_request_duration_seconds", "工具调用总耗时", ["tool"]))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mcp_requests_in_flight", "正在处理的工具调用数"))
+
+# 各阶段
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "mcp_stage_duration_seconds",
+    "各阶段耗时（classify、prompt_build、html_extract、styling、browser_acquire、set_content、measure、screenshot）",
+    ["stage"]))
+PREPARE_HIDDEN_LATENCY = REGISTRY.register(Histogram(
+    "mcp_prepare_hidden_latency_seconds", "预先准备渲染页面隐藏的延迟（准备耗时减去渲染时仍需等待的时间）"))
+LLM_TTFT = REGISTRY.register(Histogram(
+    "mcp_llm_time_to_first_token_seconds", "LLM首个输出片段的延迟", ["provider", "model"]))
+LLM_DURATION = REGISTRY.register(Histogram(
+    "mcp_llm_duration_seconds", "LLM调用总耗时", ["provider", "model"],
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "mcp_llm_tokens_total",
+    "LLM token用量（input、cached_input、cache_write、output；提供商未返回用量时为input_estimated、output_estimated）",
+    ["provider", "model", "kind"]))
+LLM_OUTPUT_BUDGET = REGISTRY.register(Histogram(
+    "mcp_llm_output_budget_tokens", "每次LLM调用的max_tokens", ["provider", "model"],
+    buckets=(512, 1024, 1536, 2048, 3072, 4096, 8192)))
+
+# 图表会话
+SESSION_TURNS = REGISTRY.register(Counter(
+    "mcp_session_turns_total",
+    "带会话ID的请求数（new新会话、patched补丁修改、fallback补丁失败后重新生成、full完整重新生成、local本地渲染、unchanged输入未变化）",
+    ["mode"]))
+
+# 缓存与错误
+CACHE_HITS = REGISTRY.register(Counter(
+    "mcp_cache_hits_total", "缓存命中次数", ["cache"]))
+CACHE_MISSES = REGISTRY.register(Counter(
+    "mcp_cache_misses_total", "缓存未命中次数", ["cache"]))
+ERRORS = REGISTRY.register(Counter(
+    "mcp_errors_total", "各阶段出错次数", ["stage"]))
+
+# LLM提供商路由
+LLM_REROUTES = REGISTRY.register(Counter(
+    "mcp_llm_reroutes_total", "发往备用提供商的请求数（hedge对冲、failover故障切换、breaker熔断）",
+    ["provider", "reason"]))
+LLM_CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "mcp_llm_circuit_open", "LLM提供商熔断器是否打开", ["provider"]))
+
+# 任务队列（多节点模式）
+JOBS = REGISTRY.register(Counter(
+    "mcp_jobs_total",
+    "任务队列事件数（submitted新提交、deduplicated与已有任务合并、completed完成、failed失败）",
+    ["event"]))
+JOB_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "mcp_job_queue_wait_seconds", "任务从入队到被工作节点领取的时间",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)))
+JOB_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "mcp_job_queue_depth", "排队中的任务数"))
+
+# 启动
+STARTUP_DURATION = REGISTRY.register(Gauge(
+    "mcp_startup_seconds",
+    "服务启动耗时（import进程启动到模块导入完成、ready进程启动到开始监听、prewarm后台预热浏览器的耗时）",
+    ["phase"]))
+
+# 资源
+RENDER_WORKER_RESTARTS = REGISTRY.register(Counter(
+    "mcp_render_worker_restarts_total", "渲染工作进程重启次数", ["reason"]))
+RENDER_WORKERS_ALIVE = REGISTRY.register(Gauge(
+    "mcp_render_workers_alive", "存活的渲染工作进程数"))
+BROWSER_INSTANCES = REGISTRY.register(Gauge(
+    "mcp_browser_instances", "浏览器池中已启动的浏览器数"))
+BROWSER_PROCESSES = REGISTRY.register(Gauge(
+    "mcp_browser_processes", "服务进程的后代进程数（浏览器主进程及其子进程）",
+    callback=_child_process_count))
+PROCESS_RSS = REGISTRY.register(Gauge(
+    "mcp_process_resident_memory_bytes", "服务进程的常驻内存", callback=_rss_bytes))
+
+
+def stage_timer(stage: str):
+    """记录一个阶段的耗时"""
+    return STAGE_DURATION.time(stage=stage)
+
+
+def render_metrics() -> str:
+    """输出所有指标"""
+    return REGISTRY.render()
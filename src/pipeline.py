@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图表生成流水线模块，把生成过程分为LLM阶段和浏览器渲染阶段，
+两个阶段分别限制并发，LLM调用较慢时不会占用渲染资源。
+"""
+
+import os
+import time
+import logging
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from src.llm_handler import process_user_input
+from src.renderer import render_html_to_png, prepare_page, OUTPUT_FORMATS
+from src.render_workers import RenderWorkerPool
+from src.chart_store import get_chart_store, chart_url
+from src.svg_export import html_to_svg
+from src.metrics import stage_timer
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+
+# 结果返回方式：inline在响应中内联图像数据，url保存图像并返回资源URL
+RESPONSE_MODES = ("inline", "url")
+
+
+class ChartPipeline:
+    """
+    两阶段的图表生成流水线。
+
+    LLM阶段与渲染阶段各自持有一个信号量，所有请求（单个或批量）共享同一组限制。
+    一个图表完成LLM阶段后立即释放LLM名额并排队等待渲染，
+    因此渲染阶段在其他图表仍在等待LLM时也能持续工作。
+    """
+
+    def __init__(
+        self,
+        llm_concurrency: Optional[int] = None,
+        render_concurrency: Optional[int] = None,
+        render_workers: Optional[RenderWorkerPool] = None
+    ):
+        """
+        Args:
+            llm_concurrency: 同时进行的LLM调用上限，默认读取LLM_CONCURRENCY
+            render_concurrency: 同时进行的浏览器渲染上限，默认读取RENDER_CONCURRENCY，
+                未设置时与浏览器池（或所有渲染工作进程的浏览器）总数相同
+            render_workers: 渲染工作进程池（可选），设置时渲染在工作进程中执行
+        """
+        self.render_workers = render_workers
+        if llm_concurrency is None:
+            llm_concurrency = int(os.getenv("LLM_CONCURRENCY", "8"))
+        if render_concurrency is None:
+            default = render_workers.capacity if render_workers is not None else os.getenv("BROWSER_POOL_SIZE", "2")
+            render_concurrency = int(os.getenv("RENDER_CONCURRENCY", str(default)))
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.render_concurrency = max(1, render_concurrency)
+        self._llm_semaphore = asyncio.Semaphore(self.llm_concurrency)
+        self._render_semaphore = asyncio.Semaphore(self.render_concurrency)
+
+    async def generate(self, params, prepare: bool = True) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        生成单个图表。
+
+        Args:
+            params: 图表参数（GenerateChartParams）
+            prepare: 是否在LLM生成期间预先准备渲染页面；批量生成时关闭，
+                避免大量等待LLM的图表占住浏览器
+
+        Returns:
+            (工具返回结果, 各阶段耗时毫秒数)
+        """
+        if params.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {params.output_format}")
+        if params.response_mode not in RESPONSE_MODES:
+            raise ValueError(f"不支持的返回方式: {params.response_mode}，可选: {', '.join(RESPONSE_MODES)}")
+
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+
+        # 在LLM生成HTML的同时预先准备好渲染页面（渲染在工作进程中执行时无法预先准备，
+        # SVG输出通常不需要浏览器）
+        prepared = None
+        if prepare and self.render_workers is None and params.output_format != "svg":
+            prepared = prepare_page(params.width, params.height, params.device_scale_factor)
+        try:
+            # LLM阶段：使用LLM处理用户输入，生成HTML
+            async with self._llm_semaphore:
+                stage_start = time.perf_counter()
+                timings["llm_wait_ms"] = (stage_start - start) * 1000
+                html_content = await process_user_input(
+                    params.input_text,
+                    chart_type=params.chart_type,
+                    css_template=params.css_template,
+                    custom_css=params.custom_css,
+                    use_cache=not params.bypass_cache,
+                    session_id=params.session_id
+                )
+                timings["llm_ms"] = (time.perf_counter() - stage_start) * 1000
+
+            # 纯SVG图表直接导出，不占用渲染名额
+            image_data = None
+            if params.output_format == "svg":
+                with stage_timer("svg_export"):
+                    image_data = html_to_svg(html_content)
+            if image_data is not None:
+                return await self._build_result(params, image_data, timings, start)
+            
+            # 渲染阶段：将HTML渲染为图像
+            queued = time.perf_counter()
+            async with self._render_semaphore:
+                stage_start = time.perf_counter()
+                timings["render_wait_ms"] = (stage_start - queued) * 1000
+                image_data = await self.render(
+                    html_content,
+                    width=params.width,
+                    height=params.height,
+                    use_cache=not params.bypass_cache,
+                    prepared=prepared,
+                    wait_mode=params.wait_mode,
+                    output_format=params.output_format,
+                    quality=params.quality,
+                    device_scale_factor=params.device_scale_factor,
+                    # 上面已经尝试过直接导出SVG
+                    svg_export=False
+                )
+                timings["render_ms"] = (time.perf_counter() - stage_start) * 1000
+                if prepared is not None and prepared.hidden_latency > 0:
+                    timings["prepare_hidden_ms"] = prepared.hidden_latency * 1000
+        finally:
+            # LLM调用失败时清理预先准备的页面（已被渲染使用时无副作用）
+            if prepared is not None:
+                await prepared.discard()
+
+        return await self._build_result(params, image_data, timings, start)
+
+    async def _build_result(
+        self,
+        params,
+        image_data: bytes,
+        timings: Dict[str, float],
+        start: float
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """按返回方式构造工具返回结果"""
+        result = {
+            "mime_type": OUTPUT_FORMATS[params.output_format],
+            "filename": f"生成的图表.{params.output_format}",
+            "description": "基于用户输入生成的图表"
+        }
+        if params.response_mode == "url":
+            # 图像按内容哈希保存，响应中只返回资源URL
+            name, digest = await get_chart_store().put(image_data, params.output_format)
+            result.update(uri=chart_url(name), etag=f'"{digest}"', size=len(image_data))
+        else:
+            result["content"] = image_data
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        return result, timings
+
+    async def render(self, html_content: str, **kwargs) -> bytes:
+        """渲染HTML，参数与render_html_to_png相同；配置了渲染工作进程时在工作进程中执行"""
+        if self.render_workers is not None:
+            return await self.render_workers.render(html_content, **kwargs)
+        return await render_html_to_png(html_content, **kwargs)
+
+    async def generate_many(
+        self,
+        items: List[Any],
+        runner: Optional[Callable[[Any], Awaitable[Tuple[Dict[str, Any], Dict[str, float]]]]] = None,
+        deadline: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量生成图表，按输入顺序返回结果，单个图表失败不影响其他图表。
+
+        Args:
+            items: 图表参数列表；元素为异常时表示该项参数无效，直接记为错误
+            runner: 生成单个图表的协程函数，默认为关闭预准备页面的generate
+            deadline: 截止时间（time.monotonic()时间点），到时仍未完成的图表被取消并记为超时，
+                已完成的结果不受影响；None表示不限
+
+        Returns:
+            与输入顺序一致的结果列表，每项包含index、ok、timings，
+            成功时包含content/mime_type/filename，失败时包含error（超时的项还有timed_out）
+        """
+        if runner is None:
+            runner = lambda params: self.generate(params, prepare=False)
+
+        async def run_item(index: int, params) -> Dict[str, Any]:
+            if isinstance(params, Exception):
+                return {"index": index, "ok": False, "error": f"参数无效: {str(params)}", "timings": {}}
+            start = time.perf_counter()
+            try:
+                if deadline is None:
+                    result, timings = await runner(params)
+                else:
+                    result, timings = await asyncio.wait_for(
+                        runner(params), max(0.0, deadline - time.monotonic())
+                    )
+                item = {"index": index, "ok": True, "timings": dict(timings)}
+                item.update(result)
+                return item
+            except asyncio.TimeoutError:
+                logger.warning(f"批量生成第 {index} 个图表超过截止时间")
+                return {
+                    "index": index,
+                    "ok": False,
+                    "error": "超过截止时间",
+                    "timed_out": True,
+                    "timings": {"total_ms": (time.perf_counter() - start) * 1000}
+                }
+            except Exception as e:
+                logger.error(f"批量生成第 {index} 个图表时出错: {str(e)}")
+                return {
+                    "index": index,
+                    "ok": False,
+                    "error": str(e),
+                    "timings": {"total_ms": (time.perf_counter() - start) * 1000}
+                }
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_item(i, p) for i, p in enumerate(items)))
+        succeeded = sum(1 for r in results if r["ok"])
+        logger.info(
+            f"批量生成完成: {succeeded}/{len(results)} 成功，"
+            f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return list(results)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+LLM提供商路由模块：按滚动延迟对慢请求发起对冲请求，主提供商失败时切换到备用提供商，
+并用熔断器暂停向不健康的提供商发送请求。
+"""
+
+import os
+import time
+import logging
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+from src.metrics import LLM_CIRCUIT_OPEN, LLM_REROUTES
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+
+class ProvidersUnavailableError(RuntimeError):
+    """所有可用的LLM提供商均处于熔断状态"""
+
+
+class CircuitBreaker:
+    """
+    基于滚动错误率的熔断器。
+
+    - closed：正常放行，最近的调用中错误率达到阈值时打开
+    - open：拒绝所有请求，冷却时间过后进入half_open
+    - half_open：只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, error_rate: float, min_calls: int, cooldown: float, window: int):
+        self.error_rate = error_rate
+        self.min_calls = max(1, min_calls)
+        self.cooldown = cooldown
+        self._outcomes: Deque[bool] = deque(maxlen=max(self.min_calls, window))
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        """是否放行一个请求（half_open时放行的请求即为探测请求）"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, ok: bool):
+        """记录一次调用结果"""
+        if self._state == self.HALF_OPEN:
+            self._probing = False
+            if ok:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+        self._outcomes.append(ok)
+        if self._state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for outcome in self._outcomes if not outcome)
+            if failures / len(self._outcomes) >= self.error_rate:
+                self._open()
+
+    def abandon(self):
+        """放行的请求被取消、没有结果时调用，允许重新探测"""
+        if self._state == self.HALF_OPEN:
+            self._probing = False
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+class ProviderHealth:
+    """单个提供商的滚动延迟和熔断状态"""
+
+    def __init__(self, name: str, window: int, breaker: CircuitBreaker):
+        self.name = name
+        self.breaker = breaker
+        self._latencies: Deque[float] = deque(maxlen=max(1, window))
+
+    def record_success(self, latency: float):
+        self._latencies.append(latency)
+        self._record(True)
+
+    def record_failure(self):
+        self._record(False)
+
+    def _record(self, ok: bool):
+        self.breaker.record(ok)
+        LLM_CIRCUIT_OPEN.set(1 if self.breaker.state == CircuitBreaker.OPEN else 0, provider=self.name)
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        """最近成功调用的p95延迟（秒），样本不足时返回None"""
+        if len(self._latencies) < min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class ProviderRouter:
+    """
+    LLM提供商路由。
+
+    先向主提供商发送请求，超过其自适应p95延迟预算仍未返回时向备用提供商发送对冲请求，
+    取先返回的结果并取消另一个；主提供商出错时立即切换到备用提供商。
+    熔断中的提供商不接收请求。
+    """
+
+    def __init__(
+        self,
+        hedge_enabled: Optional[bool] = None,
+        min_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        window: Optional[int] = None
+    ):
+        """
+        Args:
+            hedge_enabled: 是否发送对冲请求，默认读取LLM_HEDGE_ENABLED
+            min_delay: 对冲等待时间下限（秒），默认读取LLM_HEDGE_MIN_DELAY_MS
+            max_delay: 对冲等待时间上限（秒），样本不足时也使用该值，默认读取LLM_HEDGE_MAX_DELAY_MS
+            window: 统计延迟和错误率的最近调用数，默认读取LLM_ROUTER_WINDOW
+        """
+        if hedge_enabled is None:
+            hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+        if min_delay is None:
+            min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "1000")) / 1000
+        if max_delay is None:
+            max_delay = float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", "15000")) / 1000
+        if window is None:
+            window = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+        self.hedge_enabled = hedge_enabled
+        self.min_delay = max(0.0, min_delay)
+        self.max_delay = max(self.min_delay, max_delay)
+        self.window = max(1, window)
+        self.min_samples = min(self.window, 20)
+        self.error_rate = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+        self.min_calls = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+        self.cooldown = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+        self._health: Dict[str, ProviderHealth] = {}
+
+    def health(self, provider: str) -> ProviderHealth:
+        """获取提供商的健康状态（首次调用时创建）"""
+        health = self._health.get(provider)
+        if health is None:
+            breaker = CircuitBreaker(self.error_rate, self.min_calls, self.cooldown, self.window)
+            health = self._health[provider] = ProviderHealth(provider, self.window, breaker)
+        return health
+
+    def hedge_delay(self, provider: str) -> float:
+        """向备用提供商发送对冲请求前的等待时间（秒）"""
+        p95 = self.health(provider).p95(self.min_samples)
+        if p95 is None:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, p95))
+
+    async def call(
+        self,
+        invoke: Callable[[str, str], Awaitable[str]],
+        prompt: str,
+        primary: str,
+        secondary: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """
+        路由一次LLM调用。
+
+        Args:
+            invoke: 实际调用函数，参数为(提供商, 提示词)
+            prompt: 提示词
+            primary: 主提供商
+            secondary: 备用提供商（可选）
+
+        Returns:
+            (实际返回结果的提供商, 响应内容)
+        """
+        first, backup = primary, secondary
+        if not self.health(first).breaker.allow():
+            if backup is None or not self.health(backup).breaker.allow():
+                raise ProvidersUnavailableError(f"LLM提供商 {primary} 处于熔断状态，暂无可用的提供商")
+            logger.warning(f"LLM提供商 {primary} 处于熔断状态，改用 {backup}")
+            LLM_REROUTES.inc(provider=backup, reason="breaker")
+            first, backup = backup, None
+
+        pending: Dict[asyncio.Future, str] = {asyncio.ensure_future(self._attempt(invoke, first, prompt)): first}
+        timeout = self.hedge_delay(first) if backup is not None and self.hedge_enabled else None
+        errors = []
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        return provider, task.result()
+                    except Exception as e:
+                        errors.append(e)
+                # 主提供商超过延迟预算仍未返回时对冲，已经失败时切换
+                if backup is not None and (not done or not pending):
+                    reason = "hedge" if pending else "failover"
+                    if self.health(backup).breaker.allow():
+                        logger.info(f"LLM提供商 {first} {'响应慢' if pending else '调用失败'}，向 {backup} 发送请求")
+                        LLM_REROUTES.inc(provider=backup, reason=reason)
+                        pending[asyncio.ensure_future(self._attempt(invoke, backup, prompt))] = backup
+                    backup = None
+                timeout = None
+            raise errors[-1]
+        finally:
+            # 取消落后的请求并等待其关闭连接
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _attempt(self, invoke: Callable[[str, str], Awaitable[str]], provider: str, prompt: str) -> str:
+        health = self.health(provider)
+        start = time.monotonic()
+        try:
+            result = await invoke(provider, prompt)
+        except asyncio.CancelledError:
+            health.breaker.abandon()
+            raise
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.monotonic() - start)
+        return result
+
+
+# 全局路由实例
+_provider_router: Optional[ProviderRouter] = None
+
+
+def get_provider_router() -> ProviderRouter:
+    """获取全局LLM提供商路由实例（首次调用时创建）"""
+    global _provider_router
+    if _provider_router is None:
+        _provider_router = ProviderRouter()
+    return _provider_router
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+渲染缓存模块，按内容哈希缓存渲染结果。
+内存中为按字节数限制的LRU，磁盘上为按总大小限制的持久化存储。
+"""
+
+import os
+import json
+import hashlib
+import logging
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from dotenv import load_dotenv
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# 默认磁盘缓存目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "renders")
+
+
+def make_render_key(
+    html_content: str,
+    width: int,
+    height: int,
+    browser_type: str,
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    计算渲染结果的内容哈希键。
+
+    Args:
+        html_content: HTML内容字符串
+        width: 截图宽度
+        height: 截图高度
+        browser_type: 浏览器类型
+        options: 影响输出的其他选项
+
+    Returns:
+        十六进制SHA-256哈希
+    """
+    hasher = hashlib.sha256()
+    meta = json.dumps(
+        {"width": width, "height": height, "browser": browser_type, "options": options or {}},
+        sort_keys=True
+    )
+    hasher.update(meta.encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update(html_content.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class RenderCache:
+    """两级渲染缓存：内存LRU + 磁盘存储"""
+
+    def __init__(
+        self,
+        memory_bytes: Optional[int] = None,
+        disk_bytes: Optional[int] = None,
+        cache_dir: Optional[str] = None
+    ):
+        """
+        Args:
+            memory_bytes: 内存缓存字节上限，默认读取RENDER_CACHE_MEMORY_BYTES，0表示禁用
+            disk_bytes: 磁盘缓存字节上限，默认读取RENDER_CACHE_DISK_BYTES，0表示禁用
+            cache_dir: 磁盘缓存目录，默认读取RENDER_CACHE_DIR
+        """
+        self.memory_bytes = memory_bytes if memory_bytes is not None else int(
+            os.getenv("RENDER_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+        self.disk_bytes = disk_bytes if disk_bytes is not None else int(
+            os.getenv("RENDER_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+        self.cache_dir = cache_dir or os.getenv("RENDER_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+
+        # 磁盘索引：键 -> 文件大小，按最近使用顺序排列
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()
+        # 首次使用时在线程池中扫描磁盘目录
+        self._index_future: Optional[asyncio.Future] = None
+        # 多个渲染工作进程共用同一目录，各自只知道自己的写入；
+        # 累计写入超过上限的1/16时重新扫描目录，使总大小的超出量有界
+        self._rescan_bytes = max(1, self.disk_bytes // 16)
+        self._written_since_scan = 0
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.bin")
+
+    async def _ensure_disk_index(self):
+        """首次使用磁盘缓存时在线程池中加载索引，并发调用共享同一次加载"""
+        if self._index_future is None:
+            loop = asyncio.get_running_loop()
+            self._index_future = loop.run_in_executor(None, self._load_disk_index)
+        await asyncio.shield(self._index_future)
+
+    def _load_disk_index(self):
+        """扫描磁盘缓存目录，重建索引并淘汰超出上限的文件"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._disk_lock:
+            self._rescan_disk()
+            self._evict_disk()
+        logger.info(f"渲染磁盘缓存已加载: {len(self._disk_index)} 项, {self._disk_size} 字节")
+
+    def _rescan_disk(self):
+        """按修改时间重建LRU索引（读取时会更新修改时间，因此反映所有进程的访问顺序；调用方需持有锁）"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".bin"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        self._disk_index = OrderedDict()
+        self._disk_size = 0
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_size += size
+        self._written_since_scan = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """查询缓存，先查内存再查磁盘"""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return data
+
+        if self.disk_bytes > 0:
+            await self._ensure_disk_index()
+        if self.disk_bytes > 0 and key in self._disk_index:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None, self._read_disk, key)
+            if data is not None:
+                self.stats["disk_hits"] += 1
+                self._put_memory(key, data)
+                return data
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        """写入缓存，磁盘写入在线程池中执行"""
+        self._put_memory(key, data)
+        if self.disk_bytes > 0 and len(data) <= self.disk_bytes:
+            await self._ensure_disk_index()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write_disk, key, data)
+
+    def _put_memory(self, key: str, data: bytes):
+        if self.memory_bytes <= 0 or len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, None)
+        except OSError:
+            with self._disk_lock:
+                size = self._disk_index.pop(key, None)
+                if size is not None:
+                    self._disk_size -= size
+            return None
+        with self._disk_lock:
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return data
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 多个渲染工作进程可能共用同一磁盘缓存目录
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入渲染磁盘缓存失败: {str(e)}")
+            return
+        with self._disk_lock:
+            old = self._disk_index.pop(key, None)
+            if old is not None:
+                self._disk_size -= old
+            self._disk_index[key] = len(data)
+            self._disk_size += len(data)
+            self._written_since_scan += len(data)
+            if self._written_since_scan >= self._rescan_bytes:
+                # 重新统计目录实际大小，计入其他进程写入的文件
+                self._rescan_disk()
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """按LRU顺序删除磁盘缓存，直到总大小不超过上限（调用方需持有锁）"""
+        while self._disk_size > self.disk_bytes and self._disk_index:
+            key, size = self._disk_index.popitem(last=False)
+            self._disk_size -= size
+            self.stats["disk_evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回命中/未命中/淘汰计数及当前占用"""
+        return {
+            **self.stats,
+            "memory_items": len(self._memory),
+            "memory_size": self._memory_size,
+            "disk_items": len(self._disk_index),
+            "disk_size": self._disk_size,
+        }
+
+
+# 全局渲染缓存实例
+_render_cache: Optional[RenderCache] = None
+
+
+def get_render_cache() -> RenderCache:
+    """获取全局渲染缓存实例（首次调用时创建）"""
+    global _render_cache
+    if _render_cache is None:
+        _render_cache = RenderCache()
+    return _render_cache
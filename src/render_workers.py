@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多进程渲染模块。API进程通过本地IPC队列把渲染任务分发给多个渲染工作进程，
+每个工作进程拥有独立的事件循环、Playwright驱动和浏览器池，渲染可以利用多个CPU核心。
+每个工作进程通过各自的管道返回结果，重启时丢弃旧管道，
+被强制结束的进程即使留下不完整的消息也不会影响其他工作进程。
+工作进程中记录的渲染指标增量和浏览器数随每条结果（包括健康检查的回应）发回主进程。
+
+分发器按进行中的任务数选择负载最小的工作进程，定期进行健康检查，
+工作进程崩溃或失去响应时自动重启，并把其未完成的任务重新分发一次。
+"""
+
+import os
+import time
+import itertools
+import logging
+import asyncio
+import threading
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Dict, List, Optional, Set
+from dotenv import load_dotenv
+
+from src.metrics import REGISTRY, RENDER_WORKER_RESTARTS
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+# 一个任务最多分发的次数（首次 + 工作进程崩溃后重试一次）
+_MAX_ATTEMPTS = 2
+
+
+class RenderWorkerError(RuntimeError):
+    """渲染工作进程执行任务失败或不可用"""
+
+
+class _Job:
+    def __init__(self, job_id: int, payload: Dict[str, Any], future: asyncio.Future):
+        self.id = job_id
+        self.payload = payload
+        self.future = future
+        self.attempts = 0
+        self.worker: Optional["_Worker"] = None
+
+
+class _Worker:
+    """分发器一侧的工作进程句柄"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.jobs = None
+        self.inflight: Set[int] = set()
+        self.ping_sent: Optional[float] = None
+        self.started_at = 0.0
+        # 每次启动递增，旧进程迟到的结果按代数忽略
+        self.generation = 0
+        # 正在停止时不再分发任务
+        self.stopping = False
+        # 工作进程最近报告的已启动浏览器数
+        self.browsers = 0
+
+    @property
+    def alive(self) -> bool:
+        return not self.stopping and self.process is not None and self.process.is_alive()
+
+
+class RenderWorkerPool:
+    """渲染工作进程池及任务分发器"""
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        browsers_per_worker: Optional[int] = None,
+        health_interval: Optional[float] = None,
+        ping_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            size: 工作进程数，默认读取RENDER_WORKERS
+            browsers_per_worker: 每个工作进程的浏览器池大小，默认读取RENDER_WORKER_BROWSERS
+            health_interval: 健康检查间隔（秒），默认读取RENDER_WORKER_HEALTH_INTERVAL
+            ping_timeout: 健康检查无响应多久后重启工作进程（秒），默认读取RENDER_WORKER_PING_TIMEOUT
+        """
+        if size is None:
+            size = int(os.getenv("RENDER_WORKERS", "0"))
+        if browsers_per_worker is None:
+            browsers_per_worker = int(os.getenv("RENDER_WORKER_BROWSERS", "1"))
+        if health_interval is None:
+            health_interval = float(os.getenv("RENDER_WORKER_HEALTH_INTERVAL", "2"))
+        if ping_timeout is None:
+            ping_timeout = float(os.getenv("RENDER_WORKER_PING_TIMEOUT", "10"))
+        self.size = max(1, size)
+        self.browsers_per_worker = max(1, browsers_per_worker)
+        self.health_interval = max(0.1, health_interval)
+        self.ping_timeout = max(self.health_interval, ping_timeout)
+
+        # 子进程使用spawn启动，不继承父进程的事件循环和Playwright状态
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._jobs: Dict[int, _Job] = {}
+        self._ids = itertools.count(1)
+        # 结果管道的读取端 -> (工作进程序号, 代数)，由读取线程和事件循环共同访问
+        self._connections: Dict[Any, tuple] = {}
+        self._connections_lock = threading.Lock()
+        self._reader_stop = threading.Event()
+        self._reader: Optional[threading.Thread] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started = False
+
+    @property
+    def capacity(self) -> int:
+        """所有工作进程合计可同时进行的渲染数"""
+        return self.size * self.browsers_per_worker
+
+    @property
+    def alive_count(self) -> int:
+        return sum(1 for worker in self._workers if worker.alive)
+
+    @property
+    def browser_count(self) -> int:
+        """存活的工作进程最近报告的已启动浏览器数之和"""
+        return sum(worker.browsers for worker in self._workers if worker.alive)
+
+    async def start(self):
+        """启动所有工作进程、结果读取线程和健康检查任务"""
+        if self._started:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._reader_stop.clear()
+        self._workers = [_Worker(i) for i in range(self.size)]
+        for worker in self._workers:
+            self._spawn(worker)
+        self._reader = threading.Thread(target=self._read_results, name="render-results", daemon=True)
+        self._reader.start()
+        self._monitor_task = asyncio.ensure_future(self._monitor())
+        self._started = True
+        logger.info(f"渲染工作进程已启动: {self.size} 个，每个 {self.browsers_per_worker} 个浏览器")
+
+    async def close(self):
+        """通知工作进程退出并等待其关闭浏览器"""
+        if not self._started:
+            return
+        self._started = False
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+        for worker in self._workers:
+            if worker.alive:
+                worker.jobs.put(None)
+        loop = asyncio.get_running_loop()
+        for worker in self._workers:
+            await loop.run_in_executor(None, self._stop_process, worker, 10.0)
+        for job in list(self._jobs.values()):
+            if not job.future.done():
+                job.future.set_exception(RenderWorkerError("渲染工作进程已关闭"))
+        self._jobs.clear()
+        self._reader_stop.set()
+        await loop.run_in_executor(None, self._reader.join, 5.0)
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        logger.info("渲染工作进程已关闭")
+
+    async def render(self, html_content: str, **kwargs) -> bytes:
+        """
+        在工作进程中执行render_html_to_png，参数与其相同（不支持prepared）。
+
+        Returns:
+            图像的二进制内容
+        """
+        if not self._started:
+            await self.start()
+        kwargs.pop("prepared", None)
+        job = _Job(next(self._ids), dict(kwargs, html_content=html_content), self._loop.create_future())
+        self._jobs[job.id] = job
+        self._dispatch(job)
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            # 调用方取消（例如超过截止时间）时通知工作进程取消渲染
+            self._forget(job)
+            if job.worker is not None and job.worker.alive:
+                job.worker.jobs.put(("cancel", job.id, None))
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回每个工作进程的存活状态和进行中的任务数"""
+        return {
+            "workers": [
+                {"index": w.index, "alive": w.alive, "inflight": len(w.inflight)} for w in self._workers
+            ],
+            "pending": len(self._jobs),
+        }
+
+    def _dispatch(self, job: _Job):
+        """把任务发给进行中任务最少的存活工作进程"""
+        candidates = [worker for worker in self._workers if worker.alive]
+        if not candidates:
+            self._fail(job, RenderWorkerError("没有可用的渲染工作进程"))
+            return
+        worker = min(candidates, key=lambda w: len(w.inflight))
+        job.attempts += 1
+        job.worker = worker
+        worker.inflight.add(job.id)
+        worker.jobs.put(("render", job.id, job.payload))
+
+    def _forget(self, job: _Job):
+        self._jobs.pop(job.id, None)
+        if job.worker is not None:
+            job.worker.inflight.discard(job.id)
+
+    def _fail(self, job: _Job, error: Exception):
+        self._forget(job)
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def _spawn(self, worker: _Worker):
+        worker.generation += 1
+        worker.jobs = self._ctx.Queue()
+        receiver, sender = self._ctx.Pipe(duplex=False)
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.index, worker.jobs, sender, self.browsers_per_worker),
+            name=f"render-worker-{worker.index}",
+            daemon=True
+        )
+        worker.process.start()
+        # 关闭父进程中的发送端，工作进程退出后读取端才能收到EOF
+        sender.close()
+        with self._connections_lock:
+            self._connections[receiver] = (worker.index, worker.generation)
+        worker.ping_sent = None
+        worker.started_at = time.monotonic()
+        worker.stopping = False
+        worker.browsers = 0
+
+    async def _restart(self, worker: _Worker, reason: str):
+        """重启工作进程，并把其未完成的任务重新分发（每个任务最多重试一次）"""
+        logger.warning(f"渲染工作进程 #{worker.index} {reason}，重启")
+        RENDER_WORKER_RESTARTS.inc(reason=reason)
+        worker.stopping = True
+        # 等待进程退出会阻塞，在线程池中执行；旧管道由读取线程在收到EOF后丢弃
+        await asyncio.get_running_loop().run_in_executor(None, self._stop_process, worker, 0)
+        orphans = [self._jobs[job_id] for job_id in worker.inflight if job_id in self._jobs]
+        worker.inflight.clear()
+        self._spawn(worker)
+        for job in orphans:
+            if job.attempts < _MAX_ATTEMPTS:
+                self._dispatch(job)
+            else:
+                self._fail(job, RenderWorkerError(f"渲染工作进程 #{worker.index} {reason}"))
+
+    @staticmethod
+    def _stop_process(worker: _Worker, timeout: float):
+        process = worker.process
+        if process is None:
+            return
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join(1.0)
+        # 不等待队列中未发送的数据，避免进程已退出时阻塞
+        worker.jobs.cancel_join_thread()
+        worker.jobs.close()
+
+    async def _monitor(self):
+        """定期健康检查：进程已退出或健康检查超时未响应时重启"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for worker in self._workers:
+                if not worker.alive:
+                    await self._restart(worker, "已退出")
+                elif worker.ping_sent is not None and now - worker.ping_sent > self.ping_timeout:
+                    await self._restart(worker, "无响应")
+                elif worker.ping_sent is None:
+                    worker.ping_sent = now
+                    worker.jobs.put(("ping", 0, None))
+
+    def _read_results(self):
+        """后台线程：读取各工作进程管道中的结果并交给事件循环处理"""
+        while not self._reader_stop.is_set():
+            with self._connections_lock:
+                connections = dict(self._connections)
+            if not connections:
+                self._reader_stop.wait(0.2)
+                continue
+            # 带超时等待，以便发现重启后新增的管道
+            for connection in wait_connections(list(connections), timeout=0.2):
+                index, generation = connections[connection]
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # 工作进程已退出（可能在发送途中被强制结束），丢弃该管道
+                    with self._connections_lock:
+                        self._connections.pop(connection, None)
+                    connection.close()
+                    continue
+                self._loop.call_soon_threadsafe(self._on_result, index, generation, message)
+
+    def _on_result(self, index: int, generation: int, message):
+        kind, job_id, value, report = message
+        # 旧进程发来的指标同样有效
+        REGISTRY.merge_deltas(report["metrics"])
+        worker = self._workers[index]
+        # 已重启的工作进程的旧进程发来的消息
+        if generation != worker.generation:
+            return
+        worker.browsers = report["browsers"]
+        if kind == "pong":
+            worker.ping_sent = None
+            return
+        job = self._jobs.get(job_id)
+        # 已取消、已重新分发给其他进程或已失败的任务，忽略迟到的结果
+        if job is None or job.worker is not worker:
+            return
+        self._forget(job)
+        if job.future.done():
+            return
+        if kind == "done":
+            job.future.set_result(value)
+        else:
+            job.future.set_exception(RenderWorkerError(value))
+
+
+def _worker_main(index: int, jobs, results, browsers: int):
+    """工作进程入口，results为结果管道的发送端"""
+    # 必须在导入浏览器池之前设置
+    os.environ["BROWSER_POOL_SIZE"] = str(browsers)
+    try:
+        asyncio.run(_worker_loop(index, jobs, results))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        results.close()
+
+
+async def _worker_loop(index: int, jobs, results):
+    from src.browser_pool import get_browser_pool
+    from src.renderer import render_html_to_png
+    from src.artifact_store import get_artifact_store
+
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+
+    def read_jobs():
+        while True:
+            message = jobs.get()
+            loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message is None:
+                return
+
+    # 管道写满时发送会阻塞，在线程池中发送；多个线程不能同时写同一管道
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            results.send(message)
+
+    pool = get_browser_pool()
+
+    async def reply(kind: str, job_id: int, value: Any):
+        # 附带本进程的指标增量和浏览器数，由主进程合并后在/metrics输出
+        report = {"metrics": REGISTRY.take_deltas(), "browsers": pool.alive_count}
+        await loop.run_in_executor(None, send, (kind, job_id, value, report))
+
+    threading.Thread(target=read_jobs, name="render-jobs", daemon=True).start()
+    # 在后台启动浏览器，期间照常响应健康检查；任务到达时浏览器池会等待启动完成
+    if os.getenv("BROWSER_PREWARM", "true").lower() in ("1", "true", "yes"):
+        startup = asyncio.ensure_future(pool.prewarm())
+    else:
+        startup = asyncio.ensure_future(pool.start())
+    startup.add_done_callback(
+        lambda _: logger.info(f"渲染工作进程 #{index} 已就绪（pid {os.getpid()}）")
+    )
+
+    tasks: Dict[int, asyncio.Task] = {}
+
+    async def run_job(job_id: int, payload: Dict[str, Any]):
+        try:
+            data = await render_html_to_png(**payload)
+            await reply("done", job_id, data)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            await reply("error", job_id, f"{type(e).__name__}: {str(e)}")
+        finally:
+            tasks.pop(job_id, None)
+
+    try:
+        while True:
+            message = await inbox.get()
+            if message is None:
+                break
+            kind, job_id, payload = message
+            if kind == "ping":
+                await reply("pong", 0, None)
+            elif kind == "cancel":
+                task = tasks.get(job_id)
+                if task is not None:
+                    task.cancel()
+            else:
+                tasks[job_id] = asyncio.ensure_future(run_job(job_id, payload))
+        if tasks:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+    finally:
+        if not startup.done():
+            startup.cancel()
+        await asyncio.gather(startup, return_exceptions=True)
+        await pool.close()
+        await get_artifact_store().flush()
@@ -2,18 +2,25 @@
 # -*- coding: utf-8 -*-
 
 """
-渲染模块，负责将HTML内容渲染为PNG图像。
-使用Playwright实现浏览器自动化和截图功能。
+渲染模块，负责将HTML内容渲染为PNG等图像，或打印为PDF。
+使用Playwright实现浏览器自动化和截图功能；纯SVG图表输出SVG时不需要浏览器。
 """
 
 import os
+import time
 import logging
+import math
 import asyncio
 import base64
 from typing import Optional
-from playwright.async_api import async_playwright
 from dotenv import load_dotenv
 
+from src.browser_pool import get_browser_pool, PageLease
+from src.render_cache import get_render_cache, make_render_key
+from src.artifact_store import get_artifact_store
+from src.metrics import CACHE_HITS, CACHE_MISSES, ERRORS, PREPARE_HIDDEN_LATENCY, stage_timer
+from src.svg_export import html_to_svg
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -24,132 +31,396 @@ logger = logging.getLogger(__name__)
 # 加载环境变量
 load_dotenv()
 
+class RenderError(RuntimeError):
+    """浏览器渲染失败。调用方按错误处理，不把结果当作请求格式的图像返回或保存"""
+
 # 静态文件目录
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 os.makedirs(STATIC_DIR, exist_ok=True)
 
+class PreparedPage:
+    """
+    在LLM生成HTML期间预先准备的渲染页面。
+    
+    后台任务会借出浏览器页面（必要时启动浏览器、按像素比重建上下文）并设置视口，
+    HTML到达后即可立即渲染。页面内容不预先载入：渲染时set_content会替换整个文档，
+    预先载入的CSS不会被复用，而且最终使用的模板要等输入分类后才能确定。
+    准备好的页面在等待LLM期间登记在浏览器池中，有其他渲染等待浏览器时会被收回，
+    此时渲染退回普通流程。
+    """
+    
+    def __init__(self, width: int, height: int, device_scale_factor: float = 1.0):
+        self.width = width
+        self.height = height
+        self.device_scale_factor = device_scale_factor
+        self.started_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self.hidden_latency = 0.0
+        self._task = asyncio.ensure_future(self._prepare())
+    
+    async def _prepare(self) -> Optional[PageLease]:
+        # 没有空闲浏览器时不抢占，避免投机准备占住其他请求的渲染资源
+        lease = await get_browser_pool().acquire(
+            self.width, self.height, wait=False, device_scale_factor=self.device_scale_factor
+        )
+        if lease is None:
+            return None
+        self.ready_at = time.monotonic()
+        await get_browser_pool().park(lease)
+        return lease
+    
+    async def take(self) -> Optional[PageLease]:
+        """等待准备完成并取出页面租约，准备失败或没有空闲浏览器时返回None"""
+        wait_start = time.monotonic()
+        try:
+            lease = await self._task
+        except Exception as e:
+            logger.warning(f"预先准备渲染页面失败: {str(e)}")
+            return None
+        if lease is not None and not get_browser_pool().unpark(lease):
+            logger.info("预先准备的渲染页面已让给其他渲染")
+            return None
+        if lease is not None:
+            # 被隐藏的延迟 = 准备耗时 - 渲染时仍需等待的时间
+            waited = time.monotonic() - wait_start
+            self.hidden_latency = max(0.0, (self.ready_at - self.started_at) - waited)
+            PREPARE_HIDDEN_LATENCY.observe(self.hidden_latency)
+            logger.info(f"预先准备渲染页面隐藏了 {self.hidden_latency * 1000:.0f}ms 延迟")
+        return lease
+    
+    async def discard(self):
+        """放弃预先准备的页面（例如LLM调用失败或命中渲染缓存）"""
+        if not self._task.done():
+            self._task.cancel()
+        try:
+            lease = await self._task
+        except BaseException:
+            return
+        if lease is not None:
+            get_browser_pool().unpark(lease)
+            await lease.release()
+
+def prepare_page(
+    width: int = 800,
+    height: int = 600,
+    device_scale_factor: float = 1.0
+) -> Optional[PreparedPage]:
+    """
+    开始在后台准备渲染页面，与LLM调用并行执行。
+    
+    Args:
+        width: 视口宽度（像素）
+        height: 视口高度（像素）
+        device_scale_factor: 设备像素比
+        
+    Returns:
+        PreparedPage，SPECULATIVE_PREPARE为false时返回None
+    """
+    if os.getenv("SPECULATIVE_PREPARE", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return PreparedPage(width, height, device_scale_factor)
+
+# 渲染就绪判定：等待字体加载、图片解码并经过两个动画帧，最多等待timeoutMs毫秒
+# （懒加载或被拦截后一直未结束的图片不会让渲染挂起）；超时时返回true
+_READY_SCRIPT = """async (timeoutMs) => {
+    const ready = (async () => {
+        if (document.fonts && document.fonts.ready) {
+            await document.fonts.ready;
+        }
+        await Promise.all(Array.from(document.images)
+            .filter(img => !img.complete)
+            .map(img => new Promise(resolve => { img.onload = img.onerror = resolve; })));
+        await new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+        return false;
+    })();
+    const timeout = new Promise(resolve => setTimeout(() => resolve(true), timeoutMs));
+    return await Promise.race([ready, timeout]);
+}"""
+
+# 支持的就绪模式
+WAIT_MODES = ("fast", "networkidle")
+
+# 支持的输出格式及其MIME类型
+OUTPUT_FORMATS = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+}
+
+# 只打印.chart-container：隐藏其他内容，并把容器移到页面左上角（{width}为测量得到的宽度）
+_PDF_PRINT_STYLE = """@page { margin: 0; }
+@media print {
+    html, body { margin: 0 !important; padding: 0 !important; }
+    body * { visibility: hidden; }
+    .chart-container, .chart-container * { visibility: visible; }
+    .chart-container {
+        position: absolute !important; left: 0 !important; top: 0 !important;
+        margin: 0 !important; box-sizing: border-box !important; width: {width}px !important;
+    }
+}"""
+
+# 一次求值完成测量：优先取.chart-container的区域，没有时取整个页面
+_MEASURE_SCRIPT = """() => {
+    const body = document.body;
+    const html = document.documentElement;
+    const pageWidth = Math.max(
+        body.scrollWidth, body.offsetWidth,
+        html.clientWidth, html.scrollWidth, html.offsetWidth
+    );
+    const pageHeight = Math.max(
+        body.scrollHeight, body.offsetHeight,
+        html.clientHeight, html.scrollHeight, html.offsetHeight
+    );
+    const result = {
+        x: 0, y: 0, width: pageWidth, height: pageHeight,
+        pageWidth: pageWidth, pageHeight: pageHeight,
+        overflow: pageWidth > html.clientWidth
+    };
+    const container = document.querySelector('.chart-container');
+    if (container) {
+        const rect = container.getBoundingClientRect();
+        result.x = rect.left + window.scrollX;
+        result.y = rect.top + window.scrollY;
+        result.width = rect.width;
+        result.height = rect.height;
+        result.overflow = result.overflow || container.scrollWidth > container.clientWidth;
+    }
+    return result;
+}"""
+
+def _resolve_wait_mode(wait_mode: Optional[str]) -> str:
+    mode = (wait_mode or os.getenv("RENDER_WAIT_MODE", "fast")).lower()
+    if mode not in WAIT_MODES:
+        raise ValueError(f"不支持的就绪模式: {mode}，可选: {', '.join(WAIT_MODES)}")
+    return mode
+
 async def render_html_to_png(
     html_content: str,
     width: int = 800,
     height: int = 600,
-    save_html: bool = True
+    save_html: Optional[bool] = None,
+    use_cache: bool = True,
+    prepared: Optional[PreparedPage] = None,
+    wait_mode: Optional[str] = None,
+    output_format: str = "png",
+    quality: Optional[int] = None,
+    device_scale_factor: float = 1.0,
+    svg_export: bool = True
 ) -> bytes:
     """
-    将HTML内容渲染为PNG图像。
+    将HTML内容渲染为图像（默认PNG）。
     
     Args:
         html_content: HTML内容字符串
         width: 截图宽度（像素）
         height: 截图高度（像素）
-        save_html: 是否保存HTML文件（用于调试）
+        save_html: 是否保存HTML用于调试；None时按ARTIFACT_SAMPLE_RATE采样，
+            True时总是保存，False时不保存
+        use_cache: 是否使用渲染缓存
+        prepared: 由prepare_page预先准备的页面（可选）
+        wait_mode: 渲染就绪模式，fast为DOMContentLoaded+字体就绪+两帧并拦截外部资源，
+            networkidle为等待网络空闲；默认读取RENDER_WAIT_MODE
+        output_format: 输出格式，png、jpeg、webp、svg或pdf；
+            svg在图表为纯SVG时直接从HTML导出，否则把截图嵌入SVG；pdf只支持Chromium
+        quality: jpeg/webp的压缩质量（1-100）
+        device_scale_factor: 设备像素比，大于1时输出高分辨率图像
+        svg_export: svg输出时是否先尝试直接从HTML导出；调用方已经尝试过
+            （html_to_svg返回None）时传False，避免重复解析
         
     Returns:
-        PNG图像的二进制内容
+        图像的二进制内容
+        
+    Raises:
+        RenderError: 浏览器渲染失败
     """
-    logger.info(f"开始渲染HTML为PNG，尺寸: {width}x{height}")
+    logger.info(f"开始渲染HTML为{output_format.upper()}，尺寸: {width}x{height}")
+    wait_mode = _resolve_wait_mode(wait_mode)
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}，可选: {', '.join(OUTPUT_FORMATS)}")
+    if output_format not in ("jpeg", "webp"):
+        quality = None
     
-    # 可选：保存HTML用于调试
-    if save_html:
-        import uuid
-        html_path = os.path.join(STATIC_DIR, f"chart_{uuid.uuid4().hex}.html")
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(html_content)
-        logger.info(f"已保存HTML文件: {html_path}")
+    # 纯SVG图表直接导出，不经过浏览器
+    if output_format == "svg" and svg_export:
+        with stage_timer("svg_export"):
+            svg_data = html_to_svg(html_content)
+        if svg_data is not None:
+            if prepared is not None:
+                await prepared.discard()
+            return svg_data
+        logger.info("图表不是纯SVG，截图后嵌入SVG")
+    if output_format == "pdf" and get_browser_pool().browser_type != "chromium":
+        raise ValueError("PDF输出只支持Chromium浏览器")
     
-    # 使用Playwright渲染HTML并截图
-    async with async_playwright() as p:
-        # 启动浏览器
-        browser_type = os.getenv("BROWSER_TYPE", "chromium")
-        if browser_type == "firefox":
-            browser = await p.firefox.launch(headless=True)
-        elif browser_type == "webkit":
-            browser = await p.webkit.launch(headless=True)
-        else:  # 默认使用Chromium
-            browser = await p.chromium.launch(headless=True)
-        
-        # 创建页面
-        page = await browser.new_page()
-        
-        # 设置视口大小
-        await page.set_viewport_size({"width": width, "height": height})
+    # 相同内容、尺寸和浏览器的渲染结果直接从缓存返回
+    cache = get_render_cache()
+    cache_key = make_render_key(
+        html_content, width, height,
+        browser_type=get_browser_pool().browser_type,
+        options={
+            "type": output_format,
+            "quality": quality,
+            "scale": device_scale_factor,
+            "wait_mode": wait_mode
+        }
+    )
+    if use_cache:
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"渲染缓存命中: {cache_key[:12]}")
+            CACHE_HITS.inc(cache="render")
+            if prepared is not None:
+                await prepared.discard()
+            return cached
+        CACHE_MISSES.inc(cache="render")
+    
+    # 可选：在后台保存HTML用于调试（按内容去重，容量有限）
+    if save_html is not False:
+        get_artifact_store().save(html_content, force=bool(save_html))
+    
+    lease = None
+    if prepared is not None:
+        with stage_timer("browser_acquire"):
+            lease = await prepared.take()
+    if lease is not None and prepared.device_scale_factor != device_scale_factor:
+        await lease.release()
+        lease = None
+    image_data = await _render_with_browser(
+        html_content, width, height, wait_mode, lease,
+        output_format=output_format, quality=quality, device_scale_factor=device_scale_factor
+    )
+    
+    if use_cache:
+        await cache.put(cache_key, image_data)
+    
+    return image_data
+
+async def _render_with_browser(
+    html_content: str,
+    width: int,
+    height: int,
+    wait_mode: str = "fast",
+    lease: Optional[PageLease] = None,
+    output_format: str = "png",
+    quality: Optional[int] = None,
+    device_scale_factor: float = 1.0
+) -> bytes:
+    """使用浏览器池渲染HTML，返回图像数据；失败时抛出RenderError"""
+    # 没有预先准备的页面时，从常驻浏览器池借出页面
+    if lease is None:
+        with stage_timer("browser_acquire"):
+            lease = await get_browser_pool().acquire(width, height, device_scale_factor=device_scale_factor)
+    page = lease.page
+    lease.rendered = True
+    failed = False
+    try:
+        # 设置内容并等待渲染完成
+        with stage_timer("set_content"):
+            if wait_mode == "fast":
+                # HTML应当是自包含的：外部资源只从本地白名单提供，不再等待500ms的网络空闲窗口
+                lease.set_block_external(True)
+                await page.set_content(html_content, wait_until="domcontentloaded")
+                ready_timeout = int(os.getenv("RENDER_READY_TIMEOUT_MS", "3000"))
+                if await page.evaluate(_READY_SCRIPT, ready_timeout):
+                    logger.warning(f"等待字体和图片就绪超过 {ready_timeout}ms，按当前状态截图")
+            else:
+                lease.set_block_external(False)
+                await page.set_content(html_content, wait_until="networkidle")
         
-        try:
-            # 设置内容并等待渲染完成
-            await page.set_content(html_content, wait_until="networkidle")
-            
-            # 获取内容大小
-            dimensions = await page.evaluate("""() => {
-                const body = document.body;
-                const html = document.documentElement;
-                
-                const width = Math.max(
-                    body.scrollWidth, body.offsetWidth,
-                    html.clientWidth, html.scrollWidth, html.offsetWidth
-                );
-                
-                const height = Math.max(
-                    body.scrollHeight, body.offsetHeight,
-                    html.clientHeight, html.scrollHeight, html.offsetHeight
-                );
-                
-                return { width, height };
-            }""")
-            
-            # 调整视口以适应内容
-            content_width = min(dimensions["width"], width * 2)  # 限制最大宽度
-            content_height = min(dimensions["height"], height * 2)  # 限制最大高度
-            
-            # 如果内容小于最小尺寸，使用最小尺寸
-            content_width = max(content_width, width)
-            content_height = max(content_height, height)
-            
-            await page.set_viewport_size({"width": content_width, "height": content_height})
+        with stage_timer("measure"):
+            # 一次测量得到截图区域
+            box = await page.evaluate(_MEASURE_SCRIPT)
             
-            # 截图
-            screenshot_bytes = await page.screenshot(
-                type="png",
-                full_page=True,
-                omit_background=True  # 透明背景
-            )
-            
-            logger.info(f"渲染完成，图片尺寸: {content_width}x{content_height}")
-            return screenshot_bytes
-            
-        except Exception as e:
-            logger.error(f"渲染HTML时出错: {str(e)}", exc_info=True)
-            # 尝试截取错误页面
-            try:
-                error_screenshot = await page.screenshot(type="png")
-                return error_screenshot
-            except:
-                # 如果无法截图，返回简单错误消息的图像
-                return _generate_error_image(str(e))
-        finally:
-            await browser.close()
-
-def _generate_error_image(error_message: str) -> bytes:
-    """生成一个包含错误消息的图像（备用方案）"""
-    try:
-        from PIL import Image, ImageDraw, ImageFont
-        import io
+            # 内容溢出视口时才扩大视口重新布局（最多为请求宽度的两倍）
+            if box["overflow"]:
+                content_width = min(max(int(box["pageWidth"]), width), width * 2)
+                await page.set_viewport_size({"width": content_width, "height": height})
+                box = await page.evaluate(_MEASURE_SCRIPT)
         
-        # 创建一个带有错误消息的图像
-        img = Image.new('RGB', (800, 400), color=(255, 255, 255))
-        d = ImageDraw.Draw(img)
+        # 截图区域限制在页面范围内，且不超过请求尺寸的两倍
+        x = max(0.0, box["x"])
+        y = max(0.0, box["y"])
+        clip = {
+            "x": x,
+            "y": y,
+            "width": max(1.0, min(box["width"], box["pageWidth"] - x, width * 2)),
+            "height": max(1.0, min(box["height"], box["pageHeight"] - y, height * 2)),
+        }
         
-        # 尝试加载字体，如果失败则使用默认字体
-        try:
-            font = ImageFont.truetype("Arial", 16)
-        except:
-            font = ImageFont.load_default()
+        if output_format == "pdf":
+            with stage_timer("pdf"):
+                pdf_bytes = await _print_pdf(page, clip)
+            logger.info(f"PDF打印完成，页面尺寸: {clip['width']:.0f}x{clip['height']:.0f}")
+            return pdf_bytes
+        
+        # 单次裁剪截图，不再调整视口
+        screenshot_type = "jpeg" if output_format == "jpeg" else "png"
+        screenshot_options = {"type": screenshot_type, "clip": clip, "full_page": True}
+        if screenshot_type == "png":
+            screenshot_options["omit_background"] = True  # 透明背景
+        else:
+            screenshot_options["quality"] = quality or 85
+        with stage_timer("screenshot"):
+            image_bytes = await page.screenshot(**screenshot_options)
+            
+            if output_format == "webp":
+                loop = asyncio.get_running_loop()
+                image_bytes = await loop.run_in_executor(None, _png_to_webp, image_bytes, quality)
+            elif output_format == "svg":
+                image_bytes = _png_to_svg(image_bytes, clip["width"], clip["height"])
         
-        # 绘制错误消息
-        d.text((20, 20), f"渲染错误:\n{error_message}", fill=(255, 0, 0), font=font)
+        logger.info(
+            f"渲染完成，图片尺寸: {clip['width']:.0f}x{clip['height']:.0f}，"
+            f"像素比: {device_scale_factor}，格式: {output_format}"
+        )
+        return image_bytes
         
-        # 保存为二进制数据
-        buf = io.BytesIO()
-        img.save(buf, format='PNG')
-        return buf.getvalue()
-    except:
-        # 如果上述方法失败，返回一个空白的1x1像素图像
-        return base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+P+/HgAFdQJ+OwRXvQAAAABJRU5ErkJggg==") 
\ No newline at end of file
+    except Exception as e:
+        failed = True
+        ERRORS.inc(stage="render")
+        logger.error(f"渲染HTML时出错: {str(e)}", exc_info=True)
+        # 不返回错误截图：调用方会把结果标记为请求的格式并可能保存到图表存储
+        raise RenderError(f"渲染HTML时出错: {str(e)}") from e
+    finally:
+        await lease.release(failed)
+
+async def _print_pdf(page, clip) -> bytes:
+    """把.chart-container打印为单页PDF，页面尺寸与测量得到的区域一致"""
+    width = math.ceil(clip["width"])
+    height = math.ceil(clip["height"])
+    await page.add_style_tag(content=_PDF_PRINT_STYLE.replace("{width}", str(width)))
+    return await page.pdf(
+        width=f"{width}px",
+        height=f"{height}px",
+        print_background=True,
+        margin={"top": "0", "right": "0", "bottom": "0", "left": "0"},
+        page_ranges="1"
+    )
+
+def _png_to_svg(png_bytes: bytes, width: float, height: float) -> bytes:
+    """把截图嵌入SVG（图表不是纯SVG时的备用方案），显示尺寸为CSS像素"""
+    data = base64.b64encode(png_bytes).decode("ascii")
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="0 0 {width:.0f} {height:.0f}">'
+        f'<image width="{width:.0f}" height="{height:.0f}" href="data:image/png;base64,{data}"/></svg>\n'
+    ).encode("utf-8")
+
+def _png_to_webp(png_bytes: bytes, quality: Optional[int] = None) -> bytes:
+    """将PNG转换为WebP（需要Pillow）"""
+    try:
+        from PIL import Image
+        import io
+    except ImportError:
+        raise ValueError("输出WebP格式需要安装Pillow")
+    
+    buf = io.BytesIO()
+    with Image.open(io.BytesIO(png_bytes)) as img:
+        if quality is None:
+            img.save(buf, format="WEBP", lossless=True)
+        else:
+            img.save(buf, format="WEBP", quality=quality)
+    return buf.getvalue()
@@ -7,23 +7,38 @@ Mermaid-MCP: 基于MCP协议的流程图生成服务器
 """
 
 import os
+import json
+import math
+import hashlib
 import logging
+import time
 import asyncio
-from typing import Dict, Any, Optional, List
+import contextvars
+from typing import Dict, Any, Optional, List, Tuple
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 
 # MCP相关
-import mcp.server.stdio
 import mcp.types as mcp_types
 from mcp.server.lowlevel import NotificationOptions, Server
 
 # 导入项目模块
 from src.llm_handler import process_user_input
-from src.renderer import render_html_to_png
-from src.utils import get_available_templates
+from src.pipeline import ChartPipeline
+from src.render_workers import RenderWorkerPool
+from src.browser_pool import get_browser_pool
+from src.artifact_store import get_artifact_store
+from src.chart_store import CHART_MIME_TYPES, etag_matches, get_chart_store
+from src.image_cards import render_error_card, render_list_card
+from src.job_queue import JobWorker, get_job_queue
+from src.session_store import use_shared_sessions
+from src.singleflight import SingleFlight
+from src.admission import AdmissionController, OverloadedError, PRIORITY_CLASSES, run_with_deadline
+from src import metrics
+from src.utils import get_available_templates, get_template_registry, normalize_input
 
 # 配置日志
 logging.basicConfig(
@@ -43,23 +58,156 @@ class GenerateChartParams(BaseModel):
     custom_css: Optional[str] = None
     width: Optional[int] = Field(default=800)
     height: Optional[int] = Field(default=600)
+    bypass_cache: bool = Field(default=False)
+    wait_mode: Optional[str] = None
+    output_format: str = Field(default="png")
+    quality: Optional[int] = Field(default=None, ge=1, le=100)
+    device_scale_factor: float = Field(default=1.0, gt=0, le=4)
+    session_id: Optional[str] = Field(default=None, max_length=128)
+    response_mode: str = Field(default="inline")
+
+def _coalesce_key(params: GenerateChartParams) -> str:
+    """计算generate_chart请求的合并键，输入文本先规范化"""
+    payload = params.model_dump()
+    payload["input_text"] = normalize_input(params.input_text)
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+# generate_charts的截止时间（time.monotonic()时间点），由/mcp终结点设置，在各图表上分别生效
+_batch_deadline: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar("batch_deadline", default=None)
+
+def _batch_size(payload: Dict[str, Any]) -> Optional[int]:
+    """generate_charts调用中的图表数，其他请求返回None"""
+    params = payload.get("params")
+    if not isinstance(params, dict) or params.get("name") != "generate_charts":
+        return None
+    charts = (params.get("arguments") or {}).get("charts")
+    return len(charts) if isinstance(charts, list) else 0
+
+def _json_rpc_error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    """构造JSON-RPC错误响应"""
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+def _parse_chart_params(arguments: Dict[str, Any]) -> GenerateChartParams:
+    """将工具参数转换为GenerateChartParams"""
+    return GenerateChartParams(
+        input_text=arguments.get("input_text", ""),
+        chart_type=arguments.get("chart_type"),
+        css_template=arguments.get("css_template"),
+        custom_css=arguments.get("custom_css"),
+        width=int(arguments.get("width", 800)),
+        height=int(arguments.get("height", 600)),
+        bypass_cache=bool(arguments.get("bypass_cache", False)),
+        wait_mode=arguments.get("wait_mode"),
+        output_format=str(arguments.get("output_format", "png")).lower(),
+        quality=int(arguments["quality"]) if arguments.get("quality") is not None else None,
+        device_scale_factor=float(arguments.get("device_scale_factor", 1.0)),
+        session_id=str(arguments["session_id"]) if arguments.get("session_id") else None,
+        response_mode=str(arguments.get("response_mode", "inline")).lower()
+    )
+
+# 图表URL的缓存策略：内容按哈希寻址，永不改变
+_CHART_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_SVG_CSP = "default-src 'none'; style-src 'unsafe-inline'; img-src data:"
+
+# 运行模式：standalone单节点处理全部请求；api只把生成任务放入任务队列；
+# worker从任务队列领取任务执行LLM调用和渲染
+SERVER_MODES = ("standalone", "api", "worker")
+
+# 提供的工具名称（用作指标标签）
+_TOOL_NAMES = ("generate_chart", "generate_charts", "list_css_templates")
 
 # 定义MCP服务器类
 class MermaidMCPServer:
-    def __init__(self):
+    def __init__(self, render_workers: Optional[int] = None, mode: Optional[str] = None):
+        """
+        Args:
+            render_workers: 渲染工作进程数，默认读取RENDER_WORKERS；0表示在当前进程中渲染
+            mode: 运行模式（standalone、api、worker），默认读取SERVER_MODE
+        """
+        # 进程启动到模块导入完成的耗时
+        metrics.STARTUP_DURATION.set(metrics.process_uptime(), phase="import")
+        self.mode = (mode or os.getenv("SERVER_MODE", "standalone")).lower()
+        if self.mode not in SERVER_MODES:
+            raise ValueError(f"不支持的运行模式: {self.mode}，可选: {', '.join(SERVER_MODES)}")
+        if render_workers is None:
+            render_workers = int(os.getenv("RENDER_WORKERS", "0"))
+        if self.mode == "api":
+            # API节点不渲染
+            render_workers = 0
+        
         # 创建FastAPI应用
         self.app = FastAPI(title="Mermaid-MCP API")
         
         # 创建MCP服务器
         self.mcp_server = Server("mermaid-mcp-server")
         
+        # 启动时把CSS模板读入内存
+        get_template_registry().load()
+        
+        # 常驻浏览器池，在服务器启动时预先启动
+        self.browser_pool = get_browser_pool()
+        
+        # 多进程模式：渲染分发给各自持有浏览器的工作进程
+        self.render_workers = RenderWorkerPool(render_workers) if render_workers > 0 else None
+        
+        # 合并相同参数的并发generate_chart请求
+        self.singleflight = SingleFlight()
+        
+        # LLM阶段和渲染阶段分别限制并发的生成流水线
+        self.pipeline = ChartPipeline(render_workers=self.render_workers)
+        
+        # 工具调用的准入控制和默认截止时间（秒）
+        self.admission = AdmissionController()
+        self.request_timeout = float(os.getenv("MCP_REQUEST_TIMEOUT", "120"))
+        
+        # 多节点模式下API节点与工作节点共享的任务队列
+        self.job_queue = get_job_queue() if self.mode != "standalone" else None
+        self.job_worker: Optional[JobWorker] = None
+        if self.mode == "worker":
+            # 会话保存在队列后端中，同一会话的后续修改可以由任意工作节点执行
+            use_shared_sessions(self.job_queue)
+        
+        # Prometheus指标
+        @self.app.get("/metrics")
+        async def get_metrics():
+            if self.render_workers is not None:
+                # 多进程模式下浏览器在工作进程中，由各工作进程报告
+                metrics.BROWSER_INSTANCES.set(self.render_workers.browser_count)
+                metrics.RENDER_WORKERS_ALIVE.set(self.render_workers.alive_count)
+            else:
+                metrics.BROWSER_INSTANCES.set(self.browser_pool.alive_count)
+            if self.job_queue is not None:
+                try:
+                    metrics.JOB_QUEUE_DEPTH.set(await self.job_queue.depth())
+                except Exception as e:
+                    logger.warning(f"读取任务队列长度失败: {str(e)}")
+            return PlainTextResponse(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+        
+        # response_mode=url时返回的图表，文件名为内容哈希，内容不可变
+        @self.app.api_route("/charts/{name}", methods=["GET", "HEAD"])
+        async def get_chart(name: str, request: Request):
+            path = get_chart_store().path_for(name)
+            if path is None:
+                return JSONResponse({"error": "图表不存在"}, status_code=404)
+            digest, extension = name.split(".", 1)
+            headers = {"ETag": f'"{digest}"', "Cache-Control": _CHART_CACHE_CONTROL}
+            if extension == "svg":
+                # SVG中可能带有LLM生成的脚本，直接打开时不允许执行
+                headers["Content-Security-Policy"] = _SVG_CSP
+                headers["X-Content-Type-Options"] = "nosniff"
+            if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            # 服务器支持http.response.pathsend扩展时直接发送文件，不经过Python读取
+            return FileResponse(path, media_type=CHART_MIME_TYPES[extension], headers=headers)
+        
         # 注册工具
         @self.mcp_server.list_tools()
         async def list_tools() -> List[mcp_types.Tool]:
             return [
                 mcp_types.Tool(
                     name="generate_chart",
-                    description="将文本描述或Mermaid代码生成为PNG图表",
+                    description="将文本描述或Mermaid代码生成为图表（PNG/JPEG/WebP图像，或SVG/PDF矢量文件）",
                     arguments=[
                         mcp_types.ToolArgument(name="input_text", description="用户输入的文本或Mermaid代码", required=True),
                         mcp_types.ToolArgument(name="chart_type", description="图表类型，例如flowchart, sequence等", required=False),
@@ -67,92 +215,159 @@ class MermaidMCPServer:
                         mcp_types.ToolArgument(name="custom_css", description="自定义CSS", required=False),
                         mcp_types.ToolArgument(name="width", description="图表宽度", required=False),
                         mcp_types.ToolArgument(name="height", description="图表高度", required=False),
+                        mcp_types.ToolArgument(name="bypass_cache", description="跳过缓存强制重新生成", required=False),
+                        mcp_types.ToolArgument(name="wait_mode", description="渲染就绪模式：fast（默认）或networkidle", required=False),
+                        mcp_types.ToolArgument(name="output_format", description="输出格式：png（默认）、jpeg、webp、svg或pdf", required=False),
+                        mcp_types.ToolArgument(name="quality", description="jpeg/webp压缩质量（1-100）", required=False),
+                        mcp_types.ToolArgument(name="device_scale_factor", description="设备像素比，例如2表示高清输出", required=False),
+                        mcp_types.ToolArgument(name="session_id", description="图表会话ID，同一会话的后续输入作为对上一次图表的修改（如“在B和C之间加一步”）", required=False),
+                        mcp_types.ToolArgument(name="response_mode", description="返回方式：inline（默认，内联图像数据）或url（返回可缓存的图像URL）", required=False),
+                    ],
+                ),
+                mcp_types.Tool(
+                    name="generate_charts",
+                    description="批量生成图表，按顺序返回每个图表的结果、错误和耗时",
+                    arguments=[
+                        mcp_types.ToolArgument(name="charts", description="图表参数列表，每项参数与generate_chart相同", required=True),
                     ],
                 ),
                 mcp_types.Tool(
                     name="list_css_templates",
                     description="获取可用的CSS模板列表",
-                    arguments=[],
+                    arguments=[
+                        mcp_types.ToolArgument(name="format", description="返回格式：json（默认）或image（PNG图像）", required=False),
+                    ],
                 ),
             ]
         
         @self.mcp_server.call_tool()
         async def call_tool(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-            logger.info(f"调用工具: {name}, 参数: {arguments}")
+            tool = name if name in _TOOL_NAMES else "unknown"
+            with metrics.REQUESTS_IN_FLIGHT.track(), metrics.REQUEST_DURATION.time(tool=tool):
+                return await self._call_tool(name, arguments)
+    
+    async def _call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """执行工具调用"""
+        logger.info(f"调用工具: {name}, 参数: {arguments}")
+
+        if name == "generate_chart":
+            try:
+                # 参数处理
+                params = _parse_chart_params(arguments)
+                
+                # 相同参数的并发请求共享同一次LLM调用和渲染
+                result, _ = await self.singleflight.do(
+                    _coalesce_key(params),
+                    lambda: self._generate_chart(params)
+                )
+                return dict(result)
+            except Exception as e:
+                logger.error(f"生成图表时出错: {str(e)}", exc_info=True)
+                metrics.ERRORS.inc(stage="request")
+                # 返回错误信息（用Pillow绘制，不占用浏览器）
+                error_png = render_error_card("生成图表时出错", str(e))
+                return {
+                    "content": error_png,
+                    "mime_type": "image/png",
+                    "filename": "错误.png",
+                    "description": f"生成过程中出现错误: {str(e)}"
+                }
+        
+        elif name == "generate_charts":
+            charts = arguments.get("charts") or []
+            if not isinstance(charts, list):
+                raise ValueError("charts参数必须是列表")
             
-            if name == "generate_chart":
+            # 参数无效的项记为错误，不影响其他图表
+            items = []
+            for chart in charts:
                 try:
-                    # 参数处理
-                    params = GenerateChartParams(
-                        input_text=arguments.get("input_text", ""),
-                        chart_type=arguments.get("chart_type"),
-                        css_template=arguments.get("css_template"),
-                        custom_css=arguments.get("custom_css"),
-                        width=int(arguments.get("width", 800)),
-                        height=int(arguments.get("height", 600))
-                    )
-                    
-                    # 使用LLM处理用户输入，生成HTML
-                    html_content = await process_user_input(
-                        params.input_text,
-                        chart_type=params.chart_type,
-                        css_template=params.css_template,
-                        custom_css=params.custom_css
-                    )
-                    
-                    # 将HTML渲染为PNG
-                    png_data = await render_html_to_png(
-                        html_content,
-                        width=params.width,
-                        height=params.height
-                    )
-                    
-                    # 返回资源
-                    return {
-                        "content": png_data,
-                        "mime_type": "image/png",
-                        "filename": "生成的图表.png",
-                        "description": "基于用户输入生成的图表"
-                    }
+                    items.append(_parse_chart_params(chart))
                 except Exception as e:
-                    logger.error(f"生成图表时出错: {str(e)}", exc_info=True)
-                    # 返回错误信息
-                    error_html = f"<html><body><h1>生成图表时出错</h1><p>{str(e)}</p></body></html>"
-                    error_png = await render_html_to_png(error_html, width=400, height=300)
-                    return {
-                        "content": error_png,
-                        "mime_type": "image/png",
-                        "filename": "错误.png",
-                        "description": f"生成过程中出现错误: {str(e)}"
-                    }
+                    items.append(e)
             
-            elif name == "list_css_templates":
-                templates = get_available_templates()
-                
-                html_content = """
-                <html><body>
-                <h1>可用的CSS模板</h1>
-                <ul>
-                """
-                
-                for template in templates:
-                    html_content += f"<li>{template}</li>"
-                
-                html_content += """
-                </ul>
-                </body></html>
-                """
-                
-                png_data = await render_html_to_png(html_content, width=400, height=400)
+            # 超过截止时间的图表记为错误，已完成的图表照常返回
+            results = await self.pipeline.generate_many(
+                items, runner=self._generate_batch_item, deadline=_batch_deadline.get()
+            )
+            succeeded = sum(1 for r in results if r["ok"])
+            return {
+                "results": results,
+                "description": f"批量生成 {len(results)} 个图表，成功 {succeeded} 个"
+            }
+        
+        elif name == "list_css_templates":
+            templates = get_available_templates()
+            output = str(arguments.get("format") or "json").lower()
+            
+            if output == "image":
                 return {
-                    "content": png_data,
+                    "content": render_list_card("可用的CSS模板", tuple(templates)),
                     "mime_type": "image/png",
                     "filename": "可用CSS模板.png",
                     "description": "列出所有可用的CSS模板"
                 }
-            
-            else:
-                raise ValueError(f"未知工具: {name}")
+            if output != "json":
+                raise ValueError(f"不支持的格式: {output}，可选: json、image")
+            return {
+                "templates": templates,
+                "content": json.dumps({"templates": templates}, ensure_ascii=False),
+                "mime_type": "application/json",
+                "description": f"可用的CSS模板: {', '.join(templates)}"
+            }
+        
+        else:
+            raise ValueError(f"未知工具: {name}")
+
+    async def _generate_chart(self, params: GenerateChartParams) -> Dict[str, Any]:
+        """执行完整的生成流程：LLM生成HTML，再渲染为图像"""
+        if self.mode == "api":
+            result, _ = await self._enqueue_chart(params)
+        else:
+            result, _ = await self.pipeline.generate(params)
+        return result
+    
+    async def _generate_batch_item(self, params: GenerateChartParams):
+        """批量生成中的单个图表，批内及与其他请求间的相同参数同样会被合并"""
+        if self.mode == "api":
+            run = lambda: self._enqueue_chart(params)
+        else:
+            run = lambda: self.pipeline.generate(params, prepare=False)
+        (result, timings), shared = await self.singleflight.do("batch:" + _coalesce_key(params), run)
+        return result, dict(timings, shared=shared)
+    
+    async def _enqueue_chart(self, params: GenerateChartParams) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """API模式：把生成任务放入任务队列并等待工作节点的结果，相同内容的任务跨节点合并"""
+        key = _coalesce_key(params)
+        # 会话中的请求依赖会话的最新状态，bypass_cache要求重新生成，都不复用已完成的结果
+        reuse = not params.bypass_cache and params.session_id is None
+        created = await self.job_queue.submit(
+            key, params.model_dump(), reuse_result=reuse, session_id=params.session_id
+        )
+        metrics.JOBS.inc(event="submitted" if created else "deduplicated")
+        data = await self.job_queue.wait(key)
+        return data["result"], data["timings"]
+    
+    async def _run_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """工作节点：执行队列中的一个generate_chart任务"""
+        params = GenerateChartParams(**payload)
+        result, timings = await self.pipeline.generate(params)
+        return {"result": result, "timings": timings}
+    
+    def _request_timeout(self, deadline_ms: Optional[str], batch_size: Optional[int] = None) -> float:
+        """
+        计算请求的截止时间（秒），客户端指定的值不能超过服务器默认值。
+        批量生成按LLM并发分轮执行，默认值为每轮一个单图表的截止时间。
+        """
+        timeout = self.request_timeout
+        if batch_size:
+            timeout *= math.ceil(batch_size / self.pipeline.llm_concurrency)
+        if deadline_ms:
+            try:
+                return max(0.0, min(float(deadline_ms) / 1000, timeout))
+            except ValueError:
+                logger.warning(f"无效的X-MCP-Deadline-Ms: {deadline_ms}")
+        return timeout
     
     async def start(self, host="localhost", port=5000):
         """启动MCP服务器"""
@@ -163,23 +378,111 @@ class MermaidMCPServer:
         os.makedirs(static_dir, exist_ok=True)
         self.app.mount("/static", StaticFiles(directory=static_dir), name="static")
         
-        # 创建MCP API终结点
-        @self.app.post("/mcp")
-        async def handle_mcp_request(request: Dict[str, Any]):
-            try:
-                # 处理MCP请求
-                response = await self.mcp_server.handle_json_rpc(request)
-                return response
-            except Exception as e:
-                logger.error(f"处理MCP请求时出错: {str(e)}", exc_info=True)
-                return {"error": str(e)}
+        # 创建MCP API终结点（工作节点只从任务队列领取任务，不接收MCP请求）
+        if self.mode != "worker":
+            @self.app.post("/mcp")
+            async def handle_mcp_request(request: Request):
+                try:
+                    payload = await request.json()
+                except Exception:
+                    return JSONResponse(_json_rpc_error(None, -32700, "无法解析请求"), status_code=400)
+                request_id = payload.get("id") if isinstance(payload, dict) else None
+            
+                # 只有工具调用需要排队，列出工具等轻量请求直接处理
+                if not isinstance(payload, dict) or payload.get("method") != "tools/call":
+                    try:
+                        return await self.mcp_server.handle_json_rpc(payload)
+                    except Exception as e:
+                        logger.error(f"处理MCP请求时出错: {str(e)}", exc_info=True)
+                        return {"error": str(e)}
+            
+                priority = request.headers.get("x-mcp-priority", "normal").lower()
+                if priority not in PRIORITY_CLASSES:
+                    priority = "normal"
+                batch_size = _batch_size(payload)
+                deadline = time.monotonic() + self._request_timeout(
+                    request.headers.get("x-mcp-deadline-ms"), batch_size
+                )
+            
+                try:
+                    async with self.admission.admit(priority, timeout=deadline - time.monotonic()):
+                        if batch_size is not None:
+                            # 批量生成的截止时间在各图表上分别生效，不取消整个调用
+                            token = _batch_deadline.set(deadline)
+                            try:
+                                return await run_with_deadline(
+                                    self.mcp_server.handle_json_rpc(payload),
+                                    None,
+                                    is_disconnected=request.is_disconnected
+                                )
+                            finally:
+                                _batch_deadline.reset(token)
+                        # 超过截止时间或客户端断开连接时取消LLM调用和渲染
+                        return await run_with_deadline(
+                            self.mcp_server.handle_json_rpc(payload),
+                            deadline,
+                            is_disconnected=request.is_disconnected
+                        )
+                except OverloadedError as e:
+                    logger.warning(f"拒绝请求（优先级 {priority}）: {str(e)}")
+                    return JSONResponse(
+                        _json_rpc_error(request_id, -32000, str(e)),
+                        status_code=503,
+                        headers={"Retry-After": str(int(e.retry_after + 0.5))}
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("请求超过截止时间，已取消")
+                    return JSONResponse(_json_rpc_error(request_id, -32001, "请求超过截止时间"), status_code=504)
+                except asyncio.CancelledError:
+                    if not await request.is_disconnected():
+                        raise
+                    # 客户端已断开，响应不会被读取
+                    return JSONResponse(_json_rpc_error(request_id, -32002, "客户端已断开连接"), status_code=499)
+                except Exception as e:
+                    logger.error(f"处理MCP请求时出错: {str(e)}", exc_info=True)
+                    return {"error": str(e)}
         
-        logger.info(f"启动Mermaid-MCP服务器，监听 {host}:{port}")
+        logger.info(f"启动Mermaid-MCP服务器（{self.mode}模式），监听 {host}:{port}")
+        
+        # 启动渲染工作进程；单进程模式下在后台预热浏览器，不阻塞开始监听（API节点不渲染）
+        prewarm_task = None
+        if self.render_workers is not None:
+            await self.render_workers.start()
+        elif self.mode != "api" and os.getenv("BROWSER_PREWARM", "true").lower() in ("1", "true", "yes"):
+            prewarm_task = asyncio.ensure_future(self._prewarm())
+        
+        # 工作节点从任务队列领取任务
+        if self.mode == "worker":
+            self.job_worker = JobWorker(self.job_queue, self._run_job)
+            await self.job_worker.start()
         
         # 启动FastAPI
         config = uvicorn.Config(self.app, host=host, port=port)
         server = uvicorn.Server(config)
-        await server.serve()
+        startup = metrics.process_uptime()
+        metrics.STARTUP_DURATION.set(startup, phase="ready")
+        logger.info(f"服务器启动耗时 {startup:.2f}s（进程启动到开始监听）")
+        try:
+            await server.serve()
+        finally:
+            if prewarm_task is not None and not prewarm_task.done():
+                prewarm_task.cancel()
+            if self.job_worker is not None:
+                await self.job_worker.close()
+            if self.job_queue is not None:
+                await self.job_queue.close()
+            if self.render_workers is not None:
+                await self.render_workers.close()
+            await self.browser_pool.close()
+            await get_artifact_store().flush()
+        
+
+    async def _prewarm(self):
+        """后台启动Playwright驱动并预先启动一个浏览器"""
+        start = time.perf_counter()
+        if await self.browser_pool.prewarm():
+            metrics.STARTUP_DURATION.set(time.perf_counter() - start, phase="prewarm")
+            metrics.BROWSER_INSTANCES.set(self.browser_pool.alive_count)
         
 
 # 主函数
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图表会话存储模块，按会话ID保存最近一次的输入和生成的HTML，
+后续的修改请求可以让LLM只返回补丁，而不必重新生成整个图表。
+
+单进程部署时会话保存在内存中；多节点部署的工作节点把会话保存在任务队列后端中，
+同一会话的后续修改无论由哪个节点领取都能基于最新的图表。
+"""
+
+import os
+import time
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+from dotenv import load_dotenv
+
+from src.job_queue.base import JobQueue
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 加载环境变量
+load_dotenv()
+
+
+@dataclass
+class DiagramSession:
+    """一个图表会话的最新状态"""
+    input_text: str
+    # LLM生成的HTML（应用CSS样式之前）
+    html: str
+    chart_type: Optional[str] = None
+    css_template: Optional[str] = None
+    custom_css: Optional[str] = None
+    turns: int = 1
+    updated_at: float = field(default_factory=time.monotonic)
+
+
+class SessionStore:
+    """
+    内存中的图表会话存储，超过数量上限时淘汰最久未使用的会话，超过有效期的会话视为不存在。
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        Args:
+            max_sessions: 最多保存的会话数，默认读取SESSION_MAX_COUNT
+            ttl: 会话有效期（秒），默认读取SESSION_TTL，0表示不过期
+        """
+        if max_sessions is None:
+            max_sessions = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+        if ttl is None:
+            ttl = float(os.getenv("SESSION_TTL", "3600"))
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, DiagramSession]" = OrderedDict()
+        # 同一会话的修改请求依次执行，否则后一次修改可能基于过期的HTML
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def get(self, session_id: str) -> Optional[DiagramSession]:
+        """获取会话，不存在或已过期时返回None"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if self.ttl > 0 and time.monotonic() - session.updated_at > self.ttl:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def put(self, session_id: str, session: DiagramSession):
+        """保存会话的最新状态"""
+        session.updated_at = time.monotonic()
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def delete(self, session_id: str):
+        """删除会话"""
+        self._sessions.pop(session_id, None)
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """获取会话的锁，用于串行执行同一会话的请求"""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SharedSessionStore(SessionStore):
+    """
+    保存在任务队列后端中的会话，供多节点部署的所有工作节点共享。
+    只按有效期淘汰；同一会话的任务由任务队列保证不会在多个节点上同时执行。
+    """
+
+    def __init__(self, job_queue: JobQueue, ttl: Optional[float] = None):
+        """
+        Args:
+            job_queue: 保存会话的任务队列
+            ttl: 会话有效期（秒），默认读取SESSION_TTL，0表示不过期
+        """
+        super().__init__(ttl=ttl)
+        self.job_queue = job_queue
+
+    async def get(self, session_id: str) -> Optional[DiagramSession]:
+        state = await self.job_queue.load_session(session_id)
+        return DiagramSession(**state) if state is not None else None
+
+    async def put(self, session_id: str, session: DiagramSession):
+        state = asdict(session)
+        # 单调时钟的值在其他节点上没有意义
+        state.pop("updated_at", None)
+        await self.job_queue.save_session(session_id, state, self.ttl)
+
+    async def delete(self, session_id: str):
+        await self.job_queue.delete_session(session_id)
+
+
+# 全局会话存储实例
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """获取全局会话存储实例（首次调用时创建）"""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore()
+    return _session_store
+
+
+def use_shared_sessions(job_queue: JobQueue) -> SessionStore:
+    """工作节点启动时调用，之后的会话保存在任务队列后端中"""
+    global _session_store
+    _session_store = SharedSessionStore(job_queue)
+    return _session_store
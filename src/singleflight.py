@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+请求合并模块，让相同键的并发调用共享同一个正在执行的任务。
+"""
+
+import logging
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    相同键的并发调用只执行一次，所有调用方得到同一个结果。
+
+    - 任务完成（无论成功或失败）后立即移除，失败结果不会被缓存
+    - 某个调用方取消等待时，共享任务不会被取消，其他调用方照常获得结果
+    - 所有调用方都已取消（例如超过截止时间或客户端断开）时，共享任务随之取消
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行或加入键对应的任务。
+
+        Args:
+            key: 请求合并键
+            factory: 创建实际任务的协程工厂，仅在没有进行中的任务时调用
+
+        Returns:
+            (任务结果, 是否与其他调用共享)
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"合并进行中的请求: {key[:12]}")
+
+        # shield保证调用方取消时不会取消共享任务
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._waiters.get(task) == 1 and not task.done():
+                logger.info(f"所有调用方均已取消，取消共享任务: {key[:12]}")
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _on_done(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有调用方都已取消时，读取异常以避免"exception was never retrieved"警告
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def inflight(self) -> int:
+        """当前进行中的任务数"""
+        return len(self._inflight)
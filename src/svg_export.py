@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SVG导出模块。图表本身是内联SVG时（如本地Mermaid引擎生成的HTML），
+直接从HTML中取出SVG并连同页面样式输出为独立的SVG文件，不需要浏览器和光栅化。
+
+HTML可能来自LLM，导出时去掉脚本、事件处理属性和javascript:链接；
+清理后仍含有可执行内容的SVG不导出，改由浏览器截图。
+"""
+
+import re
+import html
+import logging
+import xml.etree.ElementTree as ET
+from html.entities import name2codepoint
+from typing import List, Optional, Tuple
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+_SVG_TAG_RE = re.compile(r'<(/?)svg\b[^>]*>', re.IGNORECASE)
+_STYLE_RE = re.compile(r'<style\b[^>]*>([\s\S]*?)</style>', re.IGNORECASE)
+_SCRIPT_RE = re.compile(r'<script\b[^>]*>[\s\S]*?</script>', re.IGNORECASE)
+_COMMENT_RE = re.compile(r'<!--[\s\S]*?-->')
+_HEAD_RE = re.compile(r'<head\b[^>]*>[\s\S]*?</head>', re.IGNORECASE)
+_BODY_RE = re.compile(r'<body\b[^>]*>([\s\S]*)</body>', re.IGNORECASE)
+_TITLE_DIV_RE = re.compile(
+    r'<div\b[^>]*class\s*=\s*["\'][^"\']*\bchart-title\b[^"\']*["\'][^>]*>([^<]*)</div>',
+    re.IGNORECASE
+)
+_TAG_RE = re.compile(r'<[^>]+>')
+# SVG之外出现这些元素时，图表不是纯SVG
+_VISUAL_TAG_RE = re.compile(r'<(img|canvas|svg|video|iframe|object|embed|hr|input|table)\b', re.IGNORECASE)
+_ATTR_RE = r'\b{}\s*=\s*["\']\s*([^"\']*)["\']'
+_LENGTH_RE = re.compile(r'^([\d.]+)(px)?$')
+_ENTITY_RE = re.compile(r'&([a-zA-Z][a-zA-Z0-9]*);')
+# 标签中的事件处理属性（onload等）和值为javascript:链接的属性
+_EVENT_ATTR_RE = re.compile(r'\s+on[\w.:-]*\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s>]+)', re.IGNORECASE)
+_SCRIPT_URL_ATTR_RE = re.compile(
+    r'\s+[\w.:-]+\s*=\s*(?:"\s*javascript:[^"]*"|\'\s*javascript:[^\']*\')', re.IGNORECASE
+)
+_CONTROL_CHARS_RE = re.compile(r'[\s\x00-\x1f]+')
+_XML_ENTITIES = ("amp", "lt", "gt", "quot", "apos")
+
+# 标题行高度（像素）
+_TITLE_HEIGHT = 36
+
+
+def html_to_svg(html_content: str) -> Optional[bytes]:
+    """
+    从HTML中取出图表的SVG，生成独立的SVG文件。
+
+    只有页面的可见内容是单个内联SVG（可带一个.chart-title标题）时才能导出；
+    页面中的<style>会放入SVG，外层SVG带有chart-container类，使模板中
+    ".chart-container svg ..."形式的规则仍然生效。
+
+    Args:
+        html_content: HTML内容
+
+    Returns:
+        UTF-8编码的SVG文件内容；图表不是纯SVG或无法生成合法的SVG时返回None
+    """
+    html_content = _COMMENT_RE.sub("", _SCRIPT_RE.sub("", html_content))
+    span = _find_svg(html_content)
+    if span is None:
+        return None
+    start, end = span
+    svg = html_content[start:end]
+    size = _svg_size(svg)
+    if size is None:
+        return None
+
+    # SVG之外只允许有样式和一个标题
+    rest = html_content[:start] + html_content[end:]
+    styles = [css for css in _STYLE_RE.findall(rest) if css.strip()]
+    rest = _STYLE_RE.sub("", rest)
+    body = _BODY_RE.search(rest)
+    rest = body.group(1) if body else _HEAD_RE.sub("", rest)
+    title = None
+    match = _TITLE_DIV_RE.search(rest)
+    if match:
+        title = html.unescape(match.group(1)).strip() or None
+        rest = rest[:match.start()] + rest[match.end():]
+    if _VISUAL_TAG_RE.search(rest) or html.unescape(_TAG_RE.sub("", rest)).strip():
+        return None
+
+    document = _compose(_strip_event_handlers(svg), size, styles, title)
+    try:
+        root = ET.fromstring(document)
+    except ET.ParseError as e:
+        logger.info(f"图表SVG不是合法的XML，改用浏览器渲染: {str(e)}")
+        return None
+    if _has_active_content(root):
+        logger.info("图表SVG中含有脚本或事件处理属性，改用浏览器渲染")
+        return None
+    return document.encode("utf-8")
+
+
+def _strip_event_handlers(svg: str) -> str:
+    """去掉各标签中的事件处理属性和javascript:链接"""
+    def clean(match):
+        return _SCRIPT_URL_ATTR_RE.sub("", _EVENT_ATTR_RE.sub("", match.group(0)))
+    return _TAG_RE.sub(clean, svg)
+
+
+def _local_name(name: str) -> str:
+    return name.rsplit("}", 1)[-1].lower()
+
+
+def _has_active_content(root: ET.Element) -> bool:
+    """在解析后的文档上再检查一次（实体编码等形式可以绕过正则清理）"""
+    for element in root.iter():
+        if _local_name(element.tag) == "script":
+            return True
+        for name, value in element.attrib.items():
+            if _local_name(name).startswith("on"):
+                return True
+            if "javascript:" in _CONTROL_CHARS_RE.sub("", value).lower():
+                return True
+    return False
+
+
+def _find_svg(text: str) -> Optional[Tuple[int, int]]:
+    """找到第一个顶层<svg>元素的起止位置（包含嵌套的svg）"""
+    depth = 0
+    start = None
+    for match in _SVG_TAG_RE.finditer(text):
+        closing = match.group(1) == "/"
+        self_closing = match.group(0).endswith("/>")
+        if not closing:
+            if depth == 0:
+                start = match.start()
+                if self_closing:
+                    return None
+            if not self_closing:
+                depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                return start, match.end()
+    return None
+
+
+def _svg_attr(start_tag: str, name: str) -> Optional[str]:
+    match = re.search(_ATTR_RE.format(name), start_tag, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def _svg_size(svg: str) -> Optional[Tuple[float, float]]:
+    """从width/height属性或viewBox取得SVG的尺寸"""
+    start_tag = svg[:svg.index(">") + 1]
+    width = _LENGTH_RE.match(_svg_attr(start_tag, "width") or "")
+    height = _LENGTH_RE.match(_svg_attr(start_tag, "height") or "")
+    if width and height:
+        return float(width.group(1)), float(height.group(1))
+    view_box = (_svg_attr(start_tag, "viewBox") or "").replace(",", " ").split()
+    if len(view_box) == 4:
+        try:
+            return float(view_box[2]), float(view_box[3])
+        except ValueError:
+            return None
+    return None
+
+
+def _xml_entities(text: str) -> str:
+    """把XML不认识的HTML命名实体（如&nbsp;）换成数字形式"""
+    def replace(match):
+        name = match.group(1)
+        if name in _XML_ENTITIES or name not in name2codepoint:
+            return match.group(0)
+        return f"&#{name2codepoint[name]};"
+    return _ENTITY_RE.sub(replace, text)
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _compose(svg: str, size: Tuple[float, float], styles: List[str], title: Optional[str]) -> str:
+    width, height = size
+    offset = _TITLE_HEIGHT if title else 0
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'class="chart-container" width="{_fmt(width)}" height="{_fmt(height + offset)}" '
+        f'viewBox="0 0 {_fmt(width)} {_fmt(height + offset)}">'
+    ]
+    if styles:
+        css = "\n".join(styles).replace("]]>", "]]&gt;")
+        parts.append(f"<style><![CDATA[\n{css}\n]]></style>")
+    if title:
+        parts.append(
+            f'<text class="chart-title" x="{_fmt(width / 2)}" y="{_fmt(_TITLE_HEIGHT / 2)}" '
+            f'text-anchor="middle" dominant-baseline="middle" font-size="18" font-weight="bold">'
+            f"{html.escape(title, quote=False)}</text>"
+        )
+        # 图表整体下移，给标题留出位置
+        svg = re.sub(r'^<svg\b', f'<svg y="{offset}"', svg, count=1, flags=re.IGNORECASE)
+    parts.append(_xml_entities(svg))
+    parts.append("</svg>\n")
+    return "\n".join(parts)
@@ -6,12 +6,26 @@ from .index import (
     detect_chart_type,
     extract_css_template_name,
     extract_custom_css,
-    get_available_templates
+    get_available_templates,
+    load_template_css,
+    normalize_input
 )
+from .templates import get_template_registry, inject_style, minify_css
+from .classifier import classify_input, InputClassification
+from .patch import PatchError, apply_patch
 
 __all__ = [
+    'InputClassification',
+    'PatchError',
+    'apply_patch',
+    'classify_input',
     'detect_chart_type',
     'extract_css_template_name',
     'extract_custom_css',
-    'get_available_templates'
+    'get_available_templates',
+    'get_template_registry',
+    'inject_style',
+    'load_template_css',
+    'minify_css',
+    'normalize_input'
 ] 
\ No newline at end of file
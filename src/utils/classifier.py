@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+输入分类模块：一次扫描同时得到图表类型、CSS模板名称和自定义CSS。
+
+所有规则的固定前缀（图表类型关键词、Mermaid起始声明、模板指令、CSS代码块标记）
+预先编译为一个字典树形状的正则表达式，相当于Aho-Corasick关键词自动机：
+对小写化后的输入扫描一次即可找到所有候选位置，
+再用预编译的锚定正则在原文的候选位置上校验完整规则。
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Mermaid起始声明，按优先级排列：(前缀, 图表类型, 校验表达式)
+_HEADERS = [
+    ("graph", "flowchart", re.compile(r'graph\s+(TD|TB|BT|RL|LR)')),
+    ("sequencediagram", "sequence", re.compile(r'sequenceDiagram')),
+    ("classdiagram", "class", re.compile(r'classDiagram')),
+    ("statediagram", "state", re.compile(r'stateDiagram')),
+    ("erdiagram", "er", re.compile(r'erDiagram')),
+    ("gantt", "gantt", re.compile(r'gantt')),
+    ("pie", "pie", re.compile(r'pie')),
+]
+
+# 图表类型关键词（同分时按此顺序取第一个）
+CHART_KEYWORDS: Dict[str, List[str]] = {
+    "flowchart": ["流程图", "流程", "步骤", "process", "flow", "flowchart"],
+    "sequence": ["时序图", "序列图", "顺序图", "sequence", "时间顺序"],
+    "class": ["类图", "class diagram", "类关系", "继承", "实现"],
+    "state": ["状态图", "状态", "state diagram", "状态转换"],
+    "er": ["实体关系图", "entity relationship", "ER图", "数据库"],
+    "gantt": ["甘特图", "进度图", "项目计划", "gantt", "timeline"],
+    "pie": ["饼图", "比例", "占比", "pie chart", "百分比"],
+}
+
+# 模板名称及其同义词
+TEMPLATE_ALIASES: Dict[str, List[str]] = {
+    "default": ["默认", "default", "standard", "normal"],
+    "dark": ["暗色", "dark", "black", "night", "深色"],
+    "light": ["亮色", "light", "white", "day", "浅色"],
+    "business": ["商务", "business", "professional", "corporate", "企业"],
+    "colorful": ["彩色", "colorful", "vibrant", "vivid", "多彩"],
+    "minimal": ["简约", "minimal", "simple", "clean", "minimalist"],
+}
+_ALIAS_TO_TEMPLATE = {
+    alias.lower(): name for name, aliases in TEMPLATE_ALIASES.items() for alias in aliases
+}
+
+# 模板指令，按优先级排列：(前缀, 校验表达式)。
+# "xxx模板/样式/风格"的匹配起点在触发字之前，单独处理（见_match_suffix_directive）
+_TEMPLATE_DIRECTIVES = [
+    ("使用", re.compile(r'使用["\']?(\w+)["\']?模板', re.IGNORECASE)),
+    (None, re.compile(r'["\']?(\w+)["\']?[模板样式风格]', re.IGNORECASE)),
+    ("template", re.compile(r'template[:\s]+["\']?(\w+)["\']?', re.IGNORECASE)),
+    ("css", re.compile(r'css[:\s]+["\']?(\w+)["\']?', re.IGNORECASE)),
+    ("style", re.compile(r'style[:\s]+["\']?(\w+)["\']?', re.IGNORECASE)),
+]
+_SUFFIX_RANK = 1
+_SUFFIX_TRIGGERS = "模板样式风格"
+_WORD_CHAR_RE = re.compile(r'\w')
+
+# 自定义CSS代码块，按优先级排列：(前缀, 校验表达式)
+_CSS_BLOCKS = [
+    ("```css", re.compile(r'```css\s*([\s\S]*?)\s*```')),
+    ("<style>", re.compile(r'<style>\s*([\s\S]*?)\s*</style>')),
+]
+
+# 自动机中每个前缀对应的动作
+_KEYWORD, _HEADER, _DIRECTIVE, _CSS_BLOCK, _TRIGGER = range(5)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    把前缀集合编译为字典树形状的正则表达式。
+    分支按字典树展开，较长的前缀优先，因此在每个位置得到最长匹配。
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def emit(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if terminal else body
+
+    return emit(trie)
+
+
+def _build_automaton():
+    """
+    编译自动机，返回(正则, 每个前缀对应的动作列表)。
+    自动机在每个位置只报告最长匹配，因此动作列表还包含作为该前缀开头的较短条目。
+    """
+    actions: Dict[str, List[Tuple[int, object]]] = {}
+
+    def add(token: str, action: Tuple[int, object]):
+        actions.setdefault(token, []).append(action)
+
+    for words in CHART_KEYWORDS.values():
+        for word in words:
+            add(word.lower(), (_KEYWORD, word.lower()))
+    for rank, (token, _, _) in enumerate(_HEADERS):
+        add(token, (_HEADER, rank))
+    for rank, (token, _) in enumerate(_TEMPLATE_DIRECTIVES):
+        if token is not None:
+            add(token, (_DIRECTIVE, rank))
+    for rank, (token, _) in enumerate(_CSS_BLOCKS):
+        add(token, (_CSS_BLOCK, rank))
+    for char in _SUFFIX_TRIGGERS:
+        add(char, (_TRIGGER, None))
+
+    expanded = {
+        token: [action for other in actions if token.startswith(other) for action in actions[other]]
+        for token in actions
+    }
+    return re.compile(_trie_pattern(actions)), expanded
+
+
+_AUTOMATON, _TOKEN_ACTIONS = _build_automaton()
+_KEYWORD_TYPES = [
+    (chart_type, [word.lower() for word in words]) for chart_type, words in CHART_KEYWORDS.items()
+]
+
+
+@dataclass
+class InputClassification:
+    """输入分类结果"""
+    chart_type: Optional[str] = None
+    css_template: Optional[str] = None
+    custom_css: Optional[str] = None
+
+
+def classify_input(input_text: str) -> InputClassification:
+    """
+    一次扫描输入，同时检测图表类型、CSS模板名称和自定义CSS。
+
+    - 图表类型：优先按Mermaid起始声明判断，否则取命中关键词种类最多的类型
+    - 模板名称：按指令优先级取第一个，别名映射为标准模板名
+    - 自定义CSS：优先取```css代码块，其次取<style>块
+
+    Args:
+        input_text: 用户输入文本
+
+    Returns:
+        InputClassification
+    """
+    lowered = input_text.lower()
+    if len(lowered) != len(input_text):
+        # 少数字符小写后长度会变化，位置无法与原文对应，这些字符保持原样
+        lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in input_text)
+
+    header_rank: Optional[int] = None
+    template_rank: Optional[int] = None
+    template_name: Optional[str] = None
+    css_blocks: List[Optional[str]] = [None] * len(_CSS_BLOCKS)
+    css_exhausted = [False] * len(_CSS_BLOCKS)
+    trigger_pos: Optional[int] = None
+    found_keywords: Set[str] = set()
+
+    search = _AUTOMATON.search
+    pos = 0
+    while True:
+        match = search(lowered, pos)
+        if match is None:
+            break
+        start = match.start()
+        # 从下一个字符继续扫描，以找到相互重叠的前缀
+        pos = start + 1
+        for kind, value in _TOKEN_ACTIONS[match.group()]:
+            if kind == _KEYWORD:
+                found_keywords.add(value)
+            elif kind == _HEADER:
+                if (header_rank is None or value < header_rank) and _at_line_start(input_text, start) \
+                        and _HEADERS[value][2].match(input_text, start):
+                    header_rank = value
+            elif kind == _DIRECTIVE:
+                if template_rank is None or value < template_rank:
+                    directive = _TEMPLATE_DIRECTIVES[value][1].match(input_text, start)
+                    if directive:
+                        template_rank, template_name = value, directive.group(1)
+            elif kind == _CSS_BLOCK:
+                if css_blocks[value] is None and not css_exhausted[value]:
+                    block = _CSS_BLOCKS[value][1].match(input_text, start)
+                    if block:
+                        css_blocks[value] = block.group(1)
+                    else:
+                        # 之后已没有结束标记，后续的同类起始标记也不可能匹配
+                        css_exhausted[value] = True
+            elif trigger_pos is None:
+                trigger_pos = start
+
+    # "xxx模板"类指令优先级高于template:/css:/style:，需要时才在第一个触发字附近匹配
+    if trigger_pos is not None and (template_rank is None or template_rank > _SUFFIX_RANK):
+        suffix_name = _match_suffix_directive(input_text, trigger_pos)
+        if suffix_name is not None:
+            template_rank, template_name = _SUFFIX_RANK, suffix_name
+
+    result = InputClassification()
+    if header_rank is not None:
+        result.chart_type = _HEADERS[header_rank][1]
+    elif found_keywords:
+        result.chart_type = _best_keyword_type(found_keywords)
+
+    if template_name is not None:
+        template_name = template_name.lower()
+        result.css_template = _ALIAS_TO_TEMPLATE.get(template_name, template_name)
+
+    for block in css_blocks:
+        if block is not None:
+            result.custom_css = block.strip()
+            break
+    return result
+
+
+def _at_line_start(input_text: str, pos: int) -> bool:
+    """等价于多行模式下的^\\s*：pos与之前某个行首之间只有空白"""
+    index = pos
+    while index > 0:
+        char = input_text[index - 1]
+        if char == "\n":
+            return True
+        if not char.isspace():
+            return False
+        index -= 1
+    return True
+
+
+def _match_suffix_directive(input_text: str, trigger_pos: int) -> Optional[str]:
+    """
+    匹配"xxx模板/样式/风格"。匹配只可能从第一个触发字所在（或紧挨在引号前）的单词开始，
+    因此从该单词开头（含可能的引号）向后搜索即可，不必重新扫描整个输入。
+    """
+    start = trigger_pos
+    if start > 0 and input_text[start - 1] in "\"'":
+        start -= 1
+    while start > 0 and _WORD_CHAR_RE.match(input_text[start - 1]):
+        start -= 1
+    match = _TEMPLATE_DIRECTIVES[_SUFFIX_RANK][1].search(input_text, max(0, start - 1))
+    return match.group(1) if match else None
+
+
+def _best_keyword_type(found_keywords: Set[str]) -> Optional[str]:
+    """统计各类型命中的关键词种类数，同分时取先定义的类型"""
+    best_type = None
+    best_score = 0
+    for chart_type, words in _KEYWORD_TYPES:
+        score = sum(1 for word in words if word in found_keywords)
+        if score > best_score:
+            best_type, best_score = chart_type, score
+    return best_type
@@ -10,6 +10,9 @@ import logging
 import re
 from typing import Optional, Dict, Any, List, Tuple
 
+from .templates import get_template_registry
+from .classifier import classify_input
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -21,60 +24,15 @@ def detect_chart_type(input_text: str) -> Optional[str]:
     """
     尝试从用户输入中检测图表类型。
     
+    需要同时获取模板和自定义CSS时请直接使用classify_input，只扫描一次输入。
+    
     Args:
         input_text: 用户输入文本
         
     Returns:
         检测到的图表类型，如果无法检测则为None
     """
-    # 检查是否是Mermaid代码
-    if re.search(r'^\s*graph\s+(TD|TB|BT|RL|LR)', input_text, re.MULTILINE):
-        return "flowchart"
-    elif re.search(r'^\s*sequenceDiagram', input_text, re.MULTILINE):
-        return "sequence"
-    elif re.search(r'^\s*classDiagram', input_text, re.MULTILINE):
-        return "class"
-    elif re.search(r'^\s*stateDiagram', input_text, re.MULTILINE):
-        return "state"
-    elif re.search(r'^\s*erDiagram', input_text, re.MULTILINE):
-        return "er"
-    elif re.search(r'^\s*gantt', input_text, re.MULTILINE):
-        return "gantt"
-    elif re.search(r'^\s*pie', input_text, re.MULTILINE):
-        return "pie"
-    
-    # 检查文本中的关键词
-    keywords = {
-        "flowchart": ["流程图", "流程", "步骤", "process", "flow", "flowchart"],
-        "sequence": ["时序图", "序列图", "顺序图", "sequence", "时间顺序"],
-        "class": ["类图", "class diagram", "类关系", "继承", "实现"],
-        "state": ["状态图", "状态", "state diagram", "状态转换"],
-        "er": ["实体关系图", "entity relationship", "ER图", "数据库"],
-        "gantt": ["甘特图", "进度图", "项目计划", "gantt", "timeline"],
-        "pie": ["饼图", "比例", "占比", "pie chart", "百分比"],
-    }
-    
-    # 统计各类型关键词出现次数
-    scores = {chart_type: 0 for chart_type in keywords}
-    for chart_type, words in keywords.items():
-        for word in words:
-            if word.lower() in input_text.lower():
-                scores[chart_type] += 1
-    
-    # 找出得分最高的类型
-    if not scores:
-        return None
-    
-    max_score = max(scores.values())
-    if max_score == 0:
-        return None
-    
-    # 返回得分最高的类型
-    for chart_type, score in scores.items():
-        if score == max_score:
-            return chart_type
-    
-    return None
+    return classify_input(input_text).chart_type
 
 def extract_css_template_name(input_text: str) -> Optional[str]:
     """
@@ -86,40 +44,7 @@ def extract_css_template_name(input_text: str) -> Optional[str]:
     Returns:
         CSS模板名称，如果未找到则为None
     """
-    # 定义可能的模板名称及其同义词
-    template_aliases = {
-        "default": ["默认", "default", "standard", "normal"],
-        "dark": ["暗色", "dark", "black", "night", "深色"],
-        "light": ["亮色", "light", "white", "day", "浅色"],
-        "business": ["商务", "business", "professional", "corporate", "企业"],
-        "colorful": ["彩色", "colorful", "vibrant", "vivid", "多彩"],
-        "minimal": ["简约", "minimal", "simple", "clean", "minimalist"],
-    }
-    
-    # 正则匹配模板名称
-    patterns = [
-        r'使用["\']?(\w+)["\']?模板',  # 使用"xxx"模板
-        r'["\']?(\w+)["\']?[模板样式风格]',  # "xxx"模板/样式/风格
-        r'template[:\s]+["\']?(\w+)["\']?',  # template: "xxx"
-        r'css[:\s]+["\']?(\w+)["\']?',  # css: "xxx"
-        r'style[:\s]+["\']?(\w+)["\']?',  # style: "xxx"
-    ]
-    
-    # 尝试匹配模板名称
-    for pattern in patterns:
-        match = re.search(pattern, input_text, re.IGNORECASE)
-        if match:
-            template_name = match.group(1).lower()
-            
-            # 检查是否匹配标准模板名称或别名
-            for name, aliases in template_aliases.items():
-                if template_name in aliases:
-                    return name
-            
-            # 如果没有匹配到别名，但匹配到了名称，直接返回
-            return template_name
-    
-    return None
+    return classify_input(input_text).css_template
 
 def extract_custom_css(input_text: str) -> Optional[str]:
     """
@@ -131,18 +56,19 @@ def extract_custom_css(input_text: str) -> Optional[str]:
     Returns:
         自定义CSS字符串，如果未找到则为None
     """
-    # 查找CSS代码块
-    css_patterns = [
-        r'```css\s*([\s\S]*?)\s*```',  # ```css ... ```
-        r'<style>\s*([\s\S]*?)\s*</style>',  # <style> ... </style>
-    ]
-    
-    for pattern in css_patterns:
-        match = re.search(pattern, input_text, re.MULTILINE)
-        if match:
-            return match.group(1).strip()
+    return classify_input(input_text).custom_css
+
+def load_template_css(template_name: str) -> Optional[str]:
+    """
+    读取CSS模板内容（压缩后的内存副本）。
     
-    return None
+    Args:
+        template_name: 模板名称（不含扩展名）
+        
+    Returns:
+        CSS内容，模板不存在时为None
+    """
+    return get_template_registry().get(template_name)
 
 def get_available_templates() -> List[str]:
     """
@@ -151,9 +77,98 @@ def get_available_templates() -> List[str]:
     Returns:
         模板名称列表
     """
-    templates_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
-    if not os.path.exists(templates_dir):
-        return []
+    return get_template_registry().names()
+
+# Mermaid代码的起始声明（只在第一条语句上匹配）
+_MERMAID_HEADER_RE = re.compile(
+    r'\s*(graph\s+(TD|TB|BT|RL|LR)|flowchart|sequenceDiagram|classDiagram|stateDiagram|erDiagram|gantt|pie)\b'
+)
+
+# 声明之前可以出现的代码块起始标记
+_OPEN_FENCE_RE = re.compile(r'^\s*```\s*(mermaid)?\s*$', re.IGNORECASE)
+
+# 流程图中的样式语句，连续出现且作用于不同对象时与顺序无关，可以排序
+_ORDER_FREE_STATEMENT_RE = re.compile(r'^(classDef|style|class|linkStyle)\s')
+
+def _mermaid_header(text: str) -> Optional[re.Match]:
+    """第一个非空、非%%注释、非代码块起始标记的行是Mermaid声明时返回匹配结果"""
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("%%") or _OPEN_FENCE_RE.match(line):
+            continue
+        return _MERMAID_HEADER_RE.match(line)
+    return None
+
+def normalize_input(input_text: str) -> str:
+    """
+    规范化用户输入，使仅有格式差异的输入得到相同结果。只用于缓存键和比较，
+    发给LLM的仍是原始输入。
+    
+    - 统一换行符，去除行尾空白、合并行内连续空白、删除空行
+    - 对Mermaid代码（第一条语句为图表声明）：删除 %% 注释（保留 %%{...}%% 指令），去除缩进，
+      并对流程图中连续的 classDef/style/class/linkStyle 语句排序
+    - 对普通文本：保留行首缩进（结构化文本依赖缩进表达层级）
     
-    templates = [f.split('.')[0] for f in os.listdir(templates_dir) if f.endswith('.css')]
-    return templates 
\ No newline at end of file
+    Args:
+        input_text: 用户输入文本
+        
+    Returns:
+        规范化后的文本
+    """
+    text = input_text.replace("\r\n", "\n").replace("\r", "\n")
+    header = _mermaid_header(text)
+    is_mermaid = header is not None
+    is_flowchart = is_mermaid and header.group(1).startswith(("graph", "flowchart"))
+    
+    lines = []
+    for raw_line in text.split("\n"):
+        line = raw_line.rstrip()
+        if not line.strip():
+            continue
+        if is_mermaid:
+            stripped = line.strip()
+            if stripped.startswith("%%") and not stripped.startswith("%%{"):
+                continue
+            lines.append(" ".join(stripped.split()))
+        else:
+            indent = line[:len(line) - len(line.lstrip())].replace("\t", "    ")
+            lines.append(indent + " ".join(line.split()))
+    
+    if is_flowchart:
+        lines = _sort_order_free_runs(lines)
+    
+    return "\n".join(lines)
+
+def _statement_targets(line: str) -> List[Tuple[str, str]]:
+    """样式语句作用的对象：(语句类型, 节点ID/类名/连线序号)"""
+    parts = line.split(None, 2)
+    kind = parts[0]
+    if len(parts) < 2:
+        return [(kind, "")]
+    return [(kind, target) for target in parts[1].split(",")]
+
+def _sort_run(run: List[str]) -> List[str]:
+    """
+    对一段连续的样式语句排序。同一对象的后一条语句会覆盖前一条，
+    只有各语句作用于互不相同的对象时顺序才无关，否则保持原顺序。
+    """
+    targets = [target for line in run for target in _statement_targets(line)]
+    if len(targets) != len(set(targets)):
+        return run
+    return sorted(run)
+
+def _sort_order_free_runs(lines: List[str]) -> List[str]:
+    """对连续出现的与顺序无关的样式语句排序"""
+    result = []
+    run = []
+    for line in lines:
+        if _ORDER_FREE_STATEMENT_RE.match(line):
+            run.append(line)
+            continue
+        if run:
+            result.extend(_sort_run(run))
+            run = []
+        result.append(line)
+    if run:
+        result.extend(_sort_run(run))
+    return result
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+HTML补丁工具：解析LLM返回的SEARCH/REPLACE块并应用到已有的HTML上。
+
+补丁格式：
+    <<<<<<< SEARCH
+    （原HTML中的一段连续内容）
+    =======
+    （替换后的内容）
+    >>>>>>> REPLACE
+"""
+
+import re
+from typing import List, Tuple
+
+_BLOCK_RE = re.compile(
+    r'^<{7} ?SEARCH[^\n]*\n(.*?)^={7}[^\n]*\n(.*?)^>{7} ?REPLACE[^\n]*$',
+    re.DOTALL | re.MULTILINE
+)
+
+
+class PatchError(ValueError):
+    """补丁无法解析或无法唯一地应用"""
+
+
+def parse_patch(patch: str) -> List[Tuple[str, str]]:
+    """
+    解析补丁中的所有SEARCH/REPLACE块。
+
+    Args:
+        patch: LLM返回的补丁文本
+
+    Returns:
+        [(查找内容, 替换内容)]
+    """
+    blocks = []
+    for search, replace in _BLOCK_RE.findall(patch.replace("\r\n", "\n")):
+        blocks.append((_strip_newline(search), _strip_newline(replace)))
+    if not blocks:
+        raise PatchError("响应中没有SEARCH/REPLACE块")
+    return blocks
+
+
+def apply_patch(html: str, patch: str) -> str:
+    """
+    将补丁应用到HTML，所有块都必须能唯一定位，否则整体失败。
+
+    查找内容先按原文精确匹配，找不到时忽略每行首尾空白再匹配一次（LLM常改变缩进）。
+
+    Args:
+        html: 原HTML
+        patch: LLM返回的补丁文本
+
+    Returns:
+        应用补丁后的HTML
+    """
+    for search, replace in parse_patch(patch):
+        if not search.strip():
+            raise PatchError("SEARCH块为空")
+        count = html.count(search)
+        if count == 1:
+            html = html.replace(search, replace, 1)
+        elif count > 1:
+            raise PatchError(f"SEARCH块在HTML中出现了{count}次: {search[:60]!r}")
+        else:
+            html = _replace_lines_loose(html, search, replace)
+    return html
+
+
+def _strip_newline(text: str) -> str:
+    return text[:-1] if text.endswith("\n") else text
+
+
+def _replace_lines_loose(html: str, search: str, replace: str) -> str:
+    """忽略每行首尾空白，按整行匹配并替换"""
+    lines = html.split("\n")
+    stripped = [line.strip() for line in lines]
+    target = [line.strip() for line in search.split("\n")]
+    # 去掉查找内容首尾的空行
+    while target and not target[0]:
+        target.pop(0)
+    while target and not target[-1]:
+        target.pop()
+
+    size = len(target)
+    matches = [
+        i for i in range(len(lines) - size + 1)
+        if stripped[i] == target[0] and stripped[i:i + size] == target
+    ]
+    if not matches:
+        raise PatchError(f"SEARCH块在HTML中不存在: {search[:60]!r}")
+    if len(matches) > 1:
+        raise PatchError(f"SEARCH块在HTML中出现了{len(matches)}次: {search[:60]!r}")
+    start = matches[0]
+    return "\n".join(lines[:start] + replace.split("\n") + lines[start + size:])
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+CSS模板注册表，启动时把模板读入内存并预先压缩，按文件修改时间失效重载。
+同时提供按HTML裁剪未使用规则和单次扫描注入<style>的工具函数。
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 默认模板目录
+DEFAULT_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+_COMMENT_RE = re.compile(r'/\*[\s\S]*?\*/')
+_WHITESPACE_RE = re.compile(r'\s+')
+_PUNCT_SPACE_RE = re.compile(r'\s*([{};,>])\s*')
+_COLON_SPACE_RE = re.compile(r':\s+')
+
+# 选择器中的类名、ID和元素名
+_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_ID_RE = re.compile(r'#(-?[_a-zA-Z][\w-]*)')
+_TYPE_RE = re.compile(r'(?:^|[\s>+~(])([a-zA-Z][\w-]*)')
+_PSEUDO_RE = re.compile(r'::?[\w-]+(\([^)]*\))?|\[[^\]]*\]')
+
+# HTML中出现的标签、class和id
+_HTML_TAG_RE = re.compile(r'<([a-zA-Z][\w-]*)')
+_HTML_CLASS_RE = re.compile(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+_HTML_ID_RE = re.compile(r'\bid\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+
+# 注入位置：第一个<head ...>，没有时为<html ...>
+_INJECT_RE = re.compile(r'<(head|html)\b[^>]*>', re.IGNORECASE)
+
+
+def minify_css(css: str) -> str:
+    """
+    压缩CSS：去掉注释和多余空白。
+
+    选择器中冒号前的空白有语义（如"a :hover"），因此只去掉冒号后的空白。
+    """
+    css = _COMMENT_RE.sub('', css)
+    css = _WHITESPACE_RE.sub(' ', css)
+    css = _PUNCT_SPACE_RE.sub(r'\1', css)
+    css = _COLON_SPACE_RE.sub(':', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+@dataclass
+class CssRule:
+    """顶层CSS规则；at规则（@media、@keyframes等）整体保留，不参与裁剪"""
+    text: str
+    selectors: List[Tuple[Set[str], Set[str], Set[str]]] = field(default_factory=list)  # (类名, ID, 元素名)
+    is_at_rule: bool = False
+
+
+def parse_css_rules(css: str) -> List[CssRule]:
+    """把压缩后的CSS拆分为顶层规则"""
+    rules: List[CssRule] = []
+    depth = 0
+    start = 0
+    for index, char in enumerate(css):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append(_make_rule(css[start:index + 1]))
+                start = index + 1
+        elif char == ';' and depth == 0:
+            # @import、@charset等没有块的at规则
+            rules.append(CssRule(css[start:index + 1], is_at_rule=True))
+            start = index + 1
+    if css[start:].strip():
+        rules.append(CssRule(css[start:], is_at_rule=True))
+    return rules
+
+
+def _make_rule(text: str) -> CssRule:
+    prelude = text[:text.index('{')].strip()
+    if prelude.startswith('@'):
+        return CssRule(text, is_at_rule=True)
+    selectors = []
+    for selector in prelude.split(','):
+        selector = _PSEUDO_RE.sub('', selector)
+        selectors.append((
+            set(_CLASS_RE.findall(selector)),
+            set(_ID_RE.findall(selector)),
+            {tag.lower() for tag in _TYPE_RE.findall(selector)},
+        ))
+    return CssRule(text, selectors)
+
+
+def collect_html_tokens(html: str) -> Tuple[Set[str], Set[str], Set[str]]:
+    """收集HTML中出现的类名、ID和元素名"""
+    classes: Set[str] = set()
+    for double, single in _HTML_CLASS_RE.findall(html):
+        classes.update((double or single).split())
+    ids = {(double or single).strip() for double, single in _HTML_ID_RE.findall(html)}
+    tags = {tag.lower() for tag in _HTML_TAG_RE.findall(html)}
+    return classes, ids, tags
+
+
+def prune_css(rules: List[CssRule], html: str) -> str:
+    """
+    去掉选择器在HTML中不可能匹配的规则。
+
+    只要某个选择器用到的类名、ID和元素名都出现在HTML中就保留该规则，
+    判断偏保守：可能匹配的规则一律保留。
+    """
+    classes, ids, tags = collect_html_tokens(html)
+    kept = []
+    for rule in rules:
+        if rule.is_at_rule or any(
+            rule_classes <= classes and rule_ids <= ids and rule_tags <= tags
+            for rule_classes, rule_ids, rule_tags in rule.selectors
+        ):
+            kept.append(rule.text)
+    return ''.join(kept)
+
+
+def inject_style(html: str, css: str) -> str:
+    """
+    单次扫描把<style>块注入HTML。
+
+    优先放在第一个<head ...>之后；没有<head>时在<html ...>之后补一个<head>；
+    两者都没有时放在最前面。标签名大小写不敏感，允许带属性。
+    """
+    style = f"<style>\n{css}\n</style>"
+    html_match = None
+    for match in _INJECT_RE.finditer(html):
+        if match.group(1).lower() == 'head':
+            return f"{html[:match.end()]}\n{style}{html[match.end():]}"
+        if html_match is None:
+            html_match = match
+    if html_match is not None:
+        return f"{html[:html_match.end()]}\n<head>\n{style}\n</head>{html[html_match.end():]}"
+    return f"{style}\n{html}"
+
+
+@dataclass
+class _TemplateEntry:
+    css: str
+    rules: List[CssRule]
+    mtime: float
+
+
+class TemplateRegistry:
+    """
+    内存中的CSS模板注册表。
+
+    模板在首次使用（或调用load）时读入并压缩；此后最多每隔check_interval秒
+    检查一次文件修改时间，文件变化时才重新读取。
+    """
+
+    def __init__(self, templates_dir: Optional[str] = None, check_interval: Optional[float] = None):
+        """
+        Args:
+            templates_dir: 模板目录，默认为src/templates
+            check_interval: 检查文件修改时间的最小间隔秒数，默认读取CSS_TEMPLATE_CHECK_INTERVAL
+        """
+        self.templates_dir = templates_dir or DEFAULT_TEMPLATES_DIR
+        self.check_interval = check_interval if check_interval is not None else float(
+            os.getenv("CSS_TEMPLATE_CHECK_INTERVAL", "2"))
+        self._entries: Dict[str, _TemplateEntry] = {}
+        self._dir_mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """读取并压缩目录中的全部模板"""
+        with self._lock:
+            self._refresh(force=True)
+
+    def names(self) -> List[str]:
+        """返回可用模板名称"""
+        with self._lock:
+            self._refresh()
+            return sorted(self._entries)
+
+    def get(self, name: str) -> Optional[str]:
+        """返回压缩后的模板CSS，模板不存在时为None"""
+        entry = self._get_entry(name)
+        return entry.css if entry is not None else None
+
+    def get_for_html(self, name: str, html: str, prune: bool = False) -> Optional[str]:
+        """
+        返回用于指定HTML的模板CSS。
+
+        Args:
+            name: 模板名称
+            html: 将要注入的HTML
+            prune: 是否去掉HTML中用不到的规则
+        """
+        entry = self._get_entry(name)
+        if entry is None:
+            return None
+        return prune_css(entry.rules, html) if prune else entry.css
+
+    def _get_entry(self, name: str) -> Optional[_TemplateEntry]:
+        with self._lock:
+            self._refresh()
+            return self._entries.get(name)
+
+    def _refresh(self, force: bool = False):
+        """按修改时间重新加载变化的模板（调用方需持有锁）"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            dir_mtime = os.stat(self.templates_dir).st_mtime
+            files = [f for f in os.listdir(self.templates_dir) if f.endswith('.css')] \
+                if force or dir_mtime != self._dir_mtime else None
+        except OSError:
+            self._entries.clear()
+            self._dir_mtime = None
+            return
+
+        if files is not None:
+            # 目录内容变化：移除已删除的模板
+            self._dir_mtime = dir_mtime
+            names = {f[:-4] for f in files}
+            for name in list(self._entries):
+                if name not in names:
+                    del self._entries[name]
+        else:
+            names = set(self._entries)
+
+        for name in names:
+            path = os.path.join(self.templates_dir, f"{name}.css")
+            try:
+                mtime = os.stat(path).st_mtime
+                entry = self._entries.get(name)
+                if entry is not None and entry.mtime == mtime:
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    css = minify_css(f.read())
+            except OSError as e:
+                logger.warning(f"读取CSS模板 {name} 失败: {str(e)}")
+                self._entries.pop(name, None)
+                continue
+            self._entries[name] = _TemplateEntry(css, parse_css_rules(css), mtime)
+            logger.info(f"已加载CSS模板: {name}")
+
+
+# 全局模板注册表实例
+_template_registry: Optional[TemplateRegistry] = None
+
+
+def get_template_registry() -> TemplateRegistry:
+    """获取全局模板注册表实例（首次调用时创建）"""
+    global _template_registry
+    if _template_registry is None:
+        _template_registry = TemplateRegistry()
+    return _template_registry